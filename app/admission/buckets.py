@@ -0,0 +1,84 @@
+"""
+Per-user token buckets for admission control.
+
+A bucket holds up to `burst` units of work (megapixels or video seconds) and
+refills at `rate` per second. `take` admits a request when the bucket holds its
+cost (or is full, for a request larger than the burst) and lets the balance go
+negative, so big requests are paid for by the wait before the next one.
+
+The in-process backend is the default; with several uvicorn workers each one
+then enforces the full rate. `PostgresBucketBackend` keeps the buckets in the
+rate_limit_buckets table instead, updated in one upsert per request, so every
+worker draws from the same bucket.
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.admission.models import RateLimitBucket
+
+class BucketBackend(ABC):
+    """Storage for token buckets. Implement this to share the buckets between workers."""
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        """Charge `cost` to the bucket; 0 if admitted, else the seconds until it would be"""
+        ...
+
+class MemoryBucketBackend(BucketBackend):
+    """Buckets in a dict of this process (the default backend); the least recently used go first"""
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        need = min(cost, burst)
+        wait = 0.0
+        if tokens >= need:
+            tokens -= cost
+        else:
+            wait = (need - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # an evicted bucket comes back full: only idle users are old enough to go
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class PostgresBucketBackend(BucketBackend):
+    """Buckets in rate_limit_buckets, refilled and charged in one statement on the database clock"""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        need = min(cost, burst)
+        elapsed = cast(func.extract("epoch", func.now() - RateLimitBucket.updated_at), Float)
+        refilled = func.least(burst, RateLimitBucket.tokens + elapsed * rate)
+        charge = (
+            pg_insert(RateLimitBucket)
+            .values(key=key, tokens=burst - cost, updated_at=func.now())
+            .on_conflict_do_update(
+                index_elements=[RateLimitBucket.key],
+                set_={"tokens": refilled - cost, "updated_at": func.now()},
+                where=refilled >= need
+            )
+            .returning(RateLimitBucket.tokens)
+        )
+        async with self.session_factory() as db:
+            admitted = (await db.execute(charge)).first() is not None
+            await db.commit()
+            if admitted:
+                return 0.0
+            # rejected: nothing was written, read the balance only to say when to come back
+            tokens = await db.scalar(select(refilled).where(RateLimitBucket.key == key))
+        return max(0.0, (need - (tokens or 0.0)) / rate)
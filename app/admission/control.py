@@ -0,0 +1,146 @@
+"""
+Admission control in front of synchronous enhancement.
+
+Every /media/enhance* and /media/batch request passes here before it is
+charged or reaches the model. Two checks, cheapest first:
+
+  - Load shedding: load is the largest of the inference queue depth and the
+    admitted megapixels and video seconds still in flight, each over its
+    ADMISSION_MAX_* (1.0: full). A tier whose shed_at_load (plans.py) it has
+    reached gets a 503 with Retry-After, so FREE goes first, then BASIC, and
+    PRO only once the server is full.
+  - Rate limiting: a token bucket per user and media type, filled at the
+    tier's work_per_second up to work_burst (app.admission.buckets); an empty
+    bucket answers 429 with Retry-After set to when it will hold the request.
+
+Admitted work counts toward the load until `release`, but one ticket counts
+for at most ADMISSION_MAX_TICKET_SHARE of its ADMISSION_MAX_*: a single long
+video or large batch is slow for its own user, and must not shed every tier
+by itself. A batch is admitted once for the megapixels of all its images
+(sized from their headers) and releases each image's share as it finishes.
+Jobs (app/jobs) skip admission: their queue already orders them by tier.
+"""
+import math
+from dataclasses import dataclass
+from typing import Callable
+from fastapi import HTTPException, status
+from app.admission.buckets import BucketBackend, MemoryBucketBackend, PostgresBucketBackend
+from app.auth.cache import CachedUser
+from app.billing.plans import TIERS, MediaType
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import ADMISSION_INFLIGHT_WORK, ADMISSION_REJECTIONS
+from app.model.engine import engines_in_use
+
+@dataclass
+class AdmissionTicket:
+    """Work admitted by `admit`; what is not released yet counts toward the load (as `load`)"""
+    media_type: MediaType
+    work: float
+    load: float
+    released: bool = False
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        backend: BucketBackend,
+        queue_depth: Callable[[], int],
+        max_queue_depth: int,
+        max_inflight: dict[MediaType, float],
+        retry_after_seconds: int,
+        enabled: bool = True,
+        max_ticket_share: float = 1.0
+    ):
+        self.backend = backend
+        self.queue_depth = queue_depth
+        self.max_queue_depth = max_queue_depth
+        self.max_inflight = max_inflight
+        self.max_ticket_share = max_ticket_share
+        self.retry_after_seconds = retry_after_seconds
+        self.enabled = enabled
+        self.inflight = dict.fromkeys(MediaType, 0.0)
+
+    def load(self) -> float:
+        """How full this process is: 1.0 at the first ADMISSION_MAX_* reached"""
+        loads = [self.queue_depth() / self.max_queue_depth] if self.max_queue_depth else []
+        loads += [self.inflight[media_type] / limit for media_type, limit in self.max_inflight.items() if limit]
+        return max(loads, default=0.0)
+
+    def check_load(self, user: CachedUser):
+        """503 if the user's tier is being shed; before reading an upload or starting a batch"""
+        if not self.enabled:
+            return
+        if self.load() >= TIERS[user.tier].shed_at_load:
+            ADMISSION_REJECTIONS.labels(user.tier.value, "load").inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry shortly or submit a job to /jobs",
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+
+    async def admit(self, user: CachedUser, media_type: MediaType, work: float) -> AdmissionTicket:
+        """
+        Admit `work` (megapixels or video seconds) for the user or raise 503/429;
+        pass the ticket to `release` once the enhancement is done
+        """
+        if self.enabled:
+            self.check_load(user)
+            limits = TIERS[user.tier].limits(media_type)
+            if limits.work_per_second > 0:
+                wait = await self.backend.take(
+                    f"{user.id}:{media_type.value}", limits.work_per_second, limits.work_burst, work
+                )
+                if wait > 0:
+                    ADMISSION_REJECTIONS.labels(user.tier.value, "rate").inc()
+                    raise HTTPException(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        detail=f"Too many {media_type.value} enhancements, please slow down",
+                        headers={"Retry-After": str(math.ceil(wait))},
+                    )
+        limit = self.max_inflight.get(media_type)
+        load = min(work, limit * self.max_ticket_share) if limit else work
+        self.inflight[media_type] += load
+        ADMISSION_INFLIGHT_WORK.labels(media_type.value).inc(work)
+        return AdmissionTicket(media_type, work, load)
+
+    def release(self, ticket: AdmissionTicket | None, work: float | None = None):
+        """
+        Take the ticket's work off the load, or `work` of it as a batch's items
+        finish (idempotent; None is ignored)
+        """
+        if ticket is None or ticket.released:
+            return
+        work = ticket.work if work is None else min(work, ticket.work)
+        # a capped ticket takes its load off in proportion to the work done
+        load = ticket.load if work >= ticket.work else ticket.load * work / ticket.work
+        ticket.work -= work
+        ticket.load -= load
+        if ticket.work <= 0:
+            ticket.released = True
+        self.inflight[ticket.media_type] -= load
+        ADMISSION_INFLIGHT_WORK.labels(ticket.media_type.value).dec(work)
+
+    def use_backend(self, backend: BucketBackend):
+        self.backend = backend
+
+def _queue_depth() -> int:
+    return sum(engine.queue_depth for engine in engines_in_use())
+
+def _make_backend() -> BucketBackend:
+    if settings.ADMISSION_BACKEND == "postgres":
+        return PostgresBucketBackend(AsyncSessionLocal)
+    return MemoryBucketBackend(settings.ADMISSION_MEMORY_MAX_BUCKETS)
+
+admission = AdmissionController(
+    _make_backend(),
+    queue_depth=_queue_depth,
+    max_queue_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+    max_inflight={
+        MediaType.IMAGE: settings.ADMISSION_MAX_INFLIGHT_MEGAPIXELS,
+        MediaType.VIDEO: settings.ADMISSION_MAX_INFLIGHT_VIDEO_SECONDS,
+    },
+    retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    enabled=settings.ADMISSION_ENABLED,
+    max_ticket_share=settings.ADMISSION_MAX_TICKET_SHARE,
+)
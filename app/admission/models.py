@@ -0,0 +1,10 @@
+from sqlalchemy import Column, DateTime, Float, String
+from app.database import Base
+
+class RateLimitBucket(Base):
+    """Token bucket shared by every worker (ADMISSION_BACKEND="postgres"); one row per user and media type"""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String(64), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
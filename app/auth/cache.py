@@ -0,0 +1,120 @@
+"""Short-lived cache of the user fields needed to authorize a request"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from app.config import settings
+from app.metrics import CACHE_LOOKUPS
+from app.billing.plans import SubscriptionTier
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    """What `get_current_user` hands to routes: enough to authorize, nothing more"""
+    id: int
+    is_active: bool
+    is_admin: bool
+    tier: SubscriptionTier
+
+class UserCacheBackend(ABC):
+    """Storage for cached users. Implement this to share the cache between workers."""
+    
+    @abstractmethod
+    async def get(self, user_id: int) -> CachedUser | None:
+        ...
+    
+    @abstractmethod
+    async def set(self, user: CachedUser) -> None:
+        ...
+    
+    @abstractmethod
+    async def delete(self, user_id: int) -> None:
+        ...
+    
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+class LRUUserCacheBackend(UserCacheBackend):
+    """In-process LRU with a per-entry TTL (the default backend)"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, tuple[float, CachedUser]] = OrderedDict()
+    
+    async def get(self, user_id: int) -> CachedUser | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+    
+    async def set(self, user: CachedUser) -> None:
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def delete(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+    
+    async def clear(self) -> None:
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class UserCache:
+    """Counts hits and misses in front of whichever backend is configured"""
+    
+    def __init__(self, backend: UserCacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, user_id: int) -> CachedUser | None:
+        user = await self.backend.get(user_id)
+        if user is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels("user", "miss").inc()
+        else:
+            self.hits += 1
+            CACHE_LOOKUPS.labels("user", "hit").inc()
+        return user
+    
+    async def set(self, user: CachedUser) -> None:
+        await self.backend.set(user)
+    
+    async def invalidate(self, user_id: int) -> None:
+        """Drop a user so the next request reloads it (logout, tier change, deactivation)"""
+        await self.backend.delete(user_id)
+    
+    async def invalidate_many(self, user_ids: list[int]) -> None:
+        """Drop many users at once (bulk tier changes); past the cache size, clearing it is cheaper"""
+        if len(user_ids) >= settings.USER_CACHE_MAX_ENTRIES:
+            await self.backend.clear()
+            return
+        for user_id in user_ids:
+            await self.backend.delete(user_id)
+    
+    def use_backend(self, backend: UserCacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+user_cache = UserCache(
+    LRUUserCacheBackend(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
+)
@@ -1,43 +1,90 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
-from app.database import get_db
+from app.metrics import JWT_DECODE_SECONDS
+from app.database import AsyncSessionLocal, get_async_db
+from app.auth.cache import CachedUser, user_cache
 from app.auth.models import User
+from app.billing.models import Subscription
+from app.billing.plans import SubscriptionTier
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+async def load_cached_user(db: AsyncSession, user_id: int) -> CachedUser | None:
+    """Authorization fields for one user, from the cache or a single joined query"""
+    cached = await user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    row = (await db.execute(
+        select(User.id, User.is_active, User.is_admin, Subscription.tier)
+        .outerjoin(Subscription, Subscription.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
+    if row is None:
+        return None
     
+    cached = CachedUser(
+        id=row.id,
+        is_active=bool(row.is_active),
+        is_admin=bool(row.is_admin),
+        tier=row.tier or SubscriptionTier.FREE,
+    )
+    await user_cache.set(cached)
+    return cached
+
+async def user_from_token(db: AsyncSession, token: str | None) -> CachedUser:
+    """The active user an access token belongs to; 401 otherwise"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    if token is None:
+        raise credentials_exception
+    
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with JWT_DECODE_SECONDS.time():
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await load_cached_user(db, int(user_id))
     if user is None or not user.is_active:
         raise credentials_exception
     
     return user
 
-def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> CachedUser:
+    return await user_from_token(db, token)
+
+async def get_stream_user(
+    token: str | None = Depends(optional_oauth2_scheme),
+    access_token: str | None = Query(None, description="For EventSource, which cannot send an Authorization header")
+) -> CachedUser:
+    """
+    get_current_user for long-lived streams: checked once at connect, with a
+    session of its own that is closed before the stream starts
+    """
+    async with AsyncSessionLocal() as db:
+        return await user_from_token(db, token or access_token)
+
+def get_current_admin(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
     """Require admin privileges"""
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin privileges required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
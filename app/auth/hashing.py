@@ -0,0 +1,76 @@
+"""Argon2 hashing in a dedicated process pool, so sign-in bursts can't stall the API"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.config import settings
+from app.metrics import PASSWORD_HASH_PENDING, PASSWORD_HASH_SECONDS
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST_KB,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Executed inside the pool workers
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class PasswordHasher:
+    """Runs hashing in worker processes and turns work away once too much is queued"""
+    
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork a process that already runs an event loop and DB pools
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+    
+    async def _run(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in attempts in progress, please retry shortly",
+                headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+            )
+        
+        self.pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            with PASSWORD_HASH_SECONDS.labels(operation).time():
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+    
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+    
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Verify a password; also returns a fresh hash when the stored one uses outdated parameters"""
+        return await self._run("verify", _verify_and_update, password, hashed_password)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
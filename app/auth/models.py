@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from app.database import Base
 
 class User(Base):
@@ -13,9 +14,21 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     
-    refresh_token = Column(String, nullable=True)
-    refresh_token_expires_at = Column(DateTime, nullable=True)
-    
     credits_remaining = Column(Integer, default=5)
     subscription = relationship("Subscription", back_populates="user", uselist=False)
-    media_files = relationship("MediaFile", back_populates="user") 
\ No newline at end of file
+    # Can be thousands of rows: page through MediaService.list_gallery instead of loading this
+    media_files = relationship("MediaFile", back_populates="user", lazy="raise")
+    refresh_tokens = relationship("RefreshToken", back_populates="user", passive_deletes=True)
+
+class RefreshToken(Base):
+    """One row per signed-in session; only a SHA-256 of the token is stored"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    device_label = Column(String(100), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    user = relationship("User", back_populates="refresh_tokens")
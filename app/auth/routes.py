@@ -1,21 +1,22 @@
 from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.auth import schemas, service
-from app.auth.dependencies import get_current_user
+from app.auth.cache import CachedUser, user_cache
+from app.auth.dependencies import get_current_user, get_current_admin
 from app.auth.models import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
-    return service.AuthService.register(db, user_data)
+    return await service.AuthService.register(db, user_data)
 
 @router.post("/login", response_model=schemas.TokenResponse)
-def login(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(login_data: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login and receive access + refresh tokens"""
-    user, access_token, refresh_token = service.AuthService.login(db, login_data)
+    user, access_token, refresh_token = await service.AuthService.login(db, login_data)
     
     return {
         "access_token": access_token,
@@ -25,30 +26,49 @@ def login(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
 
 # ✅ NEW: Refresh token endpoint
 @router.post("/refresh", response_model=schemas.TokenResponse)
-def refresh_token(
+async def refresh_token(
     token_data: schemas.RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Use refresh token to get new access token"""
-    new_access_token = service.AuthService.refresh_access_token(db, token_data.refresh_token)
+    """Use refresh token to get new access token (the refresh token is rotated)"""
+    access_token, refresh_token = await service.AuthService.refresh_access_token(db, token_data.refresh_token)
     
     return {
-        "access_token": new_access_token,
-        "refresh_token": token_data.refresh_token,  # Same refresh token
+        "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer"
     }
 
 # ✅ NEW: Logout endpoint
 @router.post("/logout")
-def logout(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def logout(
+    token_data: schemas.LogoutRequest | None = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Logout and invalidate refresh token"""
-    service.AuthService.logout(db, current_user)
+    refresh_token = token_data.refresh_token if token_data else None
+    await service.AuthService.logout(db, current_user.id, refresh_token)
     return {"message": "Successfully logged out"}
 
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get current authenticated user info"""
-    return current_user
\ No newline at end of file
+    return await db.get(User, current_user.id)
+
+@router.post("/admin/deactivate-user/{user_id}", response_model=schemas.UserResponse)
+async def admin_deactivate_user(
+    user_id: int,
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Admin deactivates an account; it stops authenticating immediately"""
+    return await service.AuthService.set_active(db, user_id, False)
+
+@router.get("/admin/user-cache")
+async def admin_user_cache_stats(admin: CachedUser = Depends(get_current_admin)):
+    """Hit/miss counters of the authenticated-user cache"""
+    return user_cache.stats()
\ No newline at end of file
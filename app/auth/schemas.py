@@ -9,6 +9,7 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+    device_label: str | None = Field(None, max_length=100)
 
 class UserResponse(BaseModel):
     id: int
@@ -27,4 +28,8 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
 
 class RefreshTokenRequest(BaseModel):
-    refresh_token: str
\ No newline at end of file
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Omit refresh_token to sign out of every session"""
+    refresh_token: str | None = None
\ No newline at end of file
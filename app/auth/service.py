@@ -1,24 +1,30 @@
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from jose import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.config import settings
-from app.auth.models import User
+from app.auth.cache import user_cache
+from app.auth.hashing import password_hasher
+from app.auth.models import RefreshToken, User
 from app.auth.schemas import UserCreate, UserLogin
+import asyncio
+import hashlib
+import logging
 import secrets
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 class AuthService:
     
     @staticmethod
-    def hash_password(password: str) -> str:
-        return pwd_context.hash(password)
+    async def hash_password(password: str) -> str:
+        return await password_hasher.hash(password)
     
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash needs upgrading"""
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
     
     @staticmethod
     def create_access_token(user_id: int) -> str:
@@ -42,30 +48,57 @@ class AuthService:
         return datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     
     @staticmethod
-    def register(db: Session, user_data: UserCreate) -> User:
-        if db.query(User).filter(User.email == user_data.email).first():
+    def hash_refresh_token(refresh_token: str) -> str:
+        """Refresh tokens are 256-bit random strings, so a fast hash is enough"""
+        return hashlib.sha256(refresh_token.encode()).hexdigest()
+    
+    @staticmethod
+    def issue_refresh_token(db: AsyncSession, user_id: int, device_label: str | None) -> str:
+        """Add a new session row (caller commits) and return the raw token"""
+        refresh_token = AuthService.create_refresh_token()
+        db.add(RefreshToken(
+            user_id=user_id,
+            token_hash=AuthService.hash_refresh_token(refresh_token),
+            device_label=device_label,
+            expires_at=AuthService.get_refresh_token_expiry()
+        ))
+        return refresh_token
+    
+    @staticmethod
+    async def register(db: AsyncSession, user_data: UserCreate) -> User:
+        if await db.scalar(select(User.id).where(User.email == user_data.email)) is not None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
+        await db.commit()
         
         user = User(
             email=user_data.email,
-            hashed_password=AuthService.hash_password(user_data.password),
+            hashed_password=await AuthService.hash_password(user_data.password),
             name=user_data.name,
             full_name=user_data.full_name
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         return user
     
     @staticmethod
-    def login(db: Session, login_data: UserLogin) -> tuple[User, str, str]:
+    async def login(db: AsyncSession, login_data: UserLogin) -> tuple[User, str, str]:
         """Login and return user + tokens"""
-        user = db.query(User).filter(User.email == login_data.email).first()
+        user = await db.scalar(select(User).where(User.email == login_data.email))
         
-        if not user or not AuthService.verify_password(login_data.password, user.hashed_password):
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect email or password"
+            )
+        
+        # End the read transaction so no pooled connection is held while argon2 runs
+        await db.commit()
+        valid, new_hash = await AuthService.verify_password(login_data.password, user.hashed_password)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
@@ -78,45 +111,104 @@ class AuthService:
             )
         
         access_token = AuthService.create_access_token(user.id)
-        refresh_token = AuthService.create_refresh_token()
+        refresh_token = AuthService.issue_refresh_token(db, user.id, login_data.device_label)
         
-        user.refresh_token = refresh_token
-        user.refresh_token_expires_at = AuthService.get_refresh_token_expiry()
-        db.commit()
+        if new_hash:
+            # Stored hash uses outdated argon2 parameters; upgrade it while we have the password
+            user.hashed_password = new_hash
+        await db.commit()
         
         return user, access_token, refresh_token
     
     @staticmethod
-    def refresh_access_token(db: Session, refresh_token: str) -> str:
-        """Use refresh token to get new access token"""
+    async def refresh_access_token(db: AsyncSession, refresh_token: str) -> tuple[str, str]:
+        """Rotate a refresh token: returns a new access token and a new refresh token"""
         
-        user = db.query(User).filter(User.refresh_token == refresh_token).first()
+        # Deleting the row claims the token, so a replayed or concurrent refresh finds nothing
+        claimed = (await db.execute(
+            delete(RefreshToken)
+            .where(RefreshToken.token_hash == AuthService.hash_refresh_token(refresh_token))
+            .returning(RefreshToken.user_id, RefreshToken.expires_at, RefreshToken.device_label)
+        )).first()
         
-        if not user:
+        if not claimed:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token"
             )
         
-        if user.refresh_token_expires_at < datetime.utcnow():
+        if claimed.expires_at < datetime.utcnow():
+            await db.commit()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Refresh token expired, please login again"
             )
         
-        if not user.is_active:
+        is_active = await db.scalar(select(User.is_active).where(User.id == claimed.user_id))
+        if not is_active:
+            await db.commit()
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Account is inactive"
             )
         
-        new_access_token = AuthService.create_access_token(user.id)
+        new_refresh_token = AuthService.issue_refresh_token(db, claimed.user_id, claimed.device_label)
+        await db.commit()
+        
+        return AuthService.create_access_token(claimed.user_id), new_refresh_token
+    
+    @staticmethod
+    async def logout(db: AsyncSession, user_id: int, refresh_token: str | None = None):
+        """Invalidate one session's refresh token, or all of them"""
+        stmt = delete(RefreshToken).where(RefreshToken.user_id == user_id)
+        if refresh_token:
+            stmt = stmt.where(RefreshToken.token_hash == AuthService.hash_refresh_token(refresh_token))
+        await db.execute(stmt)
+        await db.commit()
+        await user_cache.invalidate(user_id)
+    
+    @staticmethod
+    async def set_active(db: AsyncSession, user_id: int, is_active: bool) -> User:
+        """Activate or deactivate an account"""
+        user = await db.get(User, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
         
-        return new_access_token
+        user.is_active = is_active
+        if not is_active:
+            await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+        await db.commit()
+        await user_cache.invalidate(user_id)
+        return user
     
     @staticmethod
-    def logout(db: Session, user: User):
-        """Invalidate refresh token"""
-        user.refresh_token = None
-        user.refresh_token_expires_at = None
-        db.commit()
\ No newline at end of file
+    async def purge_expired_refresh_tokens(db: AsyncSession, batch_size: int) -> int:
+        """Delete expired sessions in batches so no single statement locks many rows"""
+        purged = 0
+        while True:
+            expired_ids = (
+                select(RefreshToken.id)
+                .where(RefreshToken.expires_at < datetime.utcnow())
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired_ids)))
+            await db.commit()
+            purged += result.rowcount
+            if result.rowcount < batch_size:
+                return purged
+
+async def sweep_expired_refresh_tokens(session_factory, interval_seconds: int, batch_size: int):
+    """Background loop started from the app lifespan"""
+    while True:
+        try:
+            async with session_factory() as db:
+                purged = await AuthService.purge_expired_refresh_tokens(db, batch_size)
+            if purged:
+                logger.info("Purged %d expired refresh tokens", purged)
+        except Exception:
+            logger.exception("Refresh token sweep failed")
+        await asyncio.sleep(interval_seconds)
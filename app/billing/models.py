@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Enum as SQLEnum
+from enum import Enum
+from sqlalchemy import BigInteger, Boolean, Column, Date, Integer, ForeignKey, DateTime, Index, Enum as SQLEnum, false
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
-from app.billing.plans import SubscriptionTier
+from app.billing.plans import MediaType, SubscriptionTier
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
@@ -17,4 +18,57 @@ class Subscription(Base):
     current_period_start = Column(DateTime)
     current_period_end = Column(DateTime)
     
-    user = relationship("User", back_populates="subscription")
\ No newline at end of file
+    user = relationship("User", back_populates="subscription")
+
+class RollupPeriod(str, Enum):
+    DAY = "day"
+    MONTH = "month"
+
+class UsageEvent(Base):
+    """
+    Append-only log of metered items, written in the transaction that charges
+    them (refunds are negative). Rows never change except rolled_up, set once
+    UsageService.roll_up has added them to the rollups.
+    """
+    __tablename__ = "usage_events"
+    
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    tier = Column(SQLEnum(SubscriptionTier), nullable=False)
+    media_type = Column(SQLEnum(MediaType), nullable=False)
+    items = Column(Integer, nullable=False)
+    occurred_at = Column(DateTime, nullable=False, server_default=func.now())
+    rolled_up = Column(Boolean, nullable=False, server_default=false())
+    
+    __table_args__ = (
+        # the roll-up reads the pending tail in id order; the purge reads rolled-up events by age
+        Index("ix_usage_events_pending", "id", postgresql_where=rolled_up == false()),
+        Index("ix_usage_events_occurred_at", "occurred_at", postgresql_where=rolled_up),
+    )
+
+class TierUsageRollup(Base):
+    """Items per UTC day or month, tier and media type"""
+    __tablename__ = "usage_rollups_tier"
+    
+    period = Column(SQLEnum(RollupPeriod), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    tier = Column(SQLEnum(SubscriptionTier), primary_key=True)
+    media_type = Column(SQLEnum(MediaType), primary_key=True)
+    items = Column(BigInteger, nullable=False)
+
+class UserUsageRollup(Base):
+    """Items per UTC day or month, user and media type; tier is the highest the user metered under"""
+    __tablename__ = "usage_rollups_user"
+    
+    period = Column(SQLEnum(RollupPeriod), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    # no foreign key: history outlives accounts
+    user_id = Column(Integer, primary_key=True)
+    media_type = Column(SQLEnum(MediaType), primary_key=True)
+    tier = Column(SQLEnum(SubscriptionTier), nullable=False)
+    items = Column(BigInteger, nullable=False)
+    
+    __table_args__ = (
+        # top consumers: one backward index scan per period and media type
+        Index("ix_usage_rollups_user_top", "period", "period_start", "media_type", "items"),
+    )
@@ -1,4 +1,7 @@
+from dataclasses import dataclass
 from enum import Enum
+from types import MappingProxyType
+from typing import NamedTuple
 
 class SubscriptionTier(str, Enum):
     FREE = "free"
@@ -10,21 +13,36 @@ class MediaType(str, Enum):
     VIDEO = "video"
 
 # Tier configurations
+# queue_weight: share of job-worker time when every tier has jobs waiting
+# batch_max_items: images per /media/batch request (0: no bulk processing)
+# inference_backend: "tf" (float32), "tflite-fp16" or "tflite-int8" (see app/model/engine.py; TFLite
+#   conversions are cached in TFLITE_CACHE_DIR, build them with `python -m app.model.tflite`)
+# shed_at_load: server load (1.0 = full, see app/admission) above which the tier's requests are turned away
+# work_per_second, work_burst: per-user token bucket of synchronous enhancement, in
+#   megapixels for images and seconds for videos (see app/admission)
 TIER_LIMITS = {
     SubscriptionTier.FREE: {
         "name": "Free",
         "price": 0,
+        "queue_weight": 1,
+        "batch_max_items": 0,
+        "inference_backend": "tflite-int8",
+        "shed_at_load": 0.5,
         "limits": {
             MediaType.IMAGE: {
                 "count_per_month": 5,
                 "max_size_mb": 5,
-                "max_resolution": "1920x1080"
+                "max_resolution": "1920x1080",
+                "work_per_second": 0.25,
+                "work_burst": 4
             },
             MediaType.VIDEO: {
                 "count_per_month": 2,
                 "max_duration_seconds": 30,
                 "max_size_mb": 50,
-                "max_resolution": "1280x720"
+                "max_resolution": "1280x720",
+                "work_per_second": 0.5,
+                "work_burst": 30
             }
         },
         "features": [
@@ -32,23 +50,38 @@ TIER_LIMITS = {
             "2 videos/month (30 sec max)",
             "HD quality (720p)",
             "Basic enhancement"
-        ]
+        ],
+        "enhancement": {
+            "keyframe_interval": 24,
+            "diff_threshold": 0.06,
+            "histogram_threshold": 0.2,
+            "smoothing": 0.0,
+            "interpolate": False
+        }
     },
     
     SubscriptionTier.BASIC: {
         "name": "Basic",
         "price": 2500,
+        "queue_weight": 3,
+        "batch_max_items": 0,
+        "inference_backend": "tf",
+        "shed_at_load": 0.75,
         "limits": {
             MediaType.IMAGE: {
                 "count_per_month": 50,
                 "max_size_mb": 20,
-                "max_resolution": "3840x2160"
+                "max_resolution": "3840x2160",
+                "work_per_second": 1,
+                "work_burst": 16
             },
             MediaType.VIDEO: {
                 "count_per_month": 20,
                 "max_duration_seconds": 300,
                 "max_size_mb": 500,
-                "max_resolution": "1920x1080"
+                "max_resolution": "1920x1080",
+                "work_per_second": 2,
+                "work_burst": 300
             }
         },
         "features": [
@@ -57,23 +90,38 @@ TIER_LIMITS = {
             "Full HD quality (1080p)",
             "Advanced enhancement",
             "Priority processing"
-        ]
+        ],
+        "enhancement": {
+            "keyframe_interval": 12,
+            "diff_threshold": 0.04,
+            "histogram_threshold": 0.12,
+            "smoothing": 0.3,
+            "interpolate": False
+        }
     },
     
     SubscriptionTier.PRO: {
         "name": "Pro",
         "price": 7500,
+        "queue_weight": 6,
+        "batch_max_items": 500,
+        "inference_backend": "tf",
+        "shed_at_load": 1.0,
         "limits": {
             MediaType.IMAGE: {
                 "count_per_month": 200,
                 "max_size_mb": 50,
-                "max_resolution": "7680x4320"
+                "max_resolution": "7680x4320",
+                "work_per_second": 4,
+                "work_burst": 64
             },
             MediaType.VIDEO: {
                 "count_per_month": 100,
                 "max_duration_seconds": 1800,
                 "max_size_mb": 5000,
-                "max_resolution": "3840x2160"
+                "max_resolution": "3840x2160",
+                "work_per_second": 8,
+                "work_burst": 1800
             }
         },
         "features": [
@@ -84,10 +132,98 @@ TIER_LIMITS = {
             "Fastest processing",
             "Bulk processing",
             "API access"
-        ]
+        ],
+        "enhancement": {
+            "keyframe_interval": 6,
+            "diff_threshold": 0.02,
+            "histogram_threshold": 0.08,
+            "smoothing": 0.5,
+            "interpolate": True
+        }
     }
 }
 
+class Resolution(NamedTuple):
+    width: int
+    height: int
+    
+    @classmethod
+    def parse(cls, value: str) -> "Resolution":
+        """Parse a "1920x1080" string"""
+        width, height = value.lower().split("x")
+        return cls(int(width), int(height))
+    
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+@dataclass(frozen=True, slots=True)
+class MediaLimits:
+    count_per_month: int
+    max_size_mb: int
+    max_resolution: Resolution
+    max_duration_seconds: int | None = None
+    # admission token bucket: megapixels (images) or seconds (videos)
+    work_per_second: float = 0.0
+    work_burst: float = 0.0
+
+@dataclass(frozen=True, slots=True)
+class EnhancementProfile:
+    """How aggressively video frames reuse ZR-DCE curves instead of running the network"""
+    keyframe_interval: int
+    diff_threshold: float
+    histogram_threshold: float
+    smoothing: float = 0.0
+    interpolate: bool = False
+
+@dataclass(frozen=True, slots=True)
+class TierPlan:
+    """TIER_LIMITS entry compiled into attribute lookups"""
+    tier: SubscriptionTier
+    name: str
+    price: int
+    queue_weight: int
+    batch_max_items: int
+    inference_backend: str
+    shed_at_load: float
+    image: MediaLimits
+    video: MediaLimits
+    features: tuple[str, ...]
+    enhancement: EnhancementProfile
+    
+    def limits(self, media_type: MediaType) -> MediaLimits:
+        return self.image if media_type == MediaType.IMAGE else self.video
+
+def _compile_limits(limits: dict) -> MediaLimits:
+    return MediaLimits(
+        count_per_month=limits["count_per_month"],
+        max_size_mb=limits["max_size_mb"],
+        max_resolution=Resolution.parse(limits["max_resolution"]),
+        max_duration_seconds=limits.get("max_duration_seconds"),
+        work_per_second=limits["work_per_second"],
+        work_burst=limits["work_burst"],
+    )
+
+def _compile_tier(tier: SubscriptionTier, config: dict) -> TierPlan:
+    return TierPlan(
+        tier=tier,
+        name=config["name"],
+        price=config["price"],
+        queue_weight=config["queue_weight"],
+        batch_max_items=config["batch_max_items"],
+        inference_backend=config["inference_backend"],
+        shed_at_load=config["shed_at_load"],
+        image=_compile_limits(config["limits"][MediaType.IMAGE]),
+        video=_compile_limits(config["limits"][MediaType.VIDEO]),
+        features=tuple(config["features"]),
+        enhancement=EnhancementProfile(**config["enhancement"]),
+    )
+
+# Compiled once at import; use this on hot paths instead of walking TIER_LIMITS
+TIERS: MappingProxyType[SubscriptionTier, TierPlan] = MappingProxyType(
+    {tier: _compile_tier(tier, config) for tier, config in TIER_LIMITS.items()}
+)
+
 def get_tier_limit(tier: SubscriptionTier, media_type: MediaType, limit_key: str):
-    """Helper to get specific limit"""
-    return TIER_LIMITS[tier]["limits"][media_type][limit_key]
\ No newline at end of file
+    """Helper to get specific limit (max_resolution comes back as a Resolution)"""
+    return getattr(TIERS[tier].limits(media_type), limit_key)
\ No newline at end of file
@@ -1,40 +1,113 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_async_db
+from app.http_cache import etag_matches
+from app.auth.cache import CachedUser, user_cache
 from app.auth.dependencies import get_current_user, get_current_admin
 from app.auth.models import User
-from app.billing import service
-from app.billing.plans import SubscriptionTier
+from app.billing import schemas, service
+from app.billing.models import RollupPeriod
+from app.billing.plans import MediaType, SubscriptionTier
+from app.billing.usage import UsageService
 
 router = APIRouter(prefix="/billing", tags=["Billing"])
 
 @router.get("/my-subscription")
-def get_my_subscription(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_my_subscription(
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get my subscription details"""
-    return service.BillingService.get_subscription_details(db, current_user)
+    return await service.BillingService.get_subscription_details(db, current_user)
 
-@router.get("/plans")
-def get_all_plans():
-    """Get all available plans"""
-    return service.BillingService.get_all_tiers()
+@router.get("/plans", responses={200: {"model": list[schemas.TierInfo]}})
+async def get_all_plans(if_none_match: str | None = Header(None)):
+    """Get all available plans (prebuilt body, revalidated by ETag)"""
+    headers = {
+        "ETag": service.PLANS_ETAG,
+        "Cache-Control": f"public, max-age={settings.PLANS_CACHE_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(if_none_match, service.PLANS_ETAG):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=service.PLANS_BODY, media_type="application/json", headers=headers)
 
 @router.post("/admin/upgrade-user/{user_id}")
-def admin_upgrade_user(
+async def admin_upgrade_user(
     user_id: int,
     tier: SubscriptionTier,
-    admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Admin manually upgrades user"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         return {"error": "User not found"}
     
-    sub = service.BillingService.get_or_create_subscription(db, user)
+    sub = await service.BillingService.get_or_create_subscription(db, user)
     sub.tier = tier
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(user.id)
     
-    return {"message": f"Upgraded {user.email} to {tier}"}
\ No newline at end of file
+    return {"message": f"Upgraded {user.email} to {tier}"}
+
+@router.get("/admin/usage", response_model=list[schemas.UsageTotal])
+async def admin_usage(
+    period: RollupPeriod = RollupPeriod.DAY,
+    start: date | None = None,
+    end: date | None = None,
+    media_type: MediaType | None = None,
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Items metered per day or month and tier (default: the last 30 days or the current month)"""
+    end = end or datetime.utcnow().date()
+    start = start or (end.replace(day=1) if period == RollupPeriod.MONTH else end - timedelta(days=29))
+    return await UsageService.usage_totals(db, period, start, end, media_type)
+
+@router.get("/admin/usage/top", response_model=list[schemas.TopConsumer])
+async def admin_top_consumers(
+    period: RollupPeriod = RollupPeriod.MONTH,
+    day: date | None = None,
+    media_type: MediaType = MediaType.IMAGE,
+    limit: int = Query(20, ge=1, le=1000),
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Heaviest users in the period containing `day` (default: today)"""
+    return await UsageService.top_consumers(db, period, day or datetime.utcnow().date(), media_type, limit)
+
+@router.get("/admin/usage/tiers", response_model=list[schemas.TierUsage])
+async def admin_tier_distribution(
+    period: RollupPeriod = RollupPeriod.MONTH,
+    day: date | None = None,
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Active users and their items per tier in the period containing `day` (default: today)"""
+    return await UsageService.tier_distribution(db, period, day or datetime.utcnow().date())
+
+@router.post("/admin/subscriptions/bulk", response_model=schemas.BulkSubscriptionResult)
+async def admin_bulk_update_subscriptions(
+    request: schemas.BulkSubscriptionUpdate,
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Change the tier and/or reset the billing period of many users at once"""
+    if request.user_ids is None and request.current_tier is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Select users by user_ids and/or current_tier")
+    if request.tier is None and not request.reset_period:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to change: set tier and/or reset_period")
+    if request.user_ids is not None and len(request.user_ids) > settings.BILLING_BULK_MAX_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BILLING_BULK_MAX_USER_IDS} user_ids per request; select by current_tier instead"
+        )
+    
+    changed = await service.BillingService.bulk_update_subscriptions(
+        db, request.user_ids, request.current_tier, request.tier, request.reset_period, settings.BILLING_BULK_BATCH_SIZE
+    )
+    if request.tier is not None:
+        await user_cache.invalidate_many(changed)
+    return {"updated": len(changed)}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from app.billing.plans import SubscriptionTier, TIER_LIMITS, MediaType
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from app.billing.plans import SubscriptionTier, MediaType
 
 class SubscriptionResponse(BaseModel):
     tier: SubscriptionTier
@@ -36,4 +36,33 @@ class TierInfo(BaseModel):
     
     image_limit: int
     video_limit: int
-    max_video_duration_seconds: int
\ No newline at end of file
+    max_video_duration_seconds: int
+
+class UsageTotal(BaseModel):
+    period_start: date
+    tier: SubscriptionTier
+    media_type: MediaType
+    items: int
+
+class TopConsumer(BaseModel):
+    user_id: int
+    tier: SubscriptionTier
+    items: int
+
+class TierUsage(BaseModel):
+    """Users who metered anything in the period, per tier"""
+    tier: SubscriptionTier
+    active_users: int
+    share: float
+    images: int
+    videos: int
+
+class BulkSubscriptionUpdate(BaseModel):
+    """Select users by id, by current tier or both; change their tier, reset their period or both"""
+    user_ids: list[int] | None = Field(None, min_length=1)
+    current_tier: SubscriptionTier | None = None
+    tier: SubscriptionTier | None = None
+    reset_period: bool = False
+
+class BulkSubscriptionResult(BaseModel):
+    updated: int
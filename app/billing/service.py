@@ -1,16 +1,49 @@
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+import hashlib
+import json
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Integer, and_, any_, case, cast, exists, func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.billing.models import Subscription
-from app.billing.plans import SubscriptionTier, TIER_LIMITS, MediaType
+from app.billing.plans import SubscriptionTier, TIERS, MediaType
+from app.billing.usage import usage_event
 from app.auth.models import User
 from datetime import datetime, timedelta
 
+BILLING_PERIOD = timedelta(days=30)
+# A video whose container reports no length cannot be checked against max_duration_seconds
+UNKNOWN_DURATION = "Could not determine video duration"
+
+@dataclass
+class QuotaReservation:
+    """Usage already charged by reserve_quota; release_quota refunds it unless committed"""
+    user_id: int
+    media_type: MediaType
+    count: int
+    tier: SubscriptionTier
+    period_start: datetime
+    committed: bool = False
+    released: bool = False
+
+def _usage_column(media_type: MediaType):
+    if media_type == MediaType.IMAGE:
+        return Subscription.images_used_this_month
+    return Subscription.videos_used_this_month
+
+def _tier_limit(media_type: MediaType, limit_key: str):
+    """SQL CASE mapping subscriptions.tier to one limit of its plan"""
+    return case(
+        *((Subscription.tier == tier, getattr(plan.limits(media_type), limit_key)) for tier, plan in TIERS.items())
+    )
+
 class BillingService:
     
     @staticmethod
-    def get_or_create_subscription(db: Session, user: User) -> Subscription:
+    async def get_or_create_subscription(db: AsyncSession, user: User) -> Subscription:
         """Get user's subscription"""
-        subscription = db.query(Subscription).filter(Subscription.user_id == user.id).first()
+        subscription = await db.scalar(select(Subscription).where(Subscription.user_id == user.id))
         
         if not subscription:
             now = datetime.utcnow()
@@ -20,108 +53,369 @@ class BillingService:
                 images_used_this_month=0,
                 videos_used_this_month=0,
                 current_period_start=now,
-                current_period_end=now + timedelta(days=30)
+                current_period_end=now + BILLING_PERIOD
             )
             db.add(subscription)
-            db.commit()
-            db.refresh(subscription)
+            await db.commit()
+            await db.refresh(subscription)
         
         return subscription
     
     @staticmethod
-    def reset_usage_if_needed(db: Session, subscription: Subscription):
+    async def reset_usage_if_needed(db: AsyncSession, subscription: Subscription):
         """Reset monthly counters if period ended"""
         if subscription.current_period_end and datetime.utcnow() > subscription.current_period_end:
             subscription.images_used_this_month = 0
             subscription.videos_used_this_month = 0
             subscription.current_period_start = datetime.utcnow()
-            subscription.current_period_end = datetime.utcnow() + timedelta(days=30)
-            db.commit()
+            subscription.current_period_end = datetime.utcnow() + BILLING_PERIOD
+            await db.commit()
     
     @staticmethod
-    def can_process_media(
-        db: Session,
+    async def can_process_media(
+        db: AsyncSession,
         user: User,
         media_type: MediaType,
         file_size_mb: float = None,
-        duration_seconds: int = None
+        duration_seconds: int = None,
+        count: int = 1
     ) -> tuple[bool, str]:
-        """Check if user can process this media"""
-        
-        subscription = BillingService.get_or_create_subscription(db, user)
-        BillingService.reset_usage_if_needed(db, subscription)
+        """Check if user can process this media (read-only; reserve_quota is what charges)"""
         
-        tier = subscription.tier
-        limits = TIER_LIMITS[tier]["limits"][media_type]
+        subscription = await db.scalar(
+            select(Subscription)
+            .where(Subscription.user_id == user.id)
+            .execution_options(populate_existing=True)
+        )
         
-        if media_type == MediaType.IMAGE:
-            if subscription.images_used_this_month >= limits["count_per_month"]:
-                return False, f"Monthly image limit reached ({limits['count_per_month']}). Upgrade to process more."
+        if subscription is None:
+            tier, used = SubscriptionTier.FREE, 0
         else:
-            if subscription.videos_used_this_month >= limits["count_per_month"]:
-                return False, f"Monthly video limit reached ({limits['count_per_month']}). Upgrade to process more."
+            tier, used = subscription.tier, getattr(subscription, _usage_column(media_type).key)
+            if subscription.current_period_end and datetime.utcnow() > subscription.current_period_end:
+                used = 0
         
-        if file_size_mb and file_size_mb > limits["max_size_mb"]:
-            return False, f"File too large. Max size: {limits['max_size_mb']}MB"
+        return BillingService._check_limits(tier, media_type, used, count, file_size_mb, duration_seconds)
+    
+    @staticmethod
+    def _check_limits(
+        tier: SubscriptionTier,
+        media_type: MediaType,
+        used: int,
+        count: int,
+        file_size_mb: float = None,
+        duration_seconds: int = None
+    ) -> tuple[bool, str]:
+        limits = TIERS[tier].limits(media_type)
         
-        if media_type == MediaType.VIDEO and duration_seconds:
-            if duration_seconds > limits["max_duration_seconds"]:
-                max_minutes = limits["max_duration_seconds"] / 60
+        if used + count > limits.count_per_month:
+            return False, f"Monthly {media_type.value} limit reached ({limits.count_per_month}). Upgrade to process more."
+        
+        if file_size_mb and file_size_mb > limits.max_size_mb:
+            return False, f"File too large. Max size: {limits.max_size_mb}MB"
+        
+        if media_type == MediaType.VIDEO and duration_seconds is not None:
+            if duration_seconds <= 0:
+                return False, UNKNOWN_DURATION
+            if duration_seconds > limits.max_duration_seconds:
+                max_minutes = limits.max_duration_seconds / 60
                 return False, f"Video too long. Max duration: {max_minutes} minutes"
         
         return True, "OK"
     
     @staticmethod
-    def increment_usage(db: Session, user: User, media_type: MediaType):
-        """Increment usage counter after processing"""
-        subscription = BillingService.get_or_create_subscription(db, user)
+    def _charge_statement(
+        user_id: int,
+        media_type: MediaType,
+        count: int,
+        now: datetime,
+        conditions: list,
+        insert_if_missing: bool
+    ):
+        """
+        One statement that rolls the period over if it ended, adds `count` to the
+        usage counter and returns the row, but only where `conditions` hold.
+        With insert_if_missing it is an upsert that also creates a FREE subscription.
+        """
+        used_column = _usage_column(media_type)
+        other_column = _usage_column(MediaType.VIDEO if media_type == MediaType.IMAGE else MediaType.IMAGE)
+        expired = func.coalesce(Subscription.current_period_end < now, False)
         
-        if media_type == MediaType.IMAGE:
-            subscription.images_used_this_month += 1
-        else:
-            subscription.videos_used_this_month += 1
+        charged = {
+            used_column.key: case((expired, 0), else_=used_column) + count,
+            other_column.key: case((expired, 0), else_=other_column),
+            "current_period_start": case((expired, now), else_=Subscription.current_period_start),
+            "current_period_end": case((expired, now + BILLING_PERIOD), else_=Subscription.current_period_end),
+        }
+        returning = (Subscription.tier, Subscription.current_period_start, used_column)
+        
+        if not insert_if_missing:
+            return (
+                update(Subscription)
+                .where(Subscription.user_id == user_id, *conditions)
+                .values(charged)
+                .returning(*returning)
+            )
         
-        db.commit()
+        return (
+            pg_insert(Subscription)
+            .values(
+                user_id=user_id,
+                tier=SubscriptionTier.FREE,
+                current_period_start=now,
+                current_period_end=now + BILLING_PERIOD,
+                **{used_column.key: count, other_column.key: 0}
+            )
+            .on_conflict_do_update(
+                index_elements=[Subscription.user_id],
+                set_=charged,
+                where=and_(*conditions) if conditions else None
+            )
+            .returning(*returning)
+        )
     
     @staticmethod
-    def get_subscription_details(db: Session, user: User):
-        """Get full subscription info with limits"""
-        subscription = BillingService.get_or_create_subscription(db, user)
-        BillingService.reset_usage_if_needed(db, subscription)
+    async def reserve_quota(
+        db: AsyncSession,
+        user: User,
+        media_type: MediaType,
+        file_size_mb: float = None,
+        duration_seconds: int = None,
+        count: int = 1
+    ) -> QuotaReservation:
+        """
+        Check limits, roll the billing period and charge `count` items in one
+        conditional statement, so concurrent uploads can never overshoot the
+        monthly limit. Raises 403/413 when the reservation is refused.
+        """
+        now = datetime.utcnow()
+        used_column = _usage_column(media_type)
+        expired = func.coalesce(Subscription.current_period_end < now, False)
+        
+        conditions = [case((expired, 0), else_=used_column) + count <= _tier_limit(media_type, "count_per_month")]
+        if file_size_mb:
+            conditions.append(_tier_limit(media_type, "max_size_mb") >= file_size_mb)
+        if media_type == MediaType.VIDEO and duration_seconds is not None:
+            if duration_seconds <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=UNKNOWN_DURATION
+                )
+            conditions.append(_tier_limit(media_type, "max_duration_seconds") >= duration_seconds)
         
-        tier = subscription.tier
-        tier_config = TIER_LIMITS[tier]
+        # A user without a subscription row is FREE; only upsert when FREE would allow it
+        free_ok, _ = BillingService._check_limits(SubscriptionTier.FREE, media_type, 0, count, file_size_mb, duration_seconds)
+        stmt = BillingService._charge_statement(user.id, media_type, count, now, conditions, insert_if_missing=free_ok)
+        
+        row = (await db.execute(stmt)).first()
+        if row is not None:
+            await db.execute(usage_event(user.id, row.tier, media_type, count, now))
+        await db.commit()
+        
+        if row is None:
+            _, reason = await BillingService.can_process_media(db, user, media_type, file_size_mb, duration_seconds, count)
+            too_big = reason.startswith(("File too large", "Video too long"))
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE if too_big else status.HTTP_403_FORBIDDEN,
+                detail=reason
+            )
+        
+        return QuotaReservation(
+            user_id=user.id,
+            media_type=media_type,
+            count=count,
+            tier=row.tier,
+            period_start=row.current_period_start
+        )
+    
+    @staticmethod
+    def check_media_limits(
+        tier: SubscriptionTier,
+        media_type: MediaType,
+        file_size_mb: float = None,
+        duration_seconds: int = None
+    ):
+        """Size/duration limits only, for work that is not charged against the monthly count"""
+        ok, reason = BillingService._check_limits(tier, media_type, 0, 0, file_size_mb, duration_seconds)
+        if not ok:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST if reason == UNKNOWN_DURATION else status.HTTP_413_CONTENT_TOO_LARGE,
+                detail=reason
+            )
+    
+    @staticmethod
+    async def commit_quota(db: AsyncSession, reservation: QuotaReservation):
+        """Processing succeeded: the reserved usage stays charged"""
+        reservation.committed = True
+    
+    @staticmethod
+    async def release_quota(db: AsyncSession, reservation: QuotaReservation, count: int = None):
+        """Processing failed: refund the reservation (or `count` items of it)"""
+        if reservation.committed or reservation.released:
+            return
+        
+        used_column = _usage_column(reservation.media_type)
+        refund = reservation.count if count is None else count
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(Subscription)
+            .where(
+                Subscription.user_id == reservation.user_id,
+                # A period rollover since reserving already zeroed the counter
+                Subscription.current_period_start == reservation.period_start
+            )
+            .values({used_column.key: func.greatest(used_column - refund, 0)})
+        )
+        if result.rowcount:
+            # under the tier it was charged to, so the rollups net out
+            await db.execute(usage_event(reservation.user_id, reservation.tier, reservation.media_type, -refund, now))
+        await db.commit()
+        reservation.released = True
+    
+    @staticmethod
+    async def increment_usage(db: AsyncSession, user: User, media_type: MediaType):
+        """Increment usage counter after processing (no limit checks; prefer reserve_quota)"""
+        now = datetime.utcnow()
+        row = (await db.execute(BillingService._charge_statement(user.id, media_type, 1, now, [], insert_if_missing=True))).first()
+        await db.execute(usage_event(user.id, row.tier, media_type, 1, now))
+        await db.commit()
+    
+    @staticmethod
+    async def get_subscription_details(db: AsyncSession, user: User):
+        """
+        Get full subscription info with limits (read-only: usage of an ended period
+        reads as 0, the same CASE reserve_quota resets it with; no row reads as FREE)
+        """
+        expired = func.coalesce(Subscription.current_period_end < datetime.utcnow(), False)
+        row = (await db.execute(
+            select(
+                Subscription.tier,
+                case((expired, 0), else_=Subscription.images_used_this_month).label("images_used"),
+                case((expired, 0), else_=Subscription.videos_used_this_month).label("videos_used"),
+            )
+            .where(Subscription.user_id == user.id)
+        )).first()
+        tier, images_used, videos_used = row if row is not None else (SubscriptionTier.FREE, 0, 0)
+        
+        plan = TIERS[tier]
         
         return {
-            "tier": tier,
-            "tier_name": tier_config["name"],
-            "price": tier_config["price"],
+            "tier": plan.tier,
+            "tier_name": plan.name,
+            "price": plan.price,
             
-            "images_used": subscription.images_used_this_month,
-            "images_limit": tier_config["limits"][MediaType.IMAGE]["count_per_month"],
+            "images_used": images_used,
+            "images_limit": plan.image.count_per_month,
             
-            "videos_used": subscription.videos_used_this_month,
-            "videos_limit": tier_config["limits"][MediaType.VIDEO]["count_per_month"],
+            "videos_used": videos_used,
+            "videos_limit": plan.video.count_per_month,
             
-            "max_image_size_mb": tier_config["limits"][MediaType.IMAGE]["max_size_mb"],
-            "max_video_duration_seconds": tier_config["limits"][MediaType.VIDEO]["max_duration_seconds"],
-            "max_video_size_mb": tier_config["limits"][MediaType.VIDEO]["max_size_mb"],
+            "max_image_size_mb": plan.image.max_size_mb,
+            "max_video_duration_seconds": plan.video.max_duration_seconds,
+            "max_video_size_mb": plan.video.max_size_mb,
             
-            "features": tier_config["features"]
+            "features": list(plan.features)
         }
     
+    @staticmethod
+    async def bulk_update_subscriptions(
+        db: AsyncSession,
+        user_ids: list[int] | None,
+        current_tier: SubscriptionTier | None,
+        tier: SubscriptionTier | None,
+        reset_period: bool,
+        batch_size: int
+    ) -> list[int]:
+        """
+        Move users to `tier` and/or start a new billing period for them, with
+        set-based statements over `batch_size` users per transaction. Selects the
+        users by id, by current tier or both (users without a subscription row
+        are FREE). Returns the ids of the subscriptions changed.
+        """
+        now = datetime.utcnow()
+        changes = {}
+        if tier is not None:
+            changes["tier"] = tier
+        if reset_period:
+            changes.update(
+                images_used_this_month=0,
+                videos_used_this_month=0,
+                current_period_start=now,
+                current_period_end=now + BILLING_PERIOD
+            )
+        conditions = [Subscription.tier == current_tier] if current_tier is not None else []
+        
+        changed = []
+        if user_ids is not None:
+            ids = sorted(set(user_ids))
+            for offset in range(0, len(ids), batch_size):
+                chunk = literal(ids[offset:offset + batch_size], ARRAY(Integer))
+                if current_tier in (None, SubscriptionTier.FREE):
+                    # the implicit FREE subscription becomes a row the update then changes
+                    await db.execute(
+                        pg_insert(Subscription)
+                        .from_select(
+                            ["user_id", "tier", "current_period_start", "current_period_end"],
+                            select(
+                                User.id,
+                                cast(literal_column(f"'{SubscriptionTier.FREE.name}'"), Subscription.tier.type),
+                                literal(now),
+                                literal(now + BILLING_PERIOD)
+                            )
+                            .where(
+                                User.id == any_(chunk),
+                                ~exists().where(Subscription.user_id == User.id)
+                            )
+                        )
+                        .on_conflict_do_nothing(index_elements=[Subscription.user_id])
+                    )
+                changed += (await db.scalars(
+                    update(Subscription)
+                    .where(Subscription.user_id == any_(chunk), *conditions)
+                    .values(changes)
+                    .returning(Subscription.user_id)
+                )).all()
+                await db.commit()
+            return changed
+        
+        # Keyset over user_id: rows stay in order whether or not they leave current_tier
+        last_id = 0
+        while True:
+            batch = (
+                select(Subscription.user_id)
+                .where(Subscription.user_id > last_id, *conditions)
+                .order_by(Subscription.user_id)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            updated = (await db.scalars(
+                update(Subscription)
+                .where(Subscription.user_id.in_(batch), *conditions)
+                .values(changes)
+                .returning(Subscription.user_id)
+            )).all()
+            await db.commit()
+            changed += updated
+            if len(updated) < batch_size:
+                return changed
+            last_id = max(updated)
+    
     @staticmethod
     def get_all_tiers():
         """Get info about all tiers (for pricing page)"""
-        tiers = []
-        for tier, config in TIER_LIMITS.items():
-            tiers.append({
-                "tier": tier,
-                "name": config["name"],
-                "price": config["price"],
-                "features": config["features"],
-                "image_limit": config["limits"][MediaType.IMAGE]["count_per_month"],
-                "video_limit": config["limits"][MediaType.VIDEO]["count_per_month"],
-                "max_video_duration_seconds": config["limits"][MediaType.VIDEO]["max_duration_seconds"]
-            })
-        return tiers
\ No newline at end of file
+        return [
+            {
+                "tier": plan.tier,
+                "name": plan.name,
+                "price": plan.price,
+                "features": list(plan.features),
+                "image_limit": plan.image.count_per_month,
+                "video_limit": plan.video.count_per_month,
+                "max_video_duration_seconds": plan.video.max_duration_seconds
+            }
+            for plan in TIERS.values()
+        ]
+
+# /billing/plans never changes while the process runs: serialize it once
+PLANS_BODY = json.dumps(jsonable_encoder(BillingService.get_all_tiers()), separators=(",", ":")).encode()
+PLANS_ETAG = '"' + hashlib.sha256(PLANS_BODY).hexdigest()[:32] + '"'
@@ -0,0 +1,198 @@
+"""
+Usage analytics.
+
+BillingService appends a UsageEvent wherever it charges or refunds quota, in
+the transaction that does so. roll_up_usage, started from the lifespan, folds
+pending events into daily and monthly rollups per tier and per user: each
+batch is one statement that claims events with SKIP LOCKED, marks them rolled
+up and upserts the four rollups, so any number of processes may run it and an
+event is counted exactly once. The admin reports read the rollups only, never
+subscriptions or the event log, and lag by up to USAGE_ROLLUP_INTERVAL_SECONDS.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, case, cast, delete, distinct, false, func, insert, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.billing.models import RollupPeriod, TierUsageRollup, UsageEvent, UserUsageRollup
+from app.billing.plans import MediaType, SubscriptionTier
+
+logger = logging.getLogger(__name__)
+
+def usage_event(user_id: int, tier: SubscriptionTier, media_type: MediaType, items: int, now: datetime):
+    """INSERT of one event, executed next to the charge or refund it records"""
+    return insert(UsageEvent).values(user_id=user_id, tier=tier, media_type=media_type, items=items, occurred_at=now)
+
+def period_start(period: RollupPeriod, day: date) -> date:
+    """The rollup row covering `day`"""
+    return day.replace(day=1) if period == RollupPeriod.MONTH else day
+
+def _period_start_column(period: RollupPeriod, occurred_at):
+    # no bound parameters: the same expression is selected and grouped by
+    if period == RollupPeriod.MONTH:
+        return cast(func.date_trunc(literal_column("'month'"), occurred_at), Date)
+    return cast(occurred_at, Date)
+
+def _roll_up_statement(batch_size: int):
+    """Roll up to `batch_size` pending events; selects how many it took"""
+    pending = (
+        select(UsageEvent.id)
+        .where(UsageEvent.rolled_up == false())
+        .order_by(UsageEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    rolled = (
+        update(UsageEvent)
+        .where(UsageEvent.id.in_(pending))
+        .values(rolled_up=True)
+        .returning(UsageEvent.user_id, UsageEvent.tier, UsageEvent.media_type, UsageEvent.items, UsageEvent.occurred_at)
+        .cte("rolled")
+    )
+
+    upserts = []
+    for period in RollupPeriod:
+        start = _period_start_column(period, rolled.c.occurred_at)
+        period_value = cast(literal_column(f"'{period.name}'"), TierUsageRollup.period.type)
+
+        by_tier = pg_insert(TierUsageRollup).from_select(
+            ["period", "period_start", "tier", "media_type", "items"],
+            select(period_value, start, rolled.c.tier, rolled.c.media_type, func.sum(rolled.c["items"]))
+            .group_by(start, rolled.c.tier, rolled.c.media_type)
+        )
+        by_tier = by_tier.on_conflict_do_update(
+            index_elements=[TierUsageRollup.period, TierUsageRollup.period_start, TierUsageRollup.tier, TierUsageRollup.media_type],
+            set_={"items": TierUsageRollup.items + by_tier.excluded["items"]}
+        )
+
+        by_user = pg_insert(UserUsageRollup).from_select(
+            ["period", "period_start", "user_id", "media_type", "tier", "items"],
+            select(period_value, start, rolled.c.user_id, rolled.c.media_type, func.max(rolled.c.tier), func.sum(rolled.c["items"]))
+            .group_by(start, rolled.c.user_id, rolled.c.media_type)
+        )
+        by_user = by_user.on_conflict_do_update(
+            index_elements=[UserUsageRollup.period, UserUsageRollup.period_start, UserUsageRollup.user_id, UserUsageRollup.media_type],
+            set_={
+                "items": UserUsageRollup.items + by_user.excluded["items"],
+                # enum order: FREE < BASIC < PRO
+                "tier": func.greatest(UserUsageRollup.tier, by_user.excluded.tier),
+            }
+        )
+        upserts += [by_tier.cte(f"{period.value}_by_tier"), by_user.cte(f"{period.value}_by_user")]
+
+    # Postgres runs every data-modifying CTE once, whether or not the outer query reads it
+    return select(func.count()).select_from(rolled).add_cte(*upserts)
+
+class UsageService:
+
+    @staticmethod
+    async def roll_up(db: AsyncSession, batch_size: int) -> int:
+        """Fold every pending event into the rollups, one batch per transaction"""
+        rolled = 0
+        statement = _roll_up_statement(batch_size)
+        while True:
+            count = await db.scalar(statement)
+            await db.commit()
+            rolled += count
+            if count < batch_size:
+                return rolled
+
+    @staticmethod
+    async def purge_rolled_up(db: AsyncSession, retention_days: int, batch_size: int) -> int:
+        """Delete rolled-up events older than the retention in batches (the rollups keep their totals)"""
+        purged = 0
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        while True:
+            old_ids = (
+                select(UsageEvent.id)
+                .where(UsageEvent.rolled_up, UsageEvent.occurred_at < cutoff)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(delete(UsageEvent).where(UsageEvent.id.in_(old_ids)))
+            await db.commit()
+            purged += result.rowcount
+            if result.rowcount < batch_size:
+                return purged
+
+    @staticmethod
+    async def usage_totals(
+        db: AsyncSession,
+        period: RollupPeriod,
+        start: date,
+        end: date,
+        media_type: MediaType = None
+    ) -> list[dict]:
+        """Items per period, tier and media type from `start` to `end` (inclusive)"""
+        query = (
+            select(TierUsageRollup.period_start, TierUsageRollup.tier, TierUsageRollup.media_type, TierUsageRollup.items)
+            .where(
+                TierUsageRollup.period == period,
+                TierUsageRollup.period_start.between(period_start(period, start), end)
+            )
+            .order_by(TierUsageRollup.period_start, TierUsageRollup.tier, TierUsageRollup.media_type)
+        )
+        if media_type is not None:
+            query = query.where(TierUsageRollup.media_type == media_type)
+        return [dict(row._mapping) for row in await db.execute(query)]
+
+    @staticmethod
+    async def top_consumers(
+        db: AsyncSession,
+        period: RollupPeriod,
+        day: date,
+        media_type: MediaType,
+        limit: int
+    ) -> list[dict]:
+        """The `limit` users with the most items in the period containing `day`"""
+        rows = await db.execute(
+            select(UserUsageRollup.user_id, UserUsageRollup.tier, UserUsageRollup.items)
+            .where(
+                UserUsageRollup.period == period,
+                UserUsageRollup.period_start == period_start(period, day),
+                UserUsageRollup.media_type == media_type
+            )
+            .order_by(UserUsageRollup.items.desc())
+            .limit(limit)
+        )
+        return [dict(row._mapping) for row in rows]
+
+    @staticmethod
+    async def tier_distribution(db: AsyncSession, period: RollupPeriod, day: date) -> list[dict]:
+        """
+        Users who metered anything in the period containing `day`, and their
+        items, per tier. A user who upgraded during the period counts under the
+        higher tier (per media type, so rarely under both).
+        """
+        rows = (await db.execute(
+            select(
+                UserUsageRollup.tier,
+                func.count(distinct(UserUsageRollup.user_id)).label("active_users"),
+                func.sum(case((UserUsageRollup.media_type == MediaType.IMAGE, UserUsageRollup.items), else_=0)).label("images"),
+                func.sum(case((UserUsageRollup.media_type == MediaType.VIDEO, UserUsageRollup.items), else_=0)).label("videos"),
+            )
+            .where(UserUsageRollup.period == period, UserUsageRollup.period_start == period_start(period, day))
+            .group_by(UserUsageRollup.tier)
+            .order_by(UserUsageRollup.tier)
+        )).all()
+
+        total = sum(row.active_users for row in rows)
+        return [
+            {**row._mapping, "share": round(row.active_users / total, 4) if total else 0.0}
+            for row in rows
+        ]
+
+async def roll_up_usage(session_factory, interval_seconds: int, batch_size: int, retention_days: int):
+    """Background loop started from the app lifespan"""
+    while True:
+        try:
+            async with session_factory() as db:
+                rolled = await UsageService.roll_up(db, batch_size)
+                purged = await UsageService.purge_rolled_up(db, retention_days, batch_size)
+            if rolled or purged:
+                logger.info("Rolled up %d usage events, purged %d", rolled, purged)
+        except Exception:
+            logger.exception("Usage roll-up failed")
+        await asyncio.sleep(interval_seconds)
@@ -6,11 +6,178 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7 
+    REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS: int = 3600
+    REFRESH_TOKEN_SWEEP_BATCH_SIZE: int = 5000
+    
+    # Connection pool of the async engine, per process (the sync engine does not pool)
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Create missing tables at startup; when False, startup only checks them (see app/schema.py)
+    DB_CREATE_SCHEMA_ON_STARTUP: bool = True
+    
+    # Authenticated-user cache used by get_current_user
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Password hashing (argon2 cost parameters and the process pool running them)
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST_KB: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+    
+    PLANS_CACHE_MAX_AGE_SECONDS: int = 300
+    
+    # Usage analytics (app/billing/usage.py): metered items are logged to usage_events and folded
+    # into daily and monthly rollups every USAGE_ROLLUP_INTERVAL_SECONDS; the admin reports read
+    # the rollups only. Rolled-up events are deleted after USAGE_EVENT_RETENTION_DAYS
+    USAGE_ROLLUP_INTERVAL_SECONDS: int = 60
+    USAGE_ROLLUP_BATCH_SIZE: int = 10000
+    USAGE_EVENT_RETENTION_DAYS: int = 90
+    # POST /billing/admin/subscriptions/bulk commits this many users per transaction
+    BILLING_BULK_BATCH_SIZE: int = 5000
+    BILLING_BULK_MAX_USER_IDS: int = 100000
+    
+    # ZR-DCE inference
+    MODEL_WEIGHTS_PATH: str = "app/models/zr_dce_models/ZR_DECE_exp1.8_.weights.h5"
+    MODEL_VERSION: str = "zr-dce-exp1.8"
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_BATCH_PIXELS: int = 8 * 1920 * 1080
+    INFERENCE_MAX_WAIT_MS: int = 10
+    INFERENCE_BUCKET_MULTIPLE: int = 64
+    # Above INFERENCE_LOWRES_MIN_PIXELS, curves are estimated at 1/INFERENCE_LOWRES_SCALE size
+    # or smaller, so at most INFERENCE_LOWRES_MAX_ESTIMATE_PIXELS reach the network (scale 1 disables)
+    INFERENCE_LOWRES_SCALE: int = 4
+    INFERENCE_LOWRES_MIN_PIXELS: int = 1280 * 720
+    INFERENCE_LOWRES_MAX_ESTIMATE_PIXELS: int = 960 * 540
+    # Load the model in the lifespan and trace the shape buckets that images of these
+    # WIDTHxHEIGHT sizes are padded to; /health answers 503 until it is done. Other
+    # buckets trace once, on their first batch
+    MODEL_WARMUP_ON_STARTUP: bool = True
+    MODEL_WARMUP_SIZES: str = "512x512,1280x720,720x1280,1920x1080,1080x1920,3840x2160,2160x3840"
+    # Reduced-precision backends ("tflite-fp16", "tflite-int8"; chosen per tier in plans.py).
+    # A conversion serves only if its worst gate image stays within these bounds of float32,
+    # otherwise the tier falls back to "tf" (see app/model/tflite.py); 0 threads: all CPUs
+    TFLITE_NUM_THREADS: int = 0
+    TFLITE_INTERPRETERS_PER_MODEL: int = 4
+    # Empty: app/model/gate/low_light.png, shipped with the package
+    MODEL_GATE_IMAGE: str = ""
+    MODEL_GATE_MIN_PSNR_DB: float = 40.0
+    MODEL_GATE_MIN_SSIM: float = 0.98
+    # Conversions that passed the gate, so only the first start (or `python -m app.model.tflite`
+    # at build time) pays for converting and gating
+    TFLITE_CACHE_DIR: str = "./models/tflite"
+    
+    # Model-server processes (app/model/server.py): TensorFlow runs there instead of in the
+    # API and job workers (0: in-process). Set MODEL_SERVER_SPAWN=False when they run
+    # separately via `python -m app.model.server`; 0 threads: TensorFlow's default
+    MODEL_SERVER_PROCESSES: int = 0
+    MODEL_SERVER_SPAWN: bool = True
+    MODEL_SERVER_SOCKET_DIR: str = "/tmp/shadowshift-model-servers"
+    MODEL_SERVER_CONNECT_TIMEOUT_SECONDS: int = 60
+    MODEL_SERVER_INTRA_OP_THREADS: int = 0
+    MODEL_SERVER_INTER_OP_THREADS: int = 0
+    # Give each server its own share of the CPUs this process may run on
+    MODEL_SERVER_PIN_CPUS: bool = False
+    
+    # Video pipeline
+    VIDEO_BATCH_SIZE: int = 8
+    VIDEO_QUEUE_FRAMES: int = 16
+    VIDEO_CRF: int = 18
+    VIDEO_PRESET: str = "veryfast"
+    FFMPEG_BINARY: str = "ffmpeg"
+    # Run ZR-DCE on keyframes only and reuse curves in between (thresholds per tier in plans.py)
+    VIDEO_TEMPORAL_REUSE: bool = True
     
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE_MB: int = 100
+    # Uploads above this many pixels are rejected from their header, before decoding; below
+    # it, images larger than the tier's max_resolution are decoded down to fit (plans.py)
+    IMAGE_MAX_DECODE_PIXELS: int = 100_000_000
+    UPLOAD_CHUNK_SIZE_KB: int = 1024
+    
+    # Enhanced-output cache under UPLOAD_DIR/cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_MB: int = 2048
+    RESULT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RESULT_CACHE_RESCAN_SECONDS: int = 300
+    # Whether re-uploads served from the cache still count toward the monthly quota
+    RESULT_CACHE_HITS_COUNT_USAGE: bool = True
+    
+    # Background enhancement jobs (app/jobs). Set JOB_WORKER_PROCESSES=0 when workers
+    # run separately via `python -m app.jobs.worker`
+    JOB_WORKER_PROCESSES: int = 1
+    JOB_WORKER_CONCURRENCY: int = 2
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_LEASE_SECONDS: int = 60
+    JOB_MAX_ATTEMPTS: int = 3
+    # On SIGTERM running jobs get JOB_WORKER_STOP_GRACE_SECONDS to finish, then are cancelled and
+    # requeued; JobWorkerPool.stop kills a worker still alive after JOB_WORKER_STOP_TIMEOUT_SECONDS
+    JOB_WORKER_STOP_GRACE_SECONDS: float = 10.0
+    JOB_WORKER_STOP_TIMEOUT_SECONDS: float = 30.0
+    # Scheduling cost of a video: one image plus one more per this many seconds
+    JOB_VIDEO_SECONDS_PER_UNIT: int = 10
+    # Job progress pushed to GET /jobs/events streams (app/jobs/events.py): "postgres" (NOTIFY/LISTEN,
+    # workers in any process) or "memory" (workers in the API process only)
+    JOB_EVENTS_BROKER: str = "postgres"
+    JOB_EVENTS_PROGRESS_INTERVAL_SECONDS: float = 0.5
+    JOB_EVENTS_KEEPALIVE_SECONDS: int = 15
+    JOB_EVENTS_QUEUE_SIZE: int = 32
+    
+    # Admission control of synchronous enhancement (app/admission). Load is the largest of the
+    # inference queue depth and the admitted work in flight over these maxima (1.0: full); a tier
+    # is shed (503) above its shed_at_load and rate limited (429) by its work buckets (plans.py).
+    # ADMISSION_BACKEND "postgres" shares the buckets between workers; load is always per process
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_BACKEND: str = "memory"
+    ADMISSION_MAX_QUEUE_DEPTH: int = 64
+    ADMISSION_MAX_INFLIGHT_MEGAPIXELS: float = 64.0
+    ADMISSION_MAX_INFLIGHT_VIDEO_SECONDS: float = 600.0
+    # One request counts for at most this share of an ADMISSION_MAX_* (a max-length PRO video
+    # alone must not shed PRO, or a BASIC one shed FREE)
+    ADMISSION_MAX_TICKET_SHARE: float = 0.25
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+    ADMISSION_MEMORY_MAX_BUCKETS: int = 100000
+    
+    # Bulk image batches: items in flight at once, so the engine can fill its batches
+    BATCH_CONCURRENCY: int = 16
+    
+    # Gallery
+    THUMBNAIL_MAX_EDGE: int = 256
+    THUMBNAIL_QUALITY: int = 70
+    GALLERY_PAGE_SIZE: int = 50
+    GALLERY_MAX_PAGE_SIZE: int = 200
+    
+    # Downloads (GET /media/{id}/download). Smaller encodings written next to each enhanced
+    # image, most preferred first ("" for none); served to clients that name them in Accept
+    IMAGE_VARIANT_FORMATS: str = "avif,webp"
+    IMAGE_VARIANT_WEBP_QUALITY: int = 80
+    IMAGE_VARIANT_AVIF_QUALITY: int = 60
+    IMAGE_VARIANT_AVIF_SPEED: int = 8
+    MEDIA_DOWNLOAD_CHUNK_KB: int = 1024
+    MEDIA_DOWNLOAD_MAX_AGE_SECONDS: int = 86400
+    # Behind nginx: an `internal` location aliased to UPLOAD_DIR (e.g. "/_media/"); the app then
+    # only checks access and nginx sends the file (Range included) with sendfile
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""
+    
+    # Prometheus metrics at GET /metrics (app/metrics.py). Every process writes its metrics to
+    # files in METRICS_MULTIPROC_DIR, so any uvicorn worker's /metrics covers all of them
+    # ("" keeps them in memory: right for a single process only)
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: str = "/tmp/shadowshift-metrics"
+    
+    # Slow-request profiler (app/profiler.py), off at 0: requests slower than this get the
+    # stack samples taken while they ran written to PROFILE_DIR as collapsed stacks
+    PROFILE_SLOW_REQUEST_MS: int = 0
+    PROFILE_SAMPLE_INTERVAL_MS: int = 5
+    PROFILE_HISTORY_SECONDS: int = 60
+    PROFILE_DIR: str = "./profiles"
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
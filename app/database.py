@@ -1,10 +1,36 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import NullPool
 from app.config import settings
+from app.metrics import instrument_engine
 
-engine = create_engine(settings.DATABASE_URL)  
+def async_database_url(url: str) -> URL:
+    """Same database as DATABASE_URL, but through the asyncpg driver"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg")
+    return parsed
+
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+
+# Sync engine: schema creation, admin scripts and benchmarks only. Requests go through
+# the async engine, so this one keeps no pool and holds a connection only while in use
+engine = create_engine(settings.DATABASE_URL, poolclass=NullPool)
+async_engine = create_async_engine(async_database_url(settings.DATABASE_URL), **POOL_OPTIONS)
+# statement count and time, per request and overall (app/metrics.py)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -12,4 +38,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
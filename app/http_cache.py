@@ -0,0 +1,31 @@
+"""Helpers for HTTP validators (ETag / If-None-Match / If-Modified-Since)"""
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True when an If-None-Match header matches `etag` (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def not_modified(request_headers: Mapping[str, str], etag: str, last_modified: float) -> bool:
+    """
+    Whether a conditional GET can be answered with 304. If-None-Match wins;
+    If-Modified-Since is only looked at without it (RFC 9110 13.2.2)
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return int(last_modified) <= since.timestamp()
@@ -0,0 +1,274 @@
+"""
+Push-based job progress.
+
+Job workers publish a JobEvent when a job starts, as its video frames are
+encoded (at most every JOB_EVENTS_PROGRESS_INTERVAL_SECONDS, with an ETA) and
+when it succeeds or fails. Each API process keeps one subscription to the
+broker and fans events out in memory to the server-sent event streams of the
+job's owner (GET /jobs/events, GET /jobs/{id}/events). A watching client costs
+one authentication when it connects and a queue put per event, instead of
+get_current_user and a jobs query on every poll.
+
+Brokers (JOB_EVENTS_BROKER):
+  - "postgres", the default: NOTIFY on one channel, LISTEN on one dedicated
+    asyncpg connection per API process, so workers may run anywhere
+  - "memory": delivery within the process only (job workers in the API
+    process, benchmarks)
+Implement EventBroker to use something else, e.g. Redis pub/sub.
+"""
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Callable
+from sqlalchemy import func, select
+from app.config import settings
+from app.database import AsyncSessionLocal, async_database_url
+from app.jobs.models import Job, JobState
+from app.metrics import JOB_EVENT_STREAMS
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "job_events"
+
+@dataclass(frozen=True, slots=True)
+class JobEvent:
+    job_id: int
+    user_id: int
+    state: JobState
+    progress: float
+    frames_done: int | None = None
+    frames_total: int | None = None
+    eta_seconds: float | None = None
+    media_id: int | None = None
+    error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (JobState.SUCCEEDED, JobState.FAILED)
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobEvent":
+        return cls(job.id, job.user_id, job.state, job.progress, media_id=job.media_id, error=job.error)
+
+    def to_json(self) -> str:
+        return json.dumps({**asdict(self), "state": self.state.value}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "JobEvent":
+        values = json.loads(payload)
+        return cls(**{**values, "state": JobState(values["state"])})
+
+class Subscription:
+    """Events of one user's jobs (or one job) for one stream; the oldest are dropped if it falls behind"""
+
+    def __init__(self, user_id: int, job_id: int | None, queue_size: int):
+        self.user_id = user_id
+        self.job_id = job_id
+        self._queue: asyncio.Queue[JobEvent] = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, event: JobEvent):
+        if self._queue.full():
+            # progress supersedes progress; a slow reader only misses intermediate steps
+            self._queue.get_nowait()
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> JobEvent | None:
+        """The next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+class EventHub:
+    """In-process fan-out from the broker to the streams of each user"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = {}
+
+    def subscribe(self, user_id: int, job_id: int | None = None) -> Subscription:
+        subscription = Subscription(user_id, job_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        JOB_EVENT_STREAMS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+        JOB_EVENT_STREAMS.dec()
+
+    def deliver(self, event: JobEvent):
+        """Hand an event to every stream watching it (on the event loop)"""
+        for subscription in self._subscriptions.get(event.user_id, ()):
+            if subscription.job_id is None or subscription.job_id == event.job_id:
+                subscription.put(event)
+
+    def __len__(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+class EventBroker(ABC):
+    """Carries events from the processes running jobs to the API processes"""
+
+    @abstractmethod
+    async def publish(self, event: JobEvent) -> None:
+        ...
+
+    @abstractmethod
+    async def start(self, deliver: Callable[[JobEvent], None]) -> None:
+        """Call `deliver` on the event loop for every event published from now on"""
+        ...
+
+    @abstractmethod
+    async def stop(self) -> None:
+        ...
+
+class MemoryEventBroker(EventBroker):
+    """Delivers within this process only"""
+
+    def __init__(self):
+        self._deliver: Callable[[JobEvent], None] | None = None
+
+    async def publish(self, event: JobEvent) -> None:
+        if self._deliver is not None:
+            self._deliver(event)
+
+    async def start(self, deliver: Callable[[JobEvent], None]) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+class PostgresEventBroker(EventBroker):
+    """NOTIFY through the async pool; LISTEN on one connection of its own, reopened if it drops"""
+
+    def __init__(self, dsn: str, channel: str = CHANNEL, reconnect_seconds: float = 2.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._task: asyncio.Task | None = None
+
+    async def publish(self, event: JobEvent) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(select(func.pg_notify(self.channel, event.to_json())))
+            await db.commit()
+
+    async def start(self, deliver: Callable[[JobEvent], None]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(deliver))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _listen(self, deliver: Callable[[JobEvent], None]):
+        import asyncpg
+
+        def on_notify(connection, pid, channel, payload):
+            try:
+                deliver(JobEvent.from_json(payload))
+            except Exception:
+                logger.exception("Bad job event %r", payload)
+
+        while True:
+            lost = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, on_notify)
+                await lost.wait()
+                logger.warning("Job event connection lost; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Listening for job events failed; retrying")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            # events published meanwhile are lost; a client that reconnects gets the job's current state first
+            await asyncio.sleep(self.reconnect_seconds)
+
+class JobEvents:
+    """Publishes through the configured broker and fans its events out to local streams"""
+
+    def __init__(self, broker: EventBroker, queue_size: int):
+        self.broker = broker
+        self.hub = EventHub(queue_size)
+
+    async def start(self):
+        """Receive events in this process (API lifespan); workers that only publish skip it"""
+        await self.broker.start(self.hub.deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    async def publish(self, event: JobEvent):
+        """Best effort: a lost event never fails the job, and its outcome is in the jobs table"""
+        try:
+            await self.broker.publish(event)
+        except Exception:
+            logger.exception("Publishing an event of job %d failed", event.job_id)
+
+    def subscribe(self, user_id: int, job_id: int | None = None) -> Subscription:
+        return self.hub.subscribe(user_id, job_id)
+
+    def unsubscribe(self, subscription: Subscription):
+        self.hub.unsubscribe(subscription)
+
+    def use_broker(self, broker: EventBroker):
+        self.broker = broker
+
+class JobProgress:
+    """
+    Frame counts reported by the video pipeline's encode thread, published
+    from the event loop at most every `interval` seconds, with an ETA from the
+    rate so far. `progress` is the latest value, persisted by the job heartbeat.
+    """
+
+    def __init__(self, job: Job, loop: asyncio.AbstractEventLoop, interval: float):
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.loop = loop
+        self.interval = interval
+        self.progress = 0.0
+        self._started = time.monotonic()
+        self._published = 0.0
+
+    def frames(self, done: int, total: int):
+        """Pipeline callback (any thread)"""
+        if total <= 0:
+            return
+        self.progress = min(1.0, done / total)
+        now = time.monotonic()
+        if now - self._published < self.interval:
+            return
+        self._published = now
+        elapsed = now - self._started
+        eta = elapsed * max(0, total - done) / done if done else None
+        event = JobEvent(
+            self.job_id, self.user_id, JobState.RUNNING, self.progress,
+            frames_done=done, frames_total=total, eta_seconds=round(eta, 1) if eta is not None else None
+        )
+        asyncio.run_coroutine_threadsafe(job_events.publish(event), self.loop)
+
+def _make_broker() -> EventBroker:
+    if settings.JOB_EVENTS_BROKER == "memory":
+        return MemoryEventBroker()
+    # plain asyncpg: the same database as DATABASE_URL
+    dsn = async_database_url(settings.DATABASE_URL).set(drivername="postgresql")
+    return PostgresEventBroker(dsn.render_as_string(hide_password=False))
+
+job_events = JobEvents(_make_broker(), settings.JOB_EVENTS_QUEUE_SIZE)
@@ -0,0 +1,49 @@
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import Column, Integer, ForeignKey, String, Float, BigInteger, DateTime, Index, Enum as SQLEnum
+from app.database import Base
+from app.billing.plans import MediaType, SubscriptionTier
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class Job(Base):
+    """One queued enhancement; the upload is on disk and its quota reserved at submit time"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    tier = Column(SQLEnum(SubscriptionTier), nullable=False)
+    media_type = Column(SQLEnum(MediaType), nullable=False)
+    state = Column(SQLEnum(JobState), nullable=False, default=JobState.QUEUED)
+    
+    original_filename = Column(String, nullable=False)
+    original_path = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    extension = Column(String, nullable=False)
+    content_sha256 = Column(String(64), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    duration_seconds = Column(Float, nullable=True)
+    # current_period_start of the subscription when the quota was reserved
+    quota_period_start = Column(DateTime, nullable=True)
+    
+    progress = Column(Float, nullable=False, default=0.0)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    media_id = Column(Integer, ForeignKey("media_files.id"), nullable=True)
+    
+    # All job timestamps are naive UTC from the application, so waits can be compared
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Claims walk the queued jobs of one tier in FIFO order
+        Index("ix_jobs_queued", "tier", "id", postgresql_where=state == JobState.QUEUED),
+        Index("ix_jobs_running", "heartbeat_at", postgresql_where=state == JobState.RUNNING),
+    )
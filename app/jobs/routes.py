@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.auth.cache import CachedUser
+from app.auth.dependencies import get_current_admin, get_current_user, get_stream_user
+from app.billing.plans import MediaType
+from app.jobs import schemas
+from app.jobs.service import JobService
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+# no buffering on the way out: nginx would otherwise hold events back
+EVENT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.post("/{media_type}", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    media_type: MediaType,
+    request: Request,
+    filename: str | None = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue an image or video (raw request body) for enhancement; watch /jobs/{id}/events for the result"""
+    return await JobService.submit(db, current_user, request, media_type, filename)
+
+@router.get("", response_model=list[schemas.JobResponse])
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """My most recent jobs"""
+    return await JobService.list_jobs(db, current_user, limit)
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_my_job_events(current_user: CachedUser = Depends(get_stream_user)):
+    """
+    Server-sent events for all my jobs: start, frame-level progress with ETA,
+    success or failure. Authenticated once, at connect (header or access_token)
+    """
+    return StreamingResponse(
+        JobService.event_stream(current_user),
+        media_type="text/event-stream",
+        headers=EVENT_STREAM_HEADERS
+    )
+
+@router.get("/admin/queue")
+async def admin_queue_stats(
+    admin: CachedUser = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queued and running jobs per tier, with the oldest queued job's wait"""
+    return await JobService.queue_stats(db)
+
+@router.get("/{job_id}/events", response_class=StreamingResponse)
+async def stream_job_events(job_id: int, current_user: CachedUser = Depends(get_stream_user)):
+    """Server-sent events for one of my jobs, starting with its current state; ends when it succeeds or fails"""
+    return StreamingResponse(
+        await JobService.job_event_stream(current_user, job_id),
+        media_type="text/event-stream",
+        headers=EVENT_STREAM_HEADERS
+    )
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+async def get_job(
+    job_id: int,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """State and progress of one of my jobs; media_id is set once it succeeds"""
+    return await JobService.get_job(db, current_user, job_id)
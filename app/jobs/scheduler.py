@@ -0,0 +1,38 @@
+"""
+Weighted-fair choice of which tier's queue a worker serves next.
+
+Stride scheduling: every tier has a virtual "pass"; a worker tries tiers in
+order of increasing pass and, after taking a job, advances that tier's pass by
+the job's cost divided by the tier's queue_weight. With every tier backlogged,
+each gets worker time in proportion to its weight (PRO 6 : BASIC 3 : FREE 1
+by default), so higher tiers are served first without starving FREE. A tier
+that was tried and found empty is lifted to the current pass, so it cannot
+bank credit while idle and then monopolise the workers.
+
+Each worker task keeps its own scheduler; claims themselves are coordinated
+by the database (SELECT ... FOR UPDATE SKIP LOCKED).
+"""
+from typing import Mapping
+from app.billing.plans import SubscriptionTier
+
+class WeightedFairScheduler:
+
+    def __init__(self, weights: Mapping[SubscriptionTier, float]):
+        self.weights = dict(weights)
+        self.passes = {tier: 0.0 for tier in self.weights}
+
+    def order(self) -> list[SubscriptionTier]:
+        """Tiers to try, most entitled first (ties go to the heavier weight)"""
+        return sorted(self.passes, key=lambda tier: (self.passes[tier], -self.weights[tier]))
+
+    def charge(self, tier: SubscriptionTier, cost: float, skipped: list[SubscriptionTier]):
+        """`tier` was served a job of `cost`; `skipped` were tried before it and had nothing queued"""
+        current = self.passes[tier]
+        for idle in skipped:
+            self.passes[idle] = max(self.passes[idle], current)
+        self.passes[tier] = current + cost / self.weights[tier]
+
+    def idle(self):
+        """Nothing queued anywhere: start everyone level"""
+        floor = max(self.passes.values())
+        self.passes = dict.fromkeys(self.passes, floor)
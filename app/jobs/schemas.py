@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+from app.billing.plans import MediaType, SubscriptionTier
+from app.jobs.models import JobState
+
+class JobResponse(BaseModel):
+    id: int
+    tier: SubscriptionTier
+    media_type: MediaType
+    state: JobState
+    original_filename: str
+    progress: float
+    error: str | None
+    media_id: int | None
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+from fastapi import HTTPException, Request, status
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.auth.cache import CachedUser
+from app.billing.plans import MediaType
+from app.billing.service import BillingService, QuotaReservation
+from app.jobs.events import JobEvent, JobProgress, Subscription, job_events
+from app.jobs.models import Job, JobState
+from app.jobs.scheduler import WeightedFairScheduler
+from app.media.service import MediaService
+from app.media.uploads import StoredUpload
+
+logger = logging.getLogger(__name__)
+
+def _job_cost(job: Job) -> float:
+    """Scheduling cost in image-equivalents"""
+    if job.media_type == MediaType.VIDEO and job.duration_seconds:
+        return 1.0 + job.duration_seconds / settings.JOB_VIDEO_SECONDS_PER_UNIT
+    return 1.0
+
+def _reservation(job: Job) -> QuotaReservation:
+    """The quota charge taken by submit, rebuilt from the row"""
+    return QuotaReservation(
+        user_id=job.user_id,
+        media_type=job.media_type,
+        count=1,
+        tier=job.tier,
+        period_start=job.quota_period_start
+    )
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+async def _set_state(job_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Job).where(Job.id == job_id).values(**values))
+        await db.commit()
+
+async def _keep_alive(job_id: int, progress: JobProgress):
+    """
+    Refresh the job's lease while it runs, so the stale-job sweep leaves it
+    alone; the latest progress goes with it (events carry it in between)
+    """
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            await _set_state(job_id, heartbeat_at=datetime.utcnow(), progress=progress.progress)
+        except Exception:
+            logger.exception("Heartbeat for job %d failed", job_id)
+
+def _sse(event: JobEvent) -> bytes:
+    return f"data: {event.to_json()}\n\n".encode()
+
+async def _stream(subscription: Subscription, first: JobEvent | None = None) -> AsyncIterator[bytes]:
+    """
+    Server-sent events of a subscription, with a comment line when it has been
+    quiet for JOB_EVENTS_KEEPALIVE_SECONDS so proxies keep the connection; a
+    single-job stream ends with the job
+    """
+    try:
+        if first is not None:
+            yield _sse(first)
+            if first.finished:
+                return
+        while True:
+            event = await subscription.get(settings.JOB_EVENTS_KEEPALIVE_SECONDS)
+            if event is None:
+                yield b": keepalive\n\n"
+                continue
+            yield _sse(event)
+            if event.finished and subscription.job_id is not None:
+                return
+    finally:
+        job_events.unsubscribe(subscription)
+
+class JobService:
+
+    @staticmethod
+    async def submit(
+        db: AsyncSession,
+        user: CachedUser,
+        request: Request,
+        media_type: MediaType,
+        filename: str | None
+    ) -> Job:
+        """Store the upload, reserve its quota and queue it; a worker picks it up by tier"""
+        stored = await MediaService.store_upload(user, request, media_type)
+        try:
+            duration_seconds = None
+            if media_type == MediaType.VIDEO:
+                duration_seconds = (await MediaService.probe_video(stored.path)).duration_seconds
+            reservation = await BillingService.reserve_quota(
+                db, user, media_type, file_size_mb=stored.size_mb, duration_seconds=duration_seconds
+            )
+        except BaseException:
+            await run_in_threadpool(_remove_file, stored.path)
+            raise
+
+        job = Job(
+            user_id=user.id,
+            tier=user.tier,
+            media_type=media_type,
+            state=JobState.QUEUED,
+            original_filename=filename or f"upload{stored.extension}",
+            original_path=stored.path,
+            content_type=stored.content_type,
+            extension=stored.extension,
+            content_sha256=stored.sha256,
+            size_bytes=stored.size,
+            duration_seconds=duration_seconds,
+            quota_period_start=reservation.period_start
+        )
+        try:
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+        except BaseException:
+            await db.rollback()
+            await BillingService.release_quota(db, reservation)
+            await run_in_threadpool(_remove_file, stored.path)
+            raise
+        return job
+
+    @staticmethod
+    async def get_job(db: AsyncSession, user: CachedUser, job_id: int) -> Job:
+        job = await db.get(Job, job_id)
+        if job is None or job.user_id != user.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Job not found"
+            )
+        return job
+
+    @staticmethod
+    async def event_stream(user: CachedUser) -> AsyncIterator[bytes]:
+        """Events of every job of the user from now on; runs until the client disconnects"""
+        # subscribes once the response starts streaming
+        async for chunk in _stream(job_events.subscribe(user.id)):
+            yield chunk
+
+    @staticmethod
+    async def job_event_stream(user: CachedUser, job_id: int) -> AsyncIterator[bytes]:
+        """
+        Events of one job: its current state first (the only query), then what
+        the workers publish, until it succeeds or fails
+        """
+        # subscribe before reading, so nothing published in between is missed
+        subscription = job_events.subscribe(user.id, job_id)
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await JobService.get_job(db, user, job_id)
+        except BaseException:
+            job_events.unsubscribe(subscription)
+            raise
+        return _stream(subscription, JobEvent.from_job(job))
+
+    @staticmethod
+    async def list_jobs(db: AsyncSession, user: CachedUser, limit: int) -> list[Job]:
+        """Most recent first"""
+        return list(await db.scalars(
+            select(Job).where(Job.user_id == user.id).order_by(Job.id.desc()).limit(limit)
+        ))
+
+    @staticmethod
+    async def queue_stats(db: AsyncSession) -> dict:
+        """Jobs per tier and state, and how long the oldest queued job of each tier has waited"""
+        rows = await db.execute(
+            select(Job.tier, Job.state, func.count(), func.min(Job.created_at))
+            .where(Job.state.in_((JobState.QUEUED, JobState.RUNNING)))
+            .group_by(Job.tier, Job.state)
+        )
+        now = datetime.utcnow()
+        stats = {}
+        for tier, state, count, oldest in rows:
+            entry = stats.setdefault(tier.value, {"queued": 0, "running": 0, "oldest_queued_seconds": None})
+            entry[state.value] = count
+            if state == JobState.QUEUED:
+                entry["oldest_queued_seconds"] = round((now - oldest).total_seconds(), 1)
+        return stats
+
+    @staticmethod
+    async def claim(db: AsyncSession, worker: str, scheduler: WeightedFairScheduler) -> Job | None:
+        """
+        Take the oldest queued job of the tier the scheduler picks. SKIP LOCKED
+        lets concurrent workers pass over rows another worker is claiming.
+        """
+        skipped = []
+        for tier in scheduler.order():
+            candidate = (
+                select(Job.id)
+                .where(Job.state == JobState.QUEUED, Job.tier == tier)
+                .order_by(Job.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            now = datetime.utcnow()
+            job = await db.scalar(
+                update(Job)
+                .where(Job.id == candidate, Job.state == JobState.QUEUED)
+                .values(
+                    state=JobState.RUNNING,
+                    worker=worker,
+                    attempts=Job.attempts + 1,
+                    started_at=func.coalesce(Job.started_at, now),
+                    heartbeat_at=now
+                )
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if job is not None:
+                scheduler.charge(tier, _job_cost(job), skipped)
+                return job
+            skipped.append(tier)
+
+        scheduler.idle()
+        return None
+
+    @staticmethod
+    async def run(job: Job):
+        """Enhance a claimed job and record the outcome; failures are stored on the job, not raised"""
+        user = CachedUser(id=job.user_id, is_active=True, is_admin=False, tier=job.tier)
+        stored = StoredUpload(job.original_path, job.size_bytes, job.content_sha256, job.content_type, job.extension)
+        reservation = _reservation(job)
+        progress = JobProgress(job, asyncio.get_running_loop(), settings.JOB_EVENTS_PROGRESS_INTERVAL_SECONDS)
+        await job_events.publish(JobEvent(job.id, job.user_id, JobState.RUNNING, 0.0))
+        keep_alive = asyncio.create_task(_keep_alive(job.id, progress))
+        try:
+            async with AsyncSessionLocal() as db:
+                media = await MediaService.process_upload(
+                    db, user, job.media_type, stored, job.original_filename, reservation, progress.frames
+                )
+        except asyncio.CancelledError:
+            # Worker shutting down mid-job
+            await asyncio.shield(JobService._stopped(job, reservation))
+            raise
+        except Exception as exc:
+            if isinstance(exc, HTTPException):
+                error = str(exc.detail)
+            else:
+                logger.exception("Job %d failed", job.id)
+                error = "Enhancement failed"
+            async with AsyncSessionLocal() as db:
+                await BillingService.release_quota(db, reservation)
+            await JobService._finish(job, state=JobState.FAILED, error=error)
+            return
+        finally:
+            keep_alive.cancel()
+
+        await JobService._finish(job, state=JobState.SUCCEEDED, progress=1.0, media_id=media.id)
+
+    @staticmethod
+    async def _stopped(job: Job, reservation: QuotaReservation):
+        """
+        Put a job interrupted by its worker stopping back in the queue, with
+        its upload and charge (a graceful stop does not use up an attempt). If
+        the charge was already refunded (a free cache hit) or the upload is
+        gone, it fails instead, refunded.
+        """
+        if not reservation.released and await run_in_threadpool(os.path.exists, job.original_path):
+            await _set_state(job.id, state=JobState.QUEUED, worker=None, attempts=Job.attempts - 1, progress=0.0)
+            await job_events.publish(JobEvent(job.id, job.user_id, JobState.QUEUED, 0.0))
+            return
+        async with AsyncSessionLocal() as db:
+            await BillingService.release_quota(db, reservation)
+        await run_in_threadpool(_remove_file, job.original_path)
+        await JobService._finish(job, state=JobState.FAILED, error="Worker stopped")
+
+    @staticmethod
+    async def _finish(
+        job: Job,
+        state: JobState,
+        progress: float | None = None,
+        media_id: int | None = None,
+        error: str | None = None
+    ):
+        """Record the outcome, then tell the job's watchers"""
+        values = {"state": state, "finished_at": datetime.utcnow(), "error": error, "media_id": media_id}
+        if progress is not None:
+            values["progress"] = progress
+        await _set_state(job.id, **values)
+        await job_events.publish(JobEvent(
+            job.id, job.user_id, state, job.progress if progress is None else progress, media_id=media_id, error=error
+        ))
+
+    @staticmethod
+    async def requeue_stale(db: AsyncSession) -> int:
+        """
+        Running jobs whose worker stopped renewing the lease (crashed, killed)
+        go back to the queue, or fail for good after JOB_MAX_ATTEMPTS.
+        """
+        now = datetime.utcnow()
+        stale = (Job.state == JobState.RUNNING, Job.heartbeat_at < now - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+        requeued = await db.execute(
+            update(Job)
+            .where(*stale, Job.attempts < settings.JOB_MAX_ATTEMPTS)
+            .values(state=JobState.QUEUED, worker=None)
+            .execution_options(synchronize_session=False)
+        )
+        failed = list(await db.scalars(
+            update(Job)
+            .where(*stale, Job.attempts >= settings.JOB_MAX_ATTEMPTS)
+            .values(state=JobState.FAILED, error="Worker lost", finished_at=now)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        ))
+        await db.commit()
+
+        for job in failed:
+            await BillingService.release_quota(db, _reservation(job))
+            await run_in_threadpool(_remove_file, job.original_path)
+            await job_events.publish(JobEvent.from_job(job))
+        return requeued.rowcount + len(failed)
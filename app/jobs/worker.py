@@ -0,0 +1,147 @@
+"""
+Job worker processes.
+
+JobWorkerPool spawns JOB_WORKER_PROCESSES processes, either from the API
+lifespan or on their own with `python -m app.jobs.worker` (then set
+JOB_WORKER_PROCESSES=0 for the API). Each process loads and warms the model
+of every inference backend in use once and runs JOB_WORKER_CONCURRENCY claim
+loops on one event loop, so the jobs it has in flight share its micro-batching
+inference engines (whose batches run in the model servers when
+MODEL_SERVER_PROCESSES is set). SIGTERM stops claiming and gives running
+jobs JOB_WORKER_STOP_GRACE_SECONDS to finish; the rest are cancelled, which
+puts them back in the queue with their charge (JobService.run), well before
+JobWorkerPool.stop kills the process after JOB_WORKER_STOP_TIMEOUT_SECONDS.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.billing.plans import TIERS
+from app.jobs.scheduler import WeightedFairScheduler
+from app.jobs.service import JobService
+from app.metrics import mark_process_dead
+from app.model.engine import engines_in_use, warmup_sizes
+
+logger = logging.getLogger(__name__)
+
+async def _wait(stop: asyncio.Event, seconds: float):
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except TimeoutError:
+        pass
+
+async def _claim_loop(worker: str, stop: asyncio.Event):
+    scheduler = WeightedFairScheduler({tier: plan.queue_weight for tier, plan in TIERS.items()})
+    while not stop.is_set():
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await JobService.claim(db, worker, scheduler)
+        except Exception:
+            logger.exception("Claiming a job failed")
+            job = None
+        if job is None:
+            await _wait(stop, settings.JOB_POLL_INTERVAL_SECONDS)
+            continue
+        await JobService.run(job)
+
+async def _sweep_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            async with AsyncSessionLocal() as db:
+                requeued = await JobService.requeue_stale(db)
+            if requeued:
+                logger.warning("Recovered %d jobs from lost workers", requeued)
+        except Exception:
+            logger.exception("Stale job sweep failed")
+        await _wait(stop, settings.JOB_LEASE_SECONDS)
+
+async def _drain(stop: asyncio.Event, tasks: list[asyncio.Task], grace_seconds: float):
+    """Once `stop` is set, wait up to `grace_seconds` for the loops, then cancel the ones still running a job"""
+    await stop.wait()
+    _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+    for task in pending:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error("Job worker loop failed", exc_info=result)
+
+async def serve(name: str, concurrency: int):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    for engine in engines_in_use():
+        await engine.warm_up(warmup_sizes())
+    tasks = [asyncio.create_task(_sweep_loop(stop))]
+    tasks += [asyncio.create_task(_claim_loop(f"{name}/{slot}", stop)) for slot in range(concurrency)]
+    try:
+        await _drain(stop, tasks, settings.JOB_WORKER_STOP_GRACE_SECONDS)
+    finally:
+        for engine in engines_in_use():
+            await engine.stop()
+        mark_process_dead()
+
+def _process_main(name: str, concurrency: int):
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(name, concurrency))
+
+class JobWorkerPool:
+
+    def __init__(self, processes: int, concurrency: int):
+        self.processes = processes
+        self.concurrency = concurrency
+        self._workers: list[multiprocessing.Process] = []
+
+    def start(self):
+        # spawn: never fork a process that already runs an event loop and DB pools
+        context = multiprocessing.get_context("spawn")
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(self.processes):
+            process = context.Process(
+                target=_process_main,
+                args=(f"{prefix}/w{index}", self.concurrency),
+                name=f"job-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._workers.append(process)
+
+    def stop(self, timeout: float | None = None):
+        """
+        Ask workers to finish or requeue their current jobs, then kill stragglers
+        after `timeout` (JOB_WORKER_STOP_TIMEOUT_SECONDS) (blocking)
+        """
+        timeout = settings.JOB_WORKER_STOP_TIMEOUT_SECONDS if timeout is None else timeout
+        for process in self._workers:
+            process.terminate()
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._workers.clear()
+
+    def join(self):
+        for process in self._workers:
+            process.join()
+
+job_workers = JobWorkerPool(settings.JOB_WORKER_PROCESSES, settings.JOB_WORKER_CONCURRENCY)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run enhancement job workers")
+    parser.add_argument("--processes", type=int, default=max(1, settings.JOB_WORKER_PROCESSES))
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    pool = JobWorkerPool(args.processes, args.concurrency)
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
@@ -1,13 +1,77 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware 
-from app.database import Base, engine
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import AsyncSessionLocal, get_async_db
+from app.metrics import CONTENT_TYPE_LATEST, JOBS_QUEUED, MetricsMiddleware, clear_dead_processes, mark_process_dead, render
+from app.profiler import profiler
+from app.auth.hashing import password_hasher
+from app.auth.service import sweep_expired_refresh_tokens
 from app.auth.routes import router as auth_router
+from app.billing.plans import SubscriptionTier
 from app.billing.routes import router as billing_router
+from app.billing.usage import roll_up_usage
 from app.media.routes import router as media_router 
+from app.jobs.routes import router as jobs_router
+from app.jobs.events import job_events
+from app.jobs.service import JobService
+from app.jobs.worker import job_workers
+from app.media.result_cache import result_cache
+from app.model.engine import engines_in_use, warmup_sizes
+from app.model.server import model_servers
+from app.schema import check_schema, create_schema
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Shadow Shift API")
+async def warm_up_model():
+    try:
+        for engine in engines_in_use():
+            await engine.warm_up(warmup_sizes())
+    except Exception:
+        logger.exception("Model warm-up failed; /health stays unready")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(create_schema if settings.DB_CREATE_SCHEMA_ON_STARTUP else check_schema)
+    await asyncio.to_thread(clear_dead_processes)
+    profiler.start()
+    model_servers.start()
+    # Serves requests meanwhile; enhancement calls wait for the model to load
+    warm_up = asyncio.create_task(warm_up_model()) if settings.MODEL_WARMUP_ON_STARTUP else None
+    sweeper = asyncio.create_task(sweep_expired_refresh_tokens(
+        AsyncSessionLocal,
+        settings.REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS,
+        settings.REFRESH_TOKEN_SWEEP_BATCH_SIZE,
+    ))
+    usage_roller = asyncio.create_task(roll_up_usage(
+        AsyncSessionLocal,
+        settings.USAGE_ROLLUP_INTERVAL_SECONDS,
+        settings.USAGE_ROLLUP_BATCH_SIZE,
+        settings.USAGE_EVENT_RETENTION_DAYS,
+    ))
+    if settings.RESULT_CACHE_ENABLED:
+        await asyncio.to_thread(result_cache.rescan)
+    await job_events.start()
+    job_workers.start()
+    yield
+    await asyncio.to_thread(job_workers.stop)
+    await job_events.stop()
+    if warm_up is not None:
+        warm_up.cancel()
+    sweeper.cancel()
+    usage_roller.cancel()
+    for engine in engines_in_use():
+        await engine.stop()
+    await asyncio.to_thread(model_servers.stop)
+    password_hasher.shutdown()
+    mark_process_dead()
+
+app = FastAPI(title="Shadow Shift API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,10 +80,13 @@ app.add_middleware(
     allow_methods=["*"],  
     allow_headers=["*"],  
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(billing_router)
 app.include_router(media_router)  
+app.include_router(jobs_router)
 
 @app.get("/")
 def root():
@@ -27,4 +94,16 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    """Readiness: 503 until every tier's model is warm (when MODEL_WARMUP_ON_STARTUP)"""
+    if settings.MODEL_WARMUP_ON_STARTUP and not all(engine.warmed_up for engine in engines_in_use()):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "healthy"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(db: AsyncSession = Depends(get_async_db)):
+        """Prometheus text format, summed over every API and job worker process (app/metrics.py)"""
+        queue = await JobService.queue_stats(db)
+        for tier in SubscriptionTier:
+            JOBS_QUEUED.labels(tier.value).set(queue.get(tier.value, {}).get("queued", 0))
+        return Response(await run_in_threadpool(render), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,87 @@
+"""
+Inputs and output of bulk image batches.
+
+A batch arrives as many multipart files or as one zip archive. Either way it
+is already spooled to disk by the multipart parser, so items are read one at
+a time as they are scheduled. Results go back as a zip written through
+ZipStream, which hands over whatever bytes the archive has produced since the
+last call, so the response never holds more than one entry.
+"""
+import os
+import zipfile
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+from fastapi import HTTPException, UploadFile, status
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+@dataclass(frozen=True, slots=True)
+class BatchItem:
+    name: str
+    size: int
+    read: Callable[[], bytes]
+    # the first n bytes, without consuming the item (to size it from its header)
+    head: Callable[[int], bytes]
+
+def _file_head(file, size: int) -> bytes:
+    data = file.read(size)
+    file.seek(0)
+    return data
+
+def _zip_head(archive: zipfile.ZipFile, info: zipfile.ZipInfo, size: int) -> bytes:
+    with archive.open(info) as member:
+        return member.read(size)
+
+def _is_zip(upload: UploadFile) -> bool:
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+def _zip_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """Files only, without macOS resource forks and hidden files"""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+
+def batch_items(uploads: list[UploadFile]) -> list[BatchItem]:
+    """The images of a batch request, in order (blocking: reads a zip's directory)"""
+    if len(uploads) == 1 and _is_zip(uploads[0]):
+        try:
+            archive = zipfile.ZipFile(uploads[0].file)
+        except zipfile.BadZipFile:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid zip archive"
+            )
+        # Sizes are the declared uncompressed sizes; reads stop there and check the CRC
+        return [
+            BatchItem(
+                os.path.basename(info.filename), info.file_size, partial(archive.read, info), partial(_zip_head, archive, info)
+            )
+            for info in _zip_members(archive)
+        ]
+
+    return [
+        BatchItem(upload.filename or f"image{index}", upload.size or 0, upload.file.read, partial(_file_head, upload.file))
+        for index, upload in enumerate(uploads)
+    ]
+
+class ZipStream:
+    """Write-only sink for zipfile.ZipFile; `take` returns and clears what was written"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
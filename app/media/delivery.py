@@ -0,0 +1,163 @@
+"""
+Serving enhanced files: precomputed image variants and the download response.
+
+Each enhanced image gets smaller re-encodings (IMAGE_VARIANT_FORMATS, e.g.
+AVIF and WebP) written next to it at enhancement time; a download picks the
+one the client names in its Accept header. Videos need no variant: the ffmpeg
+encoder already writes faststart MP4s, which browsers can play and seek
+before the whole file has arrived.
+
+Downloads are FileResponses (Range -> 206, If-Range) that also answer
+If-None-Match / If-Modified-Since with 304. Starlette sends a whole file
+through the ASGI pathsend extension where the server offers it; otherwise
+the file is read in MEDIA_DOWNLOAD_CHUNK_KB chunks. With
+MEDIA_ACCEL_REDIRECT_PREFIX set, the body is left to the fronting nginx
+(X-Accel-Redirect), which serves ranges itself with sendfile.
+"""
+import os
+import stat
+from urllib.parse import quote
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.http_cache import not_modified
+from app.media.result_cache import result_cache
+
+VARIANT_ENCODINGS = {
+    "avif": ("image/avif", ".avif"),
+    "webp": ("image/webp", ".webp"),
+}
+
+def _variant_params(name: str) -> list[int]:
+    import cv2
+    if name == "avif":
+        return [cv2.IMWRITE_AVIF_QUALITY, settings.IMAGE_VARIANT_AVIF_QUALITY, cv2.IMWRITE_AVIF_SPEED, settings.IMAGE_VARIANT_AVIF_SPEED]
+    return [cv2.IMWRITE_WEBP_QUALITY, settings.IMAGE_VARIANT_WEBP_QUALITY]
+
+def image_variants(processed_path: str) -> list[tuple[str, str]]:
+    """(content type, path) of every configured variant of an enhanced image, most preferred first"""
+    stem, extension = os.path.splitext(processed_path)
+    variants = []
+    for name in filter(None, (part.strip().lower() for part in settings.IMAGE_VARIANT_FORMATS.split(","))):
+        content_type, variant_extension = VARIANT_ENCODINGS[name]
+        if variant_extension != extension.lower():
+            variants.append((content_type, f"{stem}{variant_extension}"))
+    return variants
+
+def write_image_variants(processed_path: str, cache_key: str | None) -> int:
+    """
+    Re-encode an enhanced image into its variants; a variant that would not be
+    smaller than the enhanced file is skipped. Variants are cached alongside the
+    enhanced output. Returns how many exist afterwards (blocking)
+    """
+    import cv2
+    size = os.path.getsize(processed_path)
+    image = None
+    written = 0
+    for content_type, path in image_variants(processed_path):
+        name = content_type.split("/")[1]
+        key = result_cache.key(cache_key, {"variant": name, "params": _variant_params(name)}) if cache_key else None
+        if key is not None and result_cache.get(key, path) is not None:
+            written += 1
+            continue
+        if image is None:
+            image = cv2.imread(processed_path, cv2.IMREAD_COLOR)
+            if image is None:
+                return written
+        ok, encoded = cv2.imencode(os.path.splitext(path)[1], image, _variant_params(name))
+        if not ok or len(encoded) >= size:
+            continue
+        with open(path, "wb") as f:
+            f.write(encoded.tobytes())
+        if key is not None:
+            result_cache.put(key, path)
+        written += 1
+    return written
+
+def _accepted_types(accept: str | None) -> dict[str, float]:
+    """Explicitly named media types of an Accept header -> q (wildcards are left out)"""
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_range, *params = part.split(";")
+        media_range = media_range.strip().lower()
+        if not media_range or media_range.endswith("/*"):
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_range] = max(quality, accepted.get(media_range, 0.0))
+    return accepted
+
+def negotiate(accept: str | None, variants: list[tuple[str, str]], original: tuple[str, str]) -> tuple[str, str]:
+    """
+    The variant with the highest q among those the client names, ties going to
+    the earlier one; the original otherwise. `*/*` and `image/*` never select a
+    variant, since clients sending only wildcards may not decode AVIF or WebP
+    """
+    accepted = _accepted_types(accept)
+    best, best_quality = original, 0.0
+    for content_type, path in variants:
+        quality = accepted.get(content_type, 0.0)
+        if quality > best_quality:
+            best, best_quality = (content_type, path), quality
+    return best
+
+class MediaFileResponse(FileResponse):
+    chunk_size = settings.MEDIA_DOWNLOAD_CHUNK_KB * 1024
+
+def _stat_file(path: str) -> os.stat_result | None:
+    try:
+        result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return result if stat.S_ISREG(result.st_mode) else None
+
+def _accel_location(path: str) -> str:
+    relative = os.path.relpath(os.path.realpath(path), os.path.realpath(settings.UPLOAD_DIR))
+    return settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+
+async def file_response(
+    request: Request,
+    path: str,
+    content_type: str,
+    filename: str,
+    vary_accept: bool = False
+) -> Response:
+    """Download response for a file under UPLOAD_DIR: 200/206 with validators, or 304"""
+    stat_result = await run_in_threadpool(_stat_file, path)
+    if stat_result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+
+    headers = {"Cache-Control": f"private, max-age={settings.MEDIA_DOWNLOAD_MAX_AGE_SECONDS}"}
+    if vary_accept:
+        headers["Vary"] = "Accept"
+    response = MediaFileResponse(
+        path,
+        media_type=content_type,
+        headers=headers,
+        filename=filename,
+        stat_result=stat_result
+    )
+    validators = {name: response.headers[name] for name in ("etag", "last-modified")}
+    if not_modified(request.headers, validators["etag"], stat_result.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, **validators})
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        return Response(
+            media_type=content_type,
+            headers={
+                **headers,
+                **validators,
+                "Content-Disposition": response.headers["content-disposition"],
+                "X-Accel-Redirect": _accel_location(path),
+            }
+        )
+    return response
@@ -0,0 +1,96 @@
+"""
+Image ingestion: read the header, plan the decode, decode once at the size used.
+
+`plan_decode` reads only the encoded header (format and dimensions), rejects
+images above IMAGE_MAX_DECODE_PIXELS before a pixel is decoded, and fits the
+image within the tier's `max_resolution` (either orientation). JPEGs over the
+cap are then decoded by libjpeg at the coarsest 1/2, 1/4 or 1/8 scale that
+still covers the target size (IMREAD_REDUCED_*); the remainder is an area
+resize of a uint8 image. `decode` reads straight from the uploaded bytes and
+returns the C-contiguous float32 RGB array the engine pads into its batch.
+"""
+import io
+import math
+from dataclasses import dataclass
+import numpy as np
+from PIL import Image
+from fastapi import HTTPException, status
+from app.config import settings
+from app.billing.plans import Resolution
+
+REDUCTIONS = (8, 4, 2)
+
+@dataclass(frozen=True, slots=True)
+class DecodePlan:
+    """How one upload gets decoded: its header plus the resolution cap it is fitted into"""
+    format: str | None
+    width: int
+    height: int
+    max_resolution: Resolution | None
+    reduction: int = 1
+
+    @property
+    def output_size(self) -> tuple[int, int]:
+        return fit_within(self.width, self.height, self.max_resolution)
+
+def fit_within(width: int, height: int, cap: Resolution | None) -> tuple[int, int]:
+    """(width, height) scaled down, keeping the aspect ratio, to fit `cap` in either orientation"""
+    if cap is None:
+        return width, height
+    scale = min(1.0, max(cap) / max(width, height), min(cap) / min(width, height))
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def read_header(data: bytes) -> tuple[str | None, int, int]:
+    """(format, width, height) without decoding pixels; 400 if it is not an image"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.format, *image.size
+    except Image.DecompressionBombError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image resolution is too large"
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not decode image"
+        )
+
+def plan_decode(data: bytes, max_resolution: Resolution | None) -> DecodePlan:
+    """Header check and decode plan for an upload (blocking, cheap)"""
+    image_format, width, height = read_header(data)
+    if width * height > settings.IMAGE_MAX_DECODE_PIXELS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image resolution {width}x{height} is too large"
+        )
+    target_width, target_height = fit_within(width, height, max_resolution)
+    reduction = 1
+    if image_format == "JPEG" and (target_width, target_height) != (width, height):
+        for factor in REDUCTIONS:
+            if math.ceil(width / factor) >= target_width and math.ceil(height / factor) >= target_height:
+                reduction = factor
+                break
+    return DecodePlan(image_format, width, height, max_resolution, reduction)
+
+def decode(data: bytes, plan: DecodePlan) -> np.ndarray:
+    """Encoded bytes -> HxWx3 float32 RGB in [0, 1], fitted within the plan's cap"""
+    import cv2
+    flags = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags.get(plan.reduction, cv2.IMREAD_COLOR))
+    if bgr is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not decode image"
+        )
+    # decoded dimensions, not the header's: EXIF orientation may have swapped them
+    height, width = bgr.shape[:2]
+    size = fit_within(width, height, plan.max_resolution)
+    if size != (width, height):
+        bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    image = np.empty(rgb.shape, dtype=np.float32)
+    np.multiply(rgb, np.float32(1 / 255), out=image)
+    return image
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, ForeignKey, String, Float, DateTime, Index, Enum as SQLEnum
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+from app.billing.plans import MediaType
+
+class MediaFile(Base):
+    __tablename__ = "media_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    media_type = Column(SQLEnum(MediaType), nullable=False)
+    
+    original_filename = Column(String, nullable=False)
+    original_path = Column(String, nullable=False)
+    processed_path = Column(String, nullable=True)
+    thumbnail_path = Column(String, nullable=True)
+    content_type = Column(String, nullable=True)
+    content_sha256 = Column(String(64), nullable=True, index=True)
+    
+    file_size_mb = Column(Float, nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    user = relationship("User", back_populates="media_files")
+    
+    __table_args__ = (
+        # Gallery keyset pages; INCLUDE makes the listing an index-only scan
+        Index(
+            "ix_media_files_gallery", "user_id", "created_at", "id",
+            postgresql_include=["media_type", "thumbnail_path"]
+        ),
+    )
@@ -0,0 +1,181 @@
+"""
+Content-addressed cache of enhanced outputs.
+
+Entries live on disk under UPLOAD_DIR/cache, named by a hash of the input's
+sha256, the model version and every parameter that affects the output, so a
+re-upload of the same file is served without running ZR-DCE. Files are written
+to a temporary name and os.replace()d into place, so workers sharing the
+directory never see a partial entry; a hit hardlinks the entry to the caller's
+path, so a concurrent eviction cannot pull a file out from under a reader.
+
+Each worker keeps an in-memory LRU index (key -> size). A file's atime is its
+last-use time: hits set it explicitly (mtime is left alone, since entries share
+inodes with users' files), which lets workers share one LRU clock. The index
+is rebuilt from disk at startup and every `rescan_seconds`, which also picks up
+entries written or evicted by other workers. Entries unused for `ttl_seconds`
+are dropped; least-recently-used ones go once the total passes `max_bytes`.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.config import settings
+from app.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+def _link_or_copy(source: str, destination: str):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def _touch(path: str, stat: os.stat_result):
+    """Mark as used now without changing mtime"""
+    os.utime(path, (time.time(), stat.st_mtime))
+
+class ResultCache:
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float, rescan_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.rescan_seconds = rescan_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_sha256: str, params: dict) -> str:
+        """Cache key for an input plus everything that shapes its enhanced output"""
+        blob = json.dumps({"input": content_sha256, "model": settings.MODEL_VERSION, **params}, sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str, destination: str) -> int | None:
+        """Link the cached output for `key` to `destination`; its size on a hit, None on a miss (blocking)"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_atime > self.ttl_seconds:
+                raise FileNotFoundError(path)
+            _link_or_copy(path, destination)
+            _touch(path, stat)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            CACHE_LOOKUPS.labels("result", "miss").inc()
+            return None
+
+        with self._lock:
+            if key not in self._entries:
+                # Written by another worker since our last scan
+                self._total_bytes += stat.st_size
+            self._entries[key] = stat.st_size
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += stat.st_size
+        CACHE_LOOKUPS.labels("result", "hit").inc()
+        return stat.st_size
+
+    def put(self, key: str, source: str):
+        """Store a copy of `source` (hardlinked when possible) under `key` (blocking)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        _link_or_copy(source, temporary)
+        os.replace(temporary, path)
+        stat = os.stat(path)
+        _touch(path, stat)
+        size = stat.st_size
+
+        with self._lock:
+            self._total_bytes += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            evicted = self._over_budget()
+        self._unlink([self._path(key) for key in evicted])
+        if time.monotonic() - self._last_scan > self.rescan_seconds:
+            self.rescan()
+
+    def rescan(self):
+        """Rebuild the index from disk, dropping expired entries and stale temporaries (blocking)"""
+        now = time.time()
+        found, expired = [], []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > 3600:
+                        expired.append(path)
+                elif now - stat.st_atime > self.ttl_seconds:
+                    expired.append(path)
+                else:
+                    found.append((stat.st_atime, name, stat.st_size))
+        found.sort()
+
+        with self._lock:
+            self._entries = OrderedDict((name, size) for _, name, size in found)
+            self._total_bytes = sum(size for _, _, size in found)
+            self._last_scan = time.monotonic()
+            evicted = self._over_budget()
+        self._unlink(expired + [self._path(key) for key in evicted])
+        logger.info("Result cache: %d entries, %d bytes", len(self._entries), self._total_bytes)
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _over_budget(self) -> list[str]:
+        """Pop LRU keys until under max_bytes (caller holds the lock and unlinks)"""
+        evicted = []
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    @staticmethod
+    def _unlink(paths: list[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "hits_count_usage": settings.RESULT_CACHE_HITS_COUNT_USAGE,
+        }
+
+result_cache = ResultCache(
+    directory=os.path.join(settings.UPLOAD_DIR, "cache"),
+    max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    rescan_seconds=settings.RESULT_CACHE_RESCAN_SECONDS,
+)
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_async_db
+from app.auth.cache import CachedUser
+from app.auth.dependencies import get_current_admin, get_current_user
+from app.media import schemas
+from app.media.delivery import file_response
+from app.media.models import MediaFile
+from app.media.result_cache import result_cache
+from app.media.service import MediaService
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+@router.post("/enhance")
+async def enhance_image(
+    file: UploadFile = File(...),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhance a low-light image; responds with the enhanced image"""
+    media, encoded = await MediaService.enhance_image(db, current_user, file)
+    return Response(
+        content=encoded,
+        media_type=media.content_type,
+        headers={"X-Media-Id": str(media.id)}
+    )
+
+@router.post("/enhance/stream")
+async def enhance_image_stream(
+    request: Request,
+    filename: str | None = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhance an image sent as the raw request body; rejected as soon as it exceeds the tier's size limit"""
+    media, encoded = await MediaService.enhance_image_stream(db, current_user, request, filename)
+    return Response(
+        content=encoded,
+        media_type=media.content_type,
+        headers={"X-Media-Id": str(media.id)}
+    )
+
+@router.post("/batch", response_class=StreamingResponse)
+async def enhance_batch(
+    files: list[UploadFile] = File(...),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhance many images (multipart files or one zip); streams back a zip with a manifest.json of per-item results"""
+    chunks = await MediaService.enhance_batch(db, current_user, files)
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="enhanced.zip"'}
+    )
+
+@router.post("/enhance-video", response_model=schemas.MediaFileResponse, status_code=status.HTTP_201_CREATED)
+async def enhance_video(
+    file: UploadFile = File(...),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhance a low-light video; audio and container metadata are kept"""
+    return await MediaService.enhance_video(db, current_user, file)
+
+@router.post("/enhance-video/stream", response_model=schemas.MediaFileResponse, status_code=status.HTTP_201_CREATED)
+async def enhance_video_stream(
+    request: Request,
+    filename: str | None = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhance a video sent as the raw request body; rejected as soon as it exceeds the tier's size limit"""
+    return await MediaService.enhance_video_stream(db, current_user, request, filename)
+
+@router.get("", response_model=schemas.GalleryPage)
+async def list_gallery(
+    cursor: str | None = None,
+    limit: int = Query(settings.GALLERY_PAGE_SIZE, ge=1, le=settings.GALLERY_MAX_PAGE_SIZE),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """My media, newest first; pass next_cursor back to get the following page"""
+    return await MediaService.list_gallery(db, current_user, cursor, limit)
+
+@router.get("/{media_id}/thumbnail", response_class=FileResponse)
+async def get_thumbnail(
+    media_id: int,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """WebP preview of one of my media files (made once, at enhancement time)"""
+    path = await MediaService.thumbnail_path(db, current_user, media_id)
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": "private, max-age=86400"})
+
+@router.get("/{media_id}/download", response_class=FileResponse)
+async def download_media(
+    media_id: int,
+    request: Request,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Enhanced output of one of my media files. Supports Range (206) and
+    conditional GET (304); images come as AVIF or WebP when Accept names them
+    """
+    path, content_type, filename, vary_accept = await MediaService.download_target(
+        db, current_user, media_id, request.headers.get("accept")
+    )
+    return await file_response(request, path, content_type, filename, vary_accept)
+
+@router.get("/admin/result-cache")
+async def admin_result_cache_stats(admin: CachedUser = Depends(get_current_admin)):
+    """Size, hit ratio and bytes saved of the enhanced-output cache"""
+    return result_cache.stats()
+
+@router.get("/{media_id}", response_model=schemas.MediaFileResponse)
+async def get_media(
+    media_id: int,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get metadata of one of my media files"""
+    media = await db.get(MediaFile, media_id)
+    if media is None or media.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+    return media
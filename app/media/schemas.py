@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from datetime import datetime
+from app.billing.plans import MediaType
+
+class MediaFileResponse(BaseModel):
+    id: int
+    media_type: MediaType
+    original_filename: str
+    content_type: str | None
+    file_size_mb: float
+    width: int | None
+    height: int | None
+    duration_seconds: float | None = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class GalleryItem(BaseModel):
+    id: int
+    media_type: MediaType
+    created_at: datetime
+    thumbnail_url: str | None
+
+class GalleryPage(BaseModel):
+    items: list[GalleryItem]
+    next_cursor: str | None
@@ -0,0 +1,807 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import uuid
+import zipfile
+from collections import deque
+from dataclasses import asdict
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+import anyio
+import numpy as np
+from PIL import Image
+from fastapi import HTTPException, Request, UploadFile, status
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.admission.control import AdmissionTicket, admission
+from app.auth.cache import CachedUser
+from app.billing.plans import TIERS, MediaType
+from app.billing.service import BillingService, QuotaReservation
+from app.media.batch import BatchItem, ZipStream, batch_items
+from app.media.delivery import image_variants, negotiate, write_image_variants
+from app.media.ingest import DecodePlan, decode, fit_within, plan_decode, read_header
+from app.media.models import MediaFile
+from app.media.result_cache import result_cache
+from app.media.uploads import StoredUpload, store_multipart, stream_upload
+from app.metrics import ENHANCE_STAGE_SECONDS
+from app.model.engine import InferenceEngine, engine_for, inference_engine
+
+if TYPE_CHECKING:
+    from app.media.temporal import TemporalCurveReuse
+    from app.media.video import VideoInfo
+
+logger = logging.getLogger(__name__)
+
+IMAGE_ENCODINGS = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm", ".avi"}
+
+# enough for the dimensions of any JPEG (after its EXIF), PNG or WebP
+HEADER_PEEK_BYTES = 256 * 1024
+
+def encode_image(image: np.ndarray, extension: str) -> bytes:
+    """HxWx3 float RGB in [0, 1] -> encoded bytes"""
+    import cv2
+    bgr = cv2.cvtColor((image * 255.0 + 0.5).astype(np.uint8), cv2.COLOR_RGB2BGR)
+    ok, encoded = cv2.imencode(extension, bgr)
+    if not ok:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not encode enhanced image"
+        )
+    return encoded.tobytes()
+
+def _write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _user_dir(user: CachedUser) -> str:
+    return os.path.join(settings.UPLOAD_DIR, str(user.id))
+
+def _new_stem(user: CachedUser) -> str:
+    return os.path.join(_user_dir(user), uuid.uuid4().hex)
+
+def _max_upload_bytes(user: CachedUser, media_type: MediaType) -> int:
+    return TIERS[user.tier].limits(media_type).max_size_mb * 1024 * 1024
+
+def _image_size(data: bytes) -> tuple[int, int]:
+    """(width, height) from the encoded header, without decoding pixels"""
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+def _lowres_params() -> list[int]:
+    return [settings.INFERENCE_LOWRES_SCALE, settings.INFERENCE_LOWRES_MIN_PIXELS, settings.INFERENCE_LOWRES_MAX_ESTIMATE_PIXELS]
+
+def _image_cache_key(sha256: str, extension: str, user: CachedUser) -> str | None:
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    return result_cache.key(sha256, {
+        "media": "image",
+        "format": extension,
+        "lowres": _lowres_params(),
+        "backend": TIERS[user.tier].inference_backend,
+        "max_resolution": list(TIERS[user.tier].image.max_resolution),
+    })
+
+def _video_cache_key(sha256: str, user: CachedUser) -> str | None:
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    temporal = asdict(TIERS[user.tier].enhancement) if settings.VIDEO_TEMPORAL_REUSE else None
+    return result_cache.key(sha256, {
+        "media": "video",
+        "temporal": temporal,
+        "crf": settings.VIDEO_CRF,
+        "preset": settings.VIDEO_PRESET,
+        "lowres": _lowres_params(),
+        "backend": TIERS[user.tier].inference_backend,
+    })
+
+async def _cache_lookup(key: str | None, destination: str) -> bool:
+    return key is not None and await run_in_threadpool(result_cache.get, key, destination) is not None
+
+async def _reserve(
+    db: AsyncSession,
+    user: CachedUser,
+    media_type: MediaType,
+    cached: bool,
+    file_size_mb: float,
+    duration_seconds: float = None,
+    reserved: QuotaReservation | None = None
+) -> QuotaReservation | None:
+    """
+    Charge the upload (or keep the `reserved` charge taken at submit time),
+    unless it is a cache hit and hits are free by policy (limits still apply)
+    """
+    if cached and not settings.RESULT_CACHE_HITS_COUNT_USAGE:
+        if reserved is not None:
+            await BillingService.release_quota(db, reserved)
+        else:
+            BillingService.check_media_limits(user.tier, media_type, file_size_mb, duration_seconds)
+        return None
+    if reserved is not None:
+        return reserved
+    return await BillingService.reserve_quota(
+        db, user, media_type, file_size_mb=file_size_mb, duration_seconds=duration_seconds
+    )
+
+async def _admit(
+    user: CachedUser,
+    media_type: MediaType,
+    work: float,
+    cached: bool,
+    reserved: QuotaReservation | None
+) -> AdmissionTicket | None:
+    """
+    Admission for a synchronous request about to run the model (503/429 before
+    it is charged); cache hits cost no model time, and jobs (`reserved` at
+    submit time) were already admitted by their queue
+    """
+    if cached or reserved is not None:
+        return None
+    return await admission.admit(user, media_type, work)
+
+def _job_interrupted(exc: BaseException, reserved: QuotaReservation | None) -> bool:
+    """A job's run cancelled by its worker stopping: the upload and the charge stay for the requeued job"""
+    return reserved is not None and isinstance(exc, asyncio.CancelledError)
+
+def _megapixels(plan: DecodePlan) -> float:
+    width, height = plan.output_size
+    return width * height / 1_000_000
+
+def _batch_megapixels(items: list[BatchItem], user: CachedUser) -> list[float]:
+    """Output megapixels of each batch image from its header (blocking); 0 for unreadable ones, which fail later"""
+    cap = TIERS[user.tier].image.max_resolution
+    sizes = []
+    for item in items:
+        try:
+            _, width, height = read_header(item.head(HEADER_PEEK_BYTES))
+        except HTTPException:
+            sizes.append(0.0)
+            continue
+        width, height = fit_within(width, height, cap)
+        sizes.append(width * height / 1_000_000)
+    return sizes
+
+def _plan_decode(data: bytes, user: CachedUser) -> DecodePlan:
+    return plan_decode(data, TIERS[user.tier].image.max_resolution)
+
+async def _render_image(
+    engine: InferenceEngine,
+    plan: DecodePlan,
+    data: bytes,
+    extension: str,
+    processed_path: str,
+    cache_key: str | None,
+    cached: bool
+) -> tuple[bytes, int, int]:
+    """Enhanced image at `processed_path` (already there on a cache hit); (encoded, width, height)"""
+    if cached:
+        encoded = await run_in_threadpool(_read_file, processed_path)
+        width, height = await run_in_threadpool(_image_size, encoded)
+        return encoded, width, height
+    
+    with ENHANCE_STAGE_SECONDS.labels("decode").time():
+        image = await run_in_threadpool(decode, data, plan)
+    with ENHANCE_STAGE_SECONDS.labels("model").time():
+        enhanced = await engine.enhance(image)
+    with ENHANCE_STAGE_SECONDS.labels("encode").time():
+        encoded = await run_in_threadpool(encode_image, enhanced, extension)
+    await run_in_threadpool(_write_file, processed_path, encoded)
+    if cache_key is not None:
+        await run_in_threadpool(result_cache.put, cache_key, processed_path)
+    height, width = image.shape[:2]
+    return encoded, width, height
+
+async def _make_thumbnail(processed_path: str, media_type: MediaType, thumbnail_path: str) -> str | None:
+    """Gallery preview of the enhanced file; None (logged) if it cannot be made, which never fails the upload"""
+    from app.media.thumbnails import write_thumbnail
+    try:
+        if await run_in_threadpool(write_thumbnail, processed_path, media_type, thumbnail_path):
+            return thumbnail_path
+    except Exception:
+        logger.exception("Thumbnail for %s failed", processed_path)
+    return None
+
+async def _make_variants(processed_path: str, cache_key: str | None):
+    """Smaller encodings of an enhanced image for downloads; failures are logged and never fail the upload"""
+    try:
+        await run_in_threadpool(write_image_variants, processed_path, cache_key)
+    except Exception:
+        logger.exception("Variants of %s failed", processed_path)
+
+def _variant_paths(processed_path: str) -> list[str]:
+    return [path for _, path in image_variants(processed_path)]
+
+def _remove_files(*paths: str):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def engine_batch_enhancer(loop: asyncio.AbstractEventLoop, engine: InferenceEngine = inference_engine):
+    """Lets pipeline threads feed frames into the shared micro-batching engine"""
+    async def enhance_all(frames: list[np.ndarray]) -> list[np.ndarray]:
+        return await asyncio.gather(*(engine.enhance(frame) for frame in frames))
+    
+    def enhance_batch(frames: list[np.ndarray]) -> list[np.ndarray]:
+        return asyncio.run_coroutine_threadsafe(enhance_all(frames), loop).result()
+    return enhance_batch
+
+def engine_curve_reuse(loop: asyncio.AbstractEventLoop, user: CachedUser) -> "TemporalCurveReuse":
+    """Per-video keyframe state using the tier's enhancement profile"""
+    from app.media.temporal import TemporalCurveReuse
+    engine = engine_for(user.tier)
+    def estimate_curves(frame: np.ndarray) -> np.ndarray:
+        return asyncio.run_coroutine_threadsafe(engine.estimate_curves(frame), loop).result()
+    return TemporalCurveReuse(TIERS[user.tier].enhancement, estimate_curves, engine.apply_curves)
+
+def _read_item(item: BatchItem) -> tuple[bytes, str]:
+    data = item.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+async def _enhance_batch_item(user: CachedUser, item: BatchItem) -> tuple[MediaFile, bytes, bool]:
+    """Enhance and store one batch image; the row is returned unsaved (batches insert in bulk)"""
+    extension = os.path.splitext(item.name)[1].lower()
+    data, sha256 = await run_in_threadpool(_read_item, item)
+    stem = _new_stem(user)
+    original_path = f"{stem}_original{extension}"
+    processed_path = f"{stem}_enhanced{extension}"
+    thumbnail_path = f"{stem}_thumb.webp"
+    cache_key = _image_cache_key(sha256, extension, user)
+    try:
+        await run_in_threadpool(_write_file, original_path, data)
+        plan = await run_in_threadpool(_plan_decode, data, user)
+        cached = await _cache_lookup(cache_key, processed_path)
+        encoded, width, height = await _render_image(
+            engine_for(user.tier), plan, data, extension, processed_path, cache_key, cached
+        )
+        thumbnail = await _make_thumbnail(processed_path, MediaType.IMAGE, thumbnail_path)
+        await _make_variants(processed_path, cache_key)
+    except BaseException:
+        await run_in_threadpool(_remove_files, original_path, processed_path, thumbnail_path, *_variant_paths(processed_path))
+        raise
+    
+    media = MediaFile(
+        user_id=user.id,
+        media_type=MediaType.IMAGE,
+        original_filename=item.name,
+        original_path=original_path,
+        processed_path=processed_path,
+        thumbnail_path=thumbnail,
+        content_type=IMAGE_ENCODINGS[extension],
+        content_sha256=sha256,
+        file_size_mb=len(data) / (1024 * 1024),
+        width=width,
+        height=height
+    )
+    return media, encoded, cached
+
+async def _finish_batch(reservation: QuotaReservation | None, rows: list[MediaFile], charged: int):
+    """Save the delivered items and refund everything else that was reserved"""
+    async with AsyncSessionLocal() as db:
+        if rows:
+            try:
+                db.add_all(rows)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                logger.exception("Saving %d batch items failed", len(rows))
+        if reservation is None:
+            return
+        if charged < reservation.count:
+            await BillingService.release_quota(db, reservation, count=reservation.count - charged)
+        else:
+            await BillingService.commit_quota(db, reservation)
+
+async def _stream_batch(
+    user: CachedUser,
+    items: list[BatchItem],
+    rejected: dict[int, str],
+    reservation: QuotaReservation | None,
+    ticket: AdmissionTicket | None,
+    megapixels: dict[int, float]
+) -> AsyncIterator[bytes]:
+    """
+    Zip of the enhanced images in input order plus manifest.json with each
+    item's outcome. BATCH_CONCURRENCY items are in flight at once, so the
+    inference engine sees full batches while results stream out in order.
+    Each item's share of the admission ticket is released as it finishes.
+    """
+    manifest: list[dict] = [{"index": index, "filename": item.name} for index, item in enumerate(items)]
+    for index, reason in rejected.items():
+        manifest[index].update(status="rejected", error=reason)
+    
+    queue = (index for index in range(len(items)) if index not in rejected)
+    pending: deque[tuple[int, asyncio.Future]] = deque()
+    def schedule():
+        for index in queue:
+            pending.append((index, asyncio.ensure_future(_enhance_batch_item(user, items[index]))))
+            return
+    
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, "w")
+    date_time = time.localtime()[:6]
+    rows: list[MediaFile] = []
+    charged = 0
+    try:
+        for _ in range(settings.BATCH_CONCURRENCY):
+            schedule()
+        while pending:
+            index, task = pending.popleft()
+            schedule()
+            try:
+                media, encoded, cached = await task
+            except HTTPException as exc:
+                manifest[index].update(status="failed", error=str(exc.detail))
+                continue
+            except Exception:
+                logger.exception("Batch item %d failed", index)
+                manifest[index].update(status="failed", error="Enhancement failed")
+                continue
+            finally:
+                admission.release(ticket, megapixels.get(index, 0.0))
+            
+            name = f"{index:04d}_{os.path.splitext(items[index].name)[0]}_enhanced{os.path.splitext(media.processed_path)[1]}"
+            await run_in_threadpool(archive.writestr, zipfile.ZipInfo(name, date_time), encoded)
+            rows.append(media)
+            if not cached or settings.RESULT_CACHE_HITS_COUNT_USAGE:
+                charged += 1
+            manifest[index].update(status="ok", output=name, width=media.width, height=media.height)
+            yield sink.take()
+        
+        summary = {
+            "items": len(items),
+            "succeeded": len(rows),
+            "failed": len(items) - len(rows),
+            "results": manifest,
+        }
+        archive.writestr(zipfile.ZipInfo("manifest.json", date_time), json.dumps(summary, indent=2))
+        archive.close()
+        yield sink.take()
+    finally:
+        for _, task in pending:
+            task.cancel()
+        admission.release(ticket)
+        # The client may have gone away (cancelled scope); settle the quota regardless
+        with anyio.CancelScope(shield=True):
+            await _finish_batch(reservation, rows, charged)
+
+def _encode_cursor(created_at: datetime, media_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{media_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, media_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(media_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+class MediaService:
+    
+    @staticmethod
+    def image_extension(filename: str | None) -> str:
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension not in IMAGE_ENCODINGS:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Supported image types: {', '.join(sorted(IMAGE_ENCODINGS))}"
+            )
+        return extension
+    
+    @staticmethod
+    def video_extension(filename: str | None) -> str:
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension not in VIDEO_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Supported video types: {', '.join(sorted(VIDEO_EXTENSIONS))}"
+            )
+        return extension
+    
+    @staticmethod
+    async def store_upload(user: CachedUser, request: Request, media_type: MediaType) -> StoredUpload:
+        """Stream a raw request body into the user's directory under the tier's size limit"""
+        return await stream_upload(request, _user_dir(user), media_type, _max_upload_bytes(user, media_type))
+    
+    @staticmethod
+    async def store_multipart(user: CachedUser, upload: UploadFile, media_type: MediaType) -> StoredUpload:
+        """Copy a multipart file into the user's directory the same way, under the tier's size limit"""
+        return await store_multipart(upload, _user_dir(user), media_type, _max_upload_bytes(user, media_type))
+    
+    @staticmethod
+    async def probe_video(path: str) -> "VideoInfo":
+        """Probe a stored video; 400 unless it opens and reports a positive duration"""
+        from app.media.video import probe_video
+        info = await run_in_threadpool(probe_video, path)
+        if info is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not decode video"
+            )
+        if info.duration_seconds <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not determine video duration"
+            )
+        return info
+    
+    @staticmethod
+    async def process_upload(
+        db: AsyncSession,
+        user: CachedUser,
+        media_type: MediaType,
+        stored: StoredUpload,
+        filename: str,
+        reservation: QuotaReservation,
+        on_progress: Callable[[int, int], None] | None = None
+    ) -> MediaFile:
+        """
+        Enhance an upload already on disk whose quota was reserved at submit time
+        (job workers); videos report `on_progress(frames_encoded, frame_count)`
+        """
+        if media_type == MediaType.IMAGE:
+            data = await run_in_threadpool(_read_file, stored.path)
+            media, _ = await MediaService._enhance_image(
+                db, user, data, stored.path, filename, stored.extension, stored.sha256, reservation
+            )
+            return media
+        return await MediaService._enhance_video(db, user, stored.path, filename, stored.sha256, reservation, on_progress)
+    
+    @staticmethod
+    async def list_gallery(db: AsyncSession, user: CachedUser, cursor: str | None, limit: int) -> dict:
+        """
+        Newest first, one keyset page. Reads only columns held by
+        ix_media_files_gallery, so cost does not grow with the page number.
+        """
+        query = (
+            select(MediaFile.id, MediaFile.created_at, MediaFile.media_type, MediaFile.thumbnail_path)
+            .where(MediaFile.user_id == user.id)
+            .order_by(MediaFile.created_at.desc(), MediaFile.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            query = query.where(tuple_(MediaFile.created_at, MediaFile.id) < tuple_(*_decode_cursor(cursor)))
+        rows = (await db.execute(query)).all()
+        
+        items = [
+            {
+                "id": row.id,
+                "media_type": row.media_type,
+                "created_at": row.created_at,
+                "thumbnail_url": f"/media/{row.id}/thumbnail" if row.thumbnail_path else None,
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = _encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+    
+    @staticmethod
+    async def thumbnail_path(db: AsyncSession, user: CachedUser, media_id: int) -> str:
+        row = (await db.execute(
+            select(MediaFile.user_id, MediaFile.thumbnail_path).where(MediaFile.id == media_id)
+        )).first()
+        if row is None or row.user_id != user.id or row.thumbnail_path is None or not os.path.exists(row.thumbnail_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Thumbnail not found"
+            )
+        return row.thumbnail_path
+    
+    @staticmethod
+    async def download_target(
+        db: AsyncSession,
+        user: CachedUser,
+        media_id: int,
+        accept: str | None
+    ) -> tuple[str, str, str, bool]:
+        """(path, content type, filename, varies by Accept) of the enhanced output to send"""
+        row = (await db.execute(
+            select(
+                MediaFile.user_id, MediaFile.media_type, MediaFile.processed_path,
+                MediaFile.content_type, MediaFile.original_filename
+            ).where(MediaFile.id == media_id)
+        )).first()
+        if row is None or row.user_id != user.id or row.processed_path is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Media not found"
+            )
+    
+        original = (row.content_type or "application/octet-stream", row.processed_path)
+        variants = []
+        if row.media_type == MediaType.IMAGE:
+            variants = [(content_type, path) for content_type, path in image_variants(row.processed_path) if os.path.exists(path)]
+        content_type, path = negotiate(accept, variants, original)
+        filename = f"{os.path.splitext(row.original_filename)[0]}_enhanced{os.path.splitext(path)[1]}"
+        return path, content_type, filename, bool(variants)
+
+    @staticmethod
+    async def enhance_batch(db: AsyncSession, user: CachedUser, uploads: list[UploadFile]) -> AsyncIterator[bytes]:
+        """
+        Admit the batch's megapixels, then check and reserve quota for all its
+        images in one statement; returns the zip stream. Items over the size
+        limit or of unsupported types are reported in the manifest instead of
+        failing the batch.
+        """
+        plan = TIERS[user.tier]
+        if not plan.batch_max_items:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Bulk processing is not included in your plan. Upgrade to Pro."
+            )
+        
+        admission.check_load(user)
+        items = await run_in_threadpool(batch_items, uploads)
+        if not items:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty batch"
+            )
+        if len(items) > plan.batch_max_items:
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                detail=f"Too many items. Max per batch: {plan.batch_max_items}"
+            )
+        
+        max_bytes = _max_upload_bytes(user, MediaType.IMAGE)
+        rejected = {}
+        for index, item in enumerate(items):
+            if os.path.splitext(item.name)[1].lower() not in IMAGE_ENCODINGS:
+                rejected[index] = f"Supported image types: {', '.join(sorted(IMAGE_ENCODINGS))}"
+            elif item.size > max_bytes:
+                rejected[index] = f"File too large. Max size: {plan.image.max_size_mb}MB"
+        
+        accepted = [item for index, item in enumerate(items) if index not in rejected]
+        reservation = None
+        ticket = None
+        megapixels = {}
+        if accepted:
+            # the whole batch goes through the user's bucket at once (cache hits included)
+            sizes = await run_in_threadpool(_batch_megapixels, accepted, user)
+            megapixels = dict(zip((index for index in range(len(items)) if index not in rejected), sizes))
+            ticket = await admission.admit(user, MediaType.IMAGE, sum(sizes))
+            try:
+                reservation = await BillingService.reserve_quota(
+                    db, user, MediaType.IMAGE,
+                    file_size_mb=max(item.size for item in accepted) / (1024 * 1024),
+                    count=len(accepted)
+                )
+            except BaseException:
+                admission.release(ticket)
+                raise
+        return _stream_batch(user, items, rejected, reservation, ticket, megapixels)
+    
+    @staticmethod
+    async def enhance_image(db: AsyncSession, user: CachedUser, upload: UploadFile) -> tuple[MediaFile, bytes]:
+        """Meter, enhance and store one uploaded image; returns the row and the encoded result"""
+        MediaService.image_extension(upload.filename)
+        admission.check_load(user)
+        stored = await MediaService.store_multipart(user, upload, MediaType.IMAGE)
+        data = await run_in_threadpool(_read_file, stored.path)
+        return await MediaService._enhance_image(
+            db, user, data, stored.path, upload.filename, stored.extension, stored.sha256
+        )
+    
+    @staticmethod
+    async def enhance_image_stream(
+        db: AsyncSession,
+        user: CachedUser,
+        request: Request,
+        filename: str | None
+    ) -> tuple[MediaFile, bytes]:
+        """Same as enhance_image, for a raw request body streamed to disk under the tier's size limit"""
+        admission.check_load(user)
+        stored = await MediaService.store_upload(user, request, MediaType.IMAGE)
+        data = await run_in_threadpool(_read_file, stored.path)
+        return await MediaService._enhance_image(
+            db, user, data, stored.path, filename or f"upload{stored.extension}", stored.extension, stored.sha256
+        )
+    
+    @staticmethod
+    async def _enhance_image(
+        db: AsyncSession,
+        user: CachedUser,
+        data: bytes,
+        original_path: str,
+        filename: str,
+        extension: str,
+        sha256: str,
+        reservation: QuotaReservation | None = None
+    ) -> tuple[MediaFile, bytes]:
+        file_size_mb = len(data) / (1024 * 1024)
+        stem = original_path.rsplit('_original', 1)[0]
+        processed_path = f"{stem}_enhanced{extension}"
+        thumbnail_path = f"{stem}_thumb.webp"
+        cache_key = _image_cache_key(sha256, extension, user)
+        reserved = reservation
+        ticket = None
+        try:
+            # header only: oversized or undecodable uploads are turned away before they are charged
+            plan = await run_in_threadpool(_plan_decode, data, user)
+            cached = await _cache_lookup(cache_key, processed_path)
+            ticket = await _admit(user, MediaType.IMAGE, _megapixels(plan), cached, reservation)
+            reservation = await _reserve(db, user, MediaType.IMAGE, cached, file_size_mb, reserved=reservation)
+        except BaseException as exc:
+            admission.release(ticket)
+            kept = () if _job_interrupted(exc, reserved) else (original_path,)
+            await run_in_threadpool(_remove_files, *kept, processed_path)
+            raise
+        
+        try:
+            encoded, width, height = await _render_image(
+                engine_for(user.tier), plan, data, extension, processed_path, cache_key, cached
+            )
+            admission.release(ticket)
+            thumbnail = await _make_thumbnail(processed_path, MediaType.IMAGE, thumbnail_path)
+            await _make_variants(processed_path, cache_key)
+            
+            media = MediaFile(
+                user_id=user.id,
+                media_type=MediaType.IMAGE,
+                original_filename=filename,
+                original_path=original_path,
+                processed_path=processed_path,
+                thumbnail_path=thumbnail,
+                content_type=IMAGE_ENCODINGS[extension],
+                content_sha256=sha256,
+                file_size_mb=file_size_mb,
+                height=height,
+                width=width
+            )
+            db.add(media)
+            await db.commit()
+            await db.refresh(media)
+        except BaseException as exc:
+            admission.release(ticket)
+            await db.rollback()
+            interrupted = _job_interrupted(exc, reserved)
+            if reservation is not None and not interrupted:
+                await BillingService.release_quota(db, reservation)
+            kept = () if interrupted else (original_path,)
+            await run_in_threadpool(_remove_files, *kept, processed_path, thumbnail_path, *_variant_paths(processed_path))
+            raise
+        
+        if reservation is not None:
+            await BillingService.commit_quota(db, reservation)
+        return media, encoded
+    
+    @staticmethod
+    async def enhance_video(db: AsyncSession, user: CachedUser, upload: UploadFile) -> MediaFile:
+        """Meter, enhance (streamed frame by frame) and store one uploaded video"""
+        MediaService.video_extension(upload.filename)
+        admission.check_load(user)
+        stored = await MediaService.store_multipart(user, upload, MediaType.VIDEO)
+        return await MediaService._enhance_video(db, user, stored.path, upload.filename, stored.sha256)
+    
+    @staticmethod
+    async def enhance_video_stream(
+        db: AsyncSession,
+        user: CachedUser,
+        request: Request,
+        filename: str | None
+    ) -> MediaFile:
+        """Same as enhance_video, for a raw request body streamed to disk under the tier's size limit"""
+        admission.check_load(user)
+        stored = await MediaService.store_upload(user, request, MediaType.VIDEO)
+        return await MediaService._enhance_video(
+            db, user, stored.path, filename or f"upload{stored.extension}", stored.sha256
+        )
+    
+    @staticmethod
+    async def _enhance_video(
+        db: AsyncSession,
+        user: CachedUser,
+        original_path: str,
+        filename: str,
+        sha256: str,
+        reservation: QuotaReservation | None = None,
+        on_progress: Callable[[int, int], None] | None = None
+    ) -> MediaFile:
+        stem = original_path.rsplit('_original', 1)[0]
+        processed_path = f"{stem}_enhanced.mp4"
+        thumbnail_path = f"{stem}_thumb.webp"
+        cache_key = _video_cache_key(sha256, user)
+        reserved = reservation
+        ticket = None
+        try:
+            file_size_mb = os.path.getsize(original_path) / (1024 * 1024)
+            info = await MediaService.probe_video(original_path)
+            cached = await _cache_lookup(cache_key, processed_path)
+            ticket = await _admit(user, MediaType.VIDEO, info.duration_seconds, cached, reservation)
+            reservation = await _reserve(
+                db, user, MediaType.VIDEO, cached, file_size_mb, info.duration_seconds, reserved=reservation
+            )
+        except BaseException as exc:
+            admission.release(ticket)
+            kept = () if _job_interrupted(exc, reserved) else (original_path,)
+            await run_in_threadpool(_remove_files, *kept, processed_path)
+            raise
+        
+        try:
+            if not cached:
+                await MediaService._run_video_pipeline(user, original_path, processed_path, on_progress)
+                admission.release(ticket)
+                if cache_key is not None:
+                    await run_in_threadpool(result_cache.put, cache_key, processed_path)
+            thumbnail = await _make_thumbnail(processed_path, MediaType.VIDEO, thumbnail_path)
+            
+            media = MediaFile(
+                user_id=user.id,
+                media_type=MediaType.VIDEO,
+                original_filename=filename,
+                original_path=original_path,
+                processed_path=processed_path,
+                thumbnail_path=thumbnail,
+                content_type="video/mp4",
+                content_sha256=sha256,
+                file_size_mb=file_size_mb,
+                width=info.width,
+                height=info.height,
+                duration_seconds=info.duration_seconds
+            )
+            db.add(media)
+            await db.commit()
+            await db.refresh(media)
+        except BaseException as exc:
+            admission.release(ticket)
+            await db.rollback()
+            interrupted = _job_interrupted(exc, reserved)
+            if reservation is not None and not interrupted:
+                await BillingService.release_quota(db, reservation)
+            kept = () if interrupted else (original_path,)
+            await run_in_threadpool(_remove_files, *kept, processed_path, thumbnail_path)
+            raise
+        
+        if reservation is not None:
+            await BillingService.commit_quota(db, reservation)
+        return media
+    
+    @staticmethod
+    async def _run_video_pipeline(
+        user: CachedUser,
+        original_path: str,
+        processed_path: str,
+        on_progress: Callable[[int, int], None] | None = None
+    ):
+        from app.media.video import VideoPipeline
+        loop = asyncio.get_running_loop()
+        pipeline = VideoPipeline(
+            engine_batch_enhancer(loop, engine_for(user.tier)),
+            batch_size=settings.VIDEO_BATCH_SIZE,
+            queue_frames=settings.VIDEO_QUEUE_FRAMES,
+            ffmpeg_binary=settings.FFMPEG_BINARY,
+            crf=settings.VIDEO_CRF,
+            preset=settings.VIDEO_PRESET,
+            temporal=engine_curve_reuse(loop, user) if settings.VIDEO_TEMPORAL_REUSE else None,
+            on_progress=on_progress,
+            max_duration_seconds=TIERS[user.tier].video.max_duration_seconds
+        )
+        try:
+            await run_in_threadpool(pipeline.run, original_path, processed_path)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc)
+            ) from exc
\ No newline at end of file
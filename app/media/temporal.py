@@ -0,0 +1,115 @@
+"""
+Temporal curve reuse for video.
+
+ZR-DCE curves change slowly between consecutive frames, so the network only
+runs on keyframes. A frame becomes a keyframe when `keyframe_interval` frames
+have passed, when its thumbnail differs from the last keyframe's by more than
+`diff_threshold` (mean absolute luma difference), or when its luma histogram
+has shifted by more than `histogram_threshold` (total variation distance).
+Every other frame reuses the last keyframe's curves, or with `interpolate`
+blends the curves of the keyframes around it. Blending means holding back up
+to `keyframe_interval` frames.
+
+With `smoothing`, each new keyframe's curves are blended with the previous
+ones (an EMA) to suppress flicker. Histogram-triggered keyframes (lighting
+changes, cuts) skip both smoothing and interpolation so they take effect at once.
+"""
+from collections import deque
+from typing import Callable
+import cv2
+import numpy as np
+from app.billing.plans import EnhancementProfile
+
+THUMBNAIL_SIZE = (64, 36)
+HISTOGRAM_BINS = 32
+
+def _signature(frame: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Thumbnail and normalised histogram of the luma of an RGB float frame"""
+    thumbnail = cv2.cvtColor(cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+    histogram, _ = np.histogram(thumbnail, bins=HISTOGRAM_BINS, range=(0.0, 1.0))
+    return thumbnail, histogram / histogram.sum()
+
+class TemporalCurveReuse:
+    """
+    Per-video state. Feed frames in order with `push`, then `flush`; both
+    return the enhanced frames that are ready, in order.
+    """
+
+    def __init__(
+        self,
+        profile: EnhancementProfile,
+        estimate_curves: Callable[[np.ndarray], np.ndarray],
+        apply_curves: Callable[[np.ndarray, np.ndarray], np.ndarray]
+    ):
+        self.profile = profile
+        self.estimate_curves = estimate_curves
+        self.apply_curves = apply_curves
+        self.curves: np.ndarray | None = None
+        self.keyframe_signature: tuple[np.ndarray, np.ndarray] | None = None
+        self.since_keyframe = 0
+        self.pending: deque[np.ndarray] = deque()
+        self.frames = 0
+        self.keyframes = 0
+        self.interpolated = 0
+
+    def stats(self) -> dict:
+        return {
+            "keyframes": self.keyframes,
+            "reused": self.frames - self.keyframes - self.interpolated,
+            "interpolated": self.interpolated,
+            "skipped_fraction": round(1 - self.keyframes / self.frames, 3) if self.frames else 0.0,
+        }
+
+    def _trigger(self, signature: tuple[np.ndarray, np.ndarray]) -> str | None:
+        """Why this frame needs the network: "first", "interval", "diff", "histogram" or None"""
+        if self.keyframe_signature is None:
+            return "first"
+        thumbnail, histogram = signature
+        key_thumbnail, key_histogram = self.keyframe_signature
+        if 0.5 * np.abs(histogram - key_histogram).sum() > self.profile.histogram_threshold:
+            return "histogram"
+        if np.abs(thumbnail - key_thumbnail).mean() > self.profile.diff_threshold:
+            return "diff"
+        if self.since_keyframe >= self.profile.keyframe_interval:
+            return "interval"
+        return None
+
+    def push(self, frame: np.ndarray) -> list[np.ndarray]:
+        self.frames += 1
+        signature = _signature(frame)
+        trigger = self._trigger(signature)
+        if trigger is None:
+            self.since_keyframe += 1
+            if self.profile.interpolate:
+                self.pending.append(frame)
+                return []
+            return [self.apply_curves(frame, self.curves)]
+
+        previous = self.curves
+        curves = self.estimate_curves(frame)
+        blend = trigger != "histogram" and previous is not None and previous.shape == curves.shape
+        if blend and self.profile.smoothing:
+            curves = self.profile.smoothing * previous + (1.0 - self.profile.smoothing) * curves
+        self.curves = curves
+        self.keyframe_signature = signature
+        self.since_keyframe = 1
+        self.keyframes += 1
+
+        ready = []
+        gap = len(self.pending) + 1
+        for i in range(len(self.pending)):
+            held = self.pending.popleft()
+            if blend:
+                t = (i + 1) / gap
+                ready.append(self.apply_curves(held, (1.0 - t) * previous + t * curves))
+                self.interpolated += 1
+            else:
+                ready.append(self.apply_curves(held, previous))
+        ready.append(self.apply_curves(frame, curves))
+        return ready
+
+    def flush(self) -> list[np.ndarray]:
+        """Frames still held for interpolation get the last keyframe's curves"""
+        ready = [self.apply_curves(frame, self.curves) for frame in self.pending]
+        self.pending.clear()
+        return ready
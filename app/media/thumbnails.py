@@ -0,0 +1,56 @@
+"""
+Small WebP previews for the gallery, made once from the enhanced output.
+
+Images are decoded at the coarsest power-of-two reduction that still covers
+the thumbnail (JPEG decodes straight to the smaller size); videos use the
+frame a third of the way in, past fades from black.
+"""
+import cv2
+import numpy as np
+from PIL import Image
+from app.config import settings
+from app.billing.plans import MediaType
+
+REDUCED_READ_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def encode_thumbnail(bgr: np.ndarray) -> bytes:
+    """BGR uint8 frame -> WebP no larger than THUMBNAIL_MAX_EDGE on its long side"""
+    height, width = bgr.shape[:2]
+    scale = settings.THUMBNAIL_MAX_EDGE / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".webp", bgr, [cv2.IMWRITE_WEBP_QUALITY, settings.THUMBNAIL_QUALITY])
+    if not ok:
+        raise ValueError("WebP encoding failed")
+    return encoded.tobytes()
+
+def _read_image(path: str) -> np.ndarray | None:
+    with Image.open(path) as image:
+        long_side = max(image.size)
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced in REDUCED_READ_FLAGS:
+        if long_side // factor >= settings.THUMBNAIL_MAX_EDGE:
+            flag = reduced
+            break
+    return cv2.imread(path, flag)
+
+def _read_video_frame(path: str) -> np.ndarray | None:
+    capture = cv2.VideoCapture(path)
+    try:
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frames > 3:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, frames // 3)
+        ok, frame = capture.read()
+        return frame if ok else None
+    finally:
+        capture.release()
+
+def write_thumbnail(source_path: str, media_type: MediaType, thumbnail_path: str) -> bool:
+    """Thumbnail of an enhanced file; False if it could not be decoded (blocking)"""
+    frame = _read_image(source_path) if media_type == MediaType.IMAGE else _read_video_frame(source_path)
+    if frame is None:
+        return False
+    with open(thumbnail_path, "wb") as f:
+        f.write(encode_thumbnail(frame))
+    return True
@@ -0,0 +1,138 @@
+"""
+Streaming uploads.
+
+The request body is written to disk in UPLOAD_CHUNK_SIZE_KB pieces as it
+arrives, hashed on the way and sniffed from its first bytes, so memory stays
+at one chunk and an oversized upload is rejected at the first byte past the
+caller's tier limit (or immediately, from Content-Length). Multipart uploads,
+already spooled by Starlette, are copied through the same path.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator
+from fastapi import HTTPException, Request, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.billing.plans import MediaType
+
+SNIFF_BYTES = 64
+
+@dataclass(frozen=True, slots=True)
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+    content_type: str
+    extension: str
+
+    @property
+    def size_mb(self) -> float:
+        return self.size / (1024 * 1024)
+
+def sniff_media(head: bytes) -> tuple[str, str, MediaType] | None:
+    """(content type, extension, media type) from magic bytes, None if unsupported"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", ".jpg", MediaType.IMAGE
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", ".png", MediaType.IMAGE
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp", ".webp", MediaType.IMAGE
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "video/x-msvideo", ".avi", MediaType.VIDEO
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime", ".mov", MediaType.VIDEO
+        if brand not in (b"heic", b"heix", b"mif1", b"msf1", b"avif"):
+            return "video/mp4", ".mp4", MediaType.VIDEO
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        if b"webm" in head:
+            return "video/webm", ".webm", MediaType.VIDEO
+        return "video/x-matroska", ".mkv", MediaType.VIDEO
+    return None
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"File too large. Max size: {max_bytes // (1024 * 1024)}MB"
+    )
+
+def _sniff(head: bytes, media_type: MediaType) -> tuple[str, str]:
+    sniffed = sniff_media(head)
+    if sniffed is None or sniffed[2] != media_type:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Upload is not a supported {media_type.value} format"
+        )
+    return sniffed[0], sniffed[1]
+
+def _write(f, digest, data: bytearray):
+    digest.update(data)
+    f.write(data)
+
+def _close(f, path: str, final_path: str | None):
+    f.close()
+    if final_path is None:
+        os.remove(path)
+    else:
+        os.replace(path, final_path)
+
+async def stream_upload(request: Request, directory: str, media_type: MediaType, max_bytes: int) -> StoredUpload:
+    """Stream the raw request body to `directory`; 413 past `max_bytes`, 415 on foreign content"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise _too_large(max_bytes)
+    return await _store(request.stream(), directory, media_type, max_bytes)
+
+async def _file_chunks(upload: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+async def store_multipart(upload: UploadFile, directory: str, media_type: MediaType, max_bytes: int) -> StoredUpload:
+    """Same as stream_upload for a multipart file (413 from its spooled size before any copy)"""
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+    return await _store(_file_chunks(upload, settings.UPLOAD_CHUNK_SIZE_KB * 1024), directory, media_type, max_bytes)
+
+async def _store(chunks: AsyncIterator[bytes], directory: str, media_type: MediaType, max_bytes: int) -> StoredUpload:
+    chunk_size = settings.UPLOAD_CHUNK_SIZE_KB * 1024
+    name = uuid.uuid4().hex
+    partial_path = os.path.join(directory, f"{name}.part")
+    await run_in_threadpool(os.makedirs, directory, exist_ok=True)
+    f = await run_in_threadpool(open, partial_path, "wb")
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    sniffed = None
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            buffer += chunk
+            if sniffed is None and len(buffer) >= SNIFF_BYTES:
+                sniffed = _sniff(bytes(buffer[:SNIFF_BYTES]), media_type)
+            if len(buffer) >= chunk_size:
+                data, buffer = buffer, bytearray()
+                await run_in_threadpool(_write, f, digest, data)
+
+        if size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty upload"
+            )
+        if sniffed is None:
+            sniffed = _sniff(bytes(buffer), media_type)
+        if buffer:
+            await run_in_threadpool(_write, f, digest, buffer)
+    except BaseException:
+        await run_in_threadpool(_close, f, partial_path, None)
+        raise
+
+    content_type, extension = sniffed
+    path = os.path.join(directory, f"{name}_original{extension}")
+    await run_in_threadpool(_close, f, partial_path, path)
+    return StoredUpload(path, size, digest.hexdigest(), content_type, extension)
@@ -0,0 +1,346 @@
+"""
+Streaming video enhancement.
+
+Three stages run in their own threads and hand frames over through bounded
+queues, so at most ~3 * queue_frames frames are alive whatever the video length:
+
+    decode (cv2.VideoCapture) -> infer (batched ZR-DCE) -> encode (ffmpeg stdin)
+
+The encoder muxes the source's audio streams and container metadata into the
+output. Without an ffmpeg binary it falls back to cv2.VideoWriter, which drops audio.
+With `max_duration_seconds`, decoding stops after that many seconds of frames at
+the probed frame rate, whatever length the container claims.
+"""
+import logging
+import math
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+import cv2
+import numpy as np
+from app.media.temporal import TemporalCurveReuse
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+@dataclass(frozen=True, slots=True)
+class VideoInfo:
+    width: int
+    height: int
+    fps: float
+    frame_count: int
+
+    @property
+    def duration_seconds(self) -> float:
+        """0.0 when unknown: some containers report no (0) or a negative frame count"""
+        return self.frame_count / self.fps if self.frame_count > 0 and self.fps > 0 else 0.0
+
+def probe_video(path: str) -> VideoInfo | None:
+    """Container-reported size, frame rate and length; None if OpenCV cannot open it"""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            return None
+        return VideoInfo(
+            width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            fps=capture.get(cv2.CAP_PROP_FPS) or 30.0,
+            frame_count=int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        )
+    finally:
+        capture.release()
+
+@dataclass
+class StageStats:
+    name: str
+    frames: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        """Throughput the stage would reach if it never waited on its neighbours"""
+        return self.frames / self.busy_seconds if self.busy_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {"frames": self.frames, "busy_seconds": round(self.busy_seconds, 3), "fps": round(self.fps, 2)}
+
+@dataclass
+class PipelineStats:
+    frames: int = 0
+    elapsed_seconds: float = 0.0
+    audio_muxed: bool = False
+    temporal: dict | None = None
+    stages: dict[str, StageStats] = field(default_factory=lambda: {
+        name: StageStats(name) for name in ("decode", "infer", "encode")
+    })
+
+    @property
+    def bottleneck(self) -> str:
+        return min(self.stages.values(), key=lambda stage: stage.fps or float("inf")).name
+
+    def as_dict(self) -> dict:
+        return {
+            "frames": self.frames,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "fps": round(self.frames / self.elapsed_seconds, 2) if self.elapsed_seconds else 0.0,
+            "audio_muxed": self.audio_muxed,
+            "bottleneck": self.bottleneck,
+            "temporal": self.temporal,
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+def _to_rgb_float(frame: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+
+def _to_bgr8(frame: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor((frame * 255.0 + 0.5).astype(np.uint8), cv2.COLOR_RGB2BGR)
+
+class VideoPipeline:
+    """
+    `enhance_batch` takes a list of HxWx3 float32 RGB frames in [0, 1] and
+    returns them enhanced; it is called from the infer thread only. With
+    `temporal`, frames go through that instead and only keyframes reach the network.
+    `on_progress(frames_encoded, frame_count)` is called from the encode thread
+    after every frame, so it must be cheap (job progress throttles itself).
+    `max_duration_seconds` caps the frames decoded (the tier's limit).
+    """
+
+    def __init__(
+        self,
+        enhance_batch: Callable[[list[np.ndarray]], list[np.ndarray]],
+        batch_size: int,
+        queue_frames: int,
+        ffmpeg_binary: str | None = "ffmpeg",
+        crf: int = 18,
+        preset: str = "veryfast",
+        temporal: TemporalCurveReuse | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+        max_duration_seconds: float | None = None
+    ):
+        self.enhance_batch = enhance_batch
+        self.max_duration_seconds = max_duration_seconds
+        self.temporal = temporal
+        self.on_progress = on_progress
+        self.batch_size = batch_size
+        self.queue_frames = queue_frames
+        self.ffmpeg = shutil.which(ffmpeg_binary) if ffmpeg_binary else None
+        self.crf = crf
+        self.preset = preset
+
+    def run(self, source_path: str, output_path: str) -> PipelineStats:
+        """Enhance `source_path` into an H.264 mp4 at `output_path`; blocks until done"""
+        info = probe_video(source_path)
+        if info is None:
+            raise ValueError("Could not open video")
+
+        stats = PipelineStats(audio_muxed=self.ffmpeg is not None)
+        decoded = queue.Queue(maxsize=self.queue_frames)
+        enhanced = queue.Queue(maxsize=self.queue_frames)
+        stop = threading.Event()
+        errors: list[BaseException] = []
+
+        def stage(target, *args):
+            def worker():
+                try:
+                    target(*args)
+                except BaseException as exc:
+                    errors.append(exc)
+                    stop.set()
+            return threading.Thread(target=worker, name=f"video-{target.__name__.strip('_')}", daemon=True)
+
+        max_frames = math.ceil(self.max_duration_seconds * info.fps) if self.max_duration_seconds else None
+        started = time.perf_counter()
+        threads = [
+            stage(self._decode, source_path, decoded, stop, stats.stages["decode"], max_frames),
+            stage(
+                self._infer if self.temporal is None else self._infer_temporal,
+                decoded, enhanced, stop, stats.stages["infer"]
+            ),
+            stage(self._encode, source_path, output_path, info, enhanced, stop, stats.stages["encode"]),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        stats.frames = stats.stages["encode"].frames
+        if self.temporal is not None:
+            stats.temporal = self.temporal.stats()
+        stats.elapsed_seconds = time.perf_counter() - started
+        logger.info("Enhanced %s: %s", source_path, stats.as_dict())
+        return stats
+
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    @staticmethod
+    def _get(q: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _decode(
+        self,
+        source_path: str,
+        out: queue.Queue,
+        stop: threading.Event,
+        stats: StageStats,
+        max_frames: int | None = None
+    ):
+        capture = cv2.VideoCapture(source_path)
+        try:
+            while not stop.is_set():
+                began = time.perf_counter()
+                ok, frame = capture.read()
+                stats.busy_seconds += time.perf_counter() - began
+                if not ok:
+                    break
+                if max_frames is not None and stats.frames >= max_frames:
+                    logger.warning("%s is longer than %d frames; the rest is not enhanced", source_path, max_frames)
+                    break
+                stats.frames += 1
+                self._put(out, frame, stop)
+        finally:
+            capture.release()
+            self._put(out, _END, stop)
+
+    def _infer(self, source: queue.Queue, out: queue.Queue, stop: threading.Event, stats: StageStats):
+        done = False
+        while not done and not stop.is_set():
+            batch = []
+            while len(batch) < self.batch_size:
+                frame = self._get(source, stop)
+                if frame is _END:
+                    done = True
+                    break
+                batch.append(frame)
+            if not batch:
+                continue
+
+            began = time.perf_counter()
+            results = [_to_bgr8(frame) for frame in self.enhance_batch([_to_rgb_float(frame) for frame in batch])]
+            stats.busy_seconds += time.perf_counter() - began
+            stats.frames += len(results)
+            for result in results:
+                self._put(out, result, stop)
+        self._put(out, _END, stop)
+
+    def _infer_temporal(self, source: queue.Queue, out: queue.Queue, stop: threading.Event, stats: StageStats):
+        while not stop.is_set():
+            frame = self._get(source, stop)
+            began = time.perf_counter()
+            if frame is _END:
+                results = self.temporal.flush()
+            else:
+                results = self.temporal.push(_to_rgb_float(frame))
+            results = [_to_bgr8(result) for result in results]
+            stats.busy_seconds += time.perf_counter() - began
+            stats.frames += len(results)
+            for result in results:
+                self._put(out, result, stop)
+            if frame is _END:
+                break
+        self._put(out, _END, stop)
+
+    def _encode(
+        self,
+        source_path: str,
+        output_path: str,
+        info: VideoInfo,
+        source: queue.Queue,
+        stop: threading.Event,
+        stats: StageStats
+    ):
+        encoder = None
+        try:
+            while True:
+                frame = self._get(source, stop)
+                if frame is _END:
+                    break
+                began = time.perf_counter()
+                if encoder is None:
+                    # Size from the first decoded frame: OpenCV may have applied rotation metadata
+                    encoder = self._open_encoder(source_path, output_path, frame.shape[1], frame.shape[0], info.fps)
+                encoder.write(frame)
+                stats.busy_seconds += time.perf_counter() - began
+                stats.frames += 1
+                if self.on_progress is not None:
+                    self.on_progress(stats.frames, info.frame_count)
+        except BaseException:
+            if encoder is not None:
+                encoder.abort()
+            raise
+        if encoder is None:
+            raise ValueError("Video has no decodable frames")
+        if stop.is_set():
+            encoder.abort()
+            return
+        began = time.perf_counter()
+        encoder.close()
+        stats.busy_seconds += time.perf_counter() - began
+
+    def _open_encoder(self, source_path: str, output_path: str, width: int, height: int, fps: float):
+        if self.ffmpeg is None:
+            logger.warning("ffmpeg not found; %s is encoded without audio", output_path)
+            return _OpenCVEncoder(output_path, width, height, fps)
+        return _FFmpegEncoder(self._ffmpeg_command(source_path, output_path, width, height, fps))
+
+    def _ffmpeg_command(self, source_path: str, output_path: str, width: int, height: int, fps: float) -> list[str]:
+        """Raw BGR frames on stdin + audio/metadata from the source -> H.264 mp4"""
+        return [
+            self.ffmpeg, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", f"{fps:.6f}", "-i", "pipe:0",
+            "-i", source_path,
+            "-map", "0:v:0", "-map", "1:a?", "-map_metadata", "1",
+            "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest", "-movflags", "+faststart",
+            output_path,
+        ]
+
+class _FFmpegEncoder:
+
+    def __init__(self, command: list[str]):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write(self, frame: np.ndarray):
+        self.process.stdin.write(frame.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[-500:]}")
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+
+class _OpenCVEncoder:
+
+    def __init__(self, output_path: str, width: int, height: int, fps: float):
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+
+    def write(self, frame: np.ndarray):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+    abort = close
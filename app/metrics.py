@@ -0,0 +1,197 @@
+"""
+Prometheus metrics for the hot path, served at GET /metrics.
+
+`MetricsMiddleware` times every HTTP request by route template and counts the
+SQL statements it ran (and their time) through cursor events on both engines
+(`instrument_engine`, hooked up in app.database). Authentication, Argon2, the
+inference engine, admission control and the caches record into the
+module-level metrics below.
+
+Every process (uvicorn workers, job workers) writes its values to mmapped files
+in METRICS_MULTIPROC_DIR and /metrics sums the files of all of them, so a scrape
+sees the whole server whichever worker answers it. The directory is set up
+before prometheus_client is imported; files of processes that are gone are
+removed at startup (`clear_dead_processes`), their counters restarting from zero.
+"""
+import contextvars
+import os
+import re
+import time
+from dataclasses import dataclass
+from app.config import settings
+from app.profiler import profiler
+
+if settings.METRICS_MULTIPROC_DIR:
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402  (after PROMETHEUS_MULTIPROC_DIR)
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 12, 20, 50, 100)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled", multiprocess_mode="livesum",
+)
+HTTP_REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements run per request", ["route"], buckets=COUNT_BUCKETS,
+)
+HTTP_REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds", "Time spent in SQL statements per request", ["route"],
+)
+SQL_STATEMENT_SECONDS = Histogram(
+    "sql_statement_duration_seconds", "Cursor execution time of one SQL statement", buckets=FAST_BUCKETS,
+)
+JWT_DECODE_SECONDS = Histogram(
+    "jwt_decode_duration_seconds", "Access token signature check and decode", buckets=FAST_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "Argon2 hash or verify, including the wait for a pool process",
+    ["operation"],
+)
+PASSWORD_HASH_PENDING = Gauge(
+    "password_hash_pending", "Argon2 calls queued or running", multiprocess_mode="livesum",
+)
+ENHANCE_STAGE_SECONDS = Histogram(
+    "enhance_stage_duration_seconds", "Image enhancement stages: decode, model (queue + batch), encode",
+    ["stage"],
+)
+INFERENCE_BATCH_SECONDS = Histogram(
+    "inference_batch_duration_seconds", "One batched model call", ["backend", "mode"],
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "inference_batch_size", "Images per batched model call", ["backend", "mode"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "inference_queue_depth", "Images waiting for a batch", ["backend"], multiprocess_mode="livesum",
+)
+JOBS_QUEUED = Gauge(
+    "jobs_queued", "Background jobs waiting for a worker", ["tier"], multiprocess_mode="mostrecent",
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections", "Enhancement requests turned away: shed (503) or rate limited (429)", ["tier", "reason"],
+)
+ADMISSION_INFLIGHT_WORK = Gauge(
+    "admission_inflight_work", "Admitted enhancement work not yet done: megapixels or video seconds",
+    ["media_type"], multiprocess_mode="livesum",
+)
+JOB_EVENT_STREAMS = Gauge(
+    "job_event_streams", "Clients connected to job progress streams", multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups", "Cache lookups by result (hit ratio: hits / all)", ["cache", "result"],
+)
+
+@dataclass(slots=True)
+class RequestStats:
+    """SQL work of the request being handled (a context variable, so it follows the request's tasks and threads)"""
+    statements: int = 0
+    sql_seconds: float = 0.0
+
+current_request: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("current_request", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    SQL_STATEMENT_SECONDS.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+def instrument_engine(engine):
+    """Time every statement of a (sync) engine; use `async_engine.sync_engine` for the async one"""
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _route_name(scope: dict) -> str:
+    # the matched route's template keeps the label set small ("/media/{media_id}")
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL work per route, and handing slow requests to the profiler"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            current_request.reset(token)
+            route = _route_name(scope)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status_code)).observe(elapsed)
+            HTTP_REQUEST_SQL_STATEMENTS.labels(route).observe(stats.statements)
+            HTTP_REQUEST_SQL_SECONDS.labels(route).observe(stats.sql_seconds)
+            if profiler.enabled and elapsed * 1000 >= settings.PROFILE_SLOW_REQUEST_MS:
+                await profiler.report(scope["method"], route, started, elapsed)
+
+def render() -> bytes:
+    """Every process's metrics in Prometheus text format (blocking: reads the multiprocess files)"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+_DB_FILE = re.compile(r"_(\d+)\.db$")
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def clear_dead_processes():
+    """Remove the metric files of processes that no longer run (blocking)"""
+    if not MULTIPROC_DIR:
+        return
+    for name in os.listdir(MULTIPROC_DIR):
+        match = _DB_FILE.search(name)
+        if match and not _alive(int(match.group(1))):
+            try:
+                os.remove(os.path.join(MULTIPROC_DIR, name))
+            except FileNotFoundError:
+                pass
+
+def mark_process_dead():
+    """Drop this process's live gauges from the sums; call when it shuts down"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid(), MULTIPROC_DIR)
@@ -0,0 +1,55 @@
+"""
+Low-resolution curve estimation (the ZR-DCE++ trick).
+
+Curve maps are smooth, so they can be estimated on a downscaled copy and
+upsampled. The upsampling and the curve application run in row strips, so the
+full-resolution 3 * iterations channel curve tensor is never materialised.
+"""
+import cv2
+import numpy as np
+
+# 64K pixels x 3 channels x float32 = 768 KB per working array, small enough to stay in cache
+STRIP_PIXELS = 1 << 16
+
+def downscale(image: np.ndarray, scale: int) -> np.ndarray:
+    """Area-average HxWx3 down by `scale` (at least one pixel per side)"""
+    height, width = image.shape[:2]
+    size = (max(1, round(width / scale)), max(1, round(height / scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def _source_coords(size: int, source_size: int) -> np.ndarray:
+    """Pixel-centre aligned sample positions, same convention as cv2.resize"""
+    return ((np.arange(size, dtype=np.float32) + 0.5) * (source_size / size) - 0.5).astype(np.float32)
+
+def apply_lowres_curves(image: np.ndarray, curves: np.ndarray, iterations: int) -> np.ndarray:
+    """
+    Bilinearly upsample `curves` (h x w x 3 * iterations) to the size of
+    `image` (H x W x 3, float32 in [0, 1]) and apply LE(x) = x + r * x * (1 - x)
+    once per curve map. Returns a new clipped float32 image.
+    """
+    height, width = image.shape[:2]
+    # One contiguous 3-channel map per iteration keeps the per-pixel math unstrided
+    maps = [np.ascontiguousarray(curves[..., 3 * i:3 * i + 3], dtype=np.float32) for i in range(iterations)]
+    map_x = _source_coords(width, curves.shape[1])
+    map_y = _source_coords(height, curves.shape[0])
+    strip_rows = max(1, STRIP_PIXELS // width)
+
+    output = np.empty_like(image, dtype=np.float32)
+    for top in range(0, height, strip_rows):
+        bottom = min(height, top + strip_rows)
+        xs = np.broadcast_to(map_x, (bottom - top, width))
+        ys = np.broadcast_to(map_y[top:bottom, None], (bottom - top, width))
+        xs, ys = cv2.convertMaps(np.ascontiguousarray(xs), np.ascontiguousarray(ys), cv2.CV_16SC2)
+
+        x = output[top:bottom]
+        x[...] = image[top:bottom]
+        step = np.empty_like(x)
+        r = np.empty_like(x)
+        for curve_map in maps:
+            cv2.remap(curve_map, xs, ys, cv2.INTER_LINEAR, dst=r, borderMode=cv2.BORDER_REPLICATE)
+            np.multiply(x, x, out=step)
+            np.subtract(x, step, out=step)
+            step *= r
+            x += step
+        np.clip(x, 0.0, 1.0, out=x)
+    return output
@@ -0,0 +1,354 @@
+"""
+Dynamic micro-batching for ZR-DCE.
+
+Concurrent callers await `InferenceEngine.enhance(image)`. Requests are grouped
+by padded shape bucket; a bucket is dispatched as one `model(...)` call as soon
+as it is full or its oldest request has waited `max_wait_ms`. While batches
+are running (`max_concurrent_batches` at a time, one unless the model lives in
+model-server processes, see app.model.server), new requests keep accumulating,
+so batches grow with load.
+
+Images larger than `lowres_min_pixels` only go through the network at
+1/`lowres_scale` size (or smaller, so at most `lowres_max_estimate_pixels`
+reach the network) to estimate curve maps; the curves are upsampled and
+applied at full resolution off the TensorFlow thread (see app.model.curves).
+
+There is one engine per inference backend: the float32 model ("tf") or a
+reduced-precision TFLite conversion (app.model.tflite); each tier names its
+backend in plans.py. TensorFlow and OpenCV are only imported once the model
+loads or curves are applied. `warm_up` does both ahead of traffic and runs
+the model once per mode, so the first request pays for neither.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+import numpy as np
+from app.billing.plans import TIERS, SubscriptionTier
+from app.config import settings
+from app.metrics import INFERENCE_BATCH_SECONDS, INFERENCE_BATCH_SIZE, INFERENCE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _Request:
+    image: np.ndarray
+    future: asyncio.Future
+    curves_only: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class InferenceEngine:
+
+    def __init__(
+        self,
+        model_loader: Callable,
+        max_batch_size: int,
+        max_batch_pixels: int,
+        max_wait_ms: float,
+        bucket_multiple: int,
+        lowres_scale: int = 1,
+        lowres_min_pixels: int = 0,
+        lowres_max_estimate_pixels: int = 0,
+        max_concurrent_batches: int = 1,
+        backend: str = "tf"
+    ):
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_batch_pixels = max_batch_pixels
+        self.max_wait = max_wait_ms / 1000
+        self.bucket_multiple = bucket_multiple
+        self.lowres_scale = lowres_scale
+        self.lowres_min_pixels = lowres_min_pixels
+        self.lowres_max_estimate_pixels = lowres_max_estimate_pixels
+        self.backend = backend
+        self.model = None
+        self.batches_run = 0
+        self.images_run = 0
+        self.lowres_images_run = 0
+        self.warmed_up = False
+        self._queue: asyncio.Queue | None = None
+        self._buckets: dict[tuple[int, int, bool], deque[_Request]] = {}
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max_concurrent_batches)
+        self._start_lock = asyncio.Lock()
+        # TensorFlow (or the calls to a model server) runs here, never on the event loop;
+        # with one thread, batches run in order
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="zr-dce")
+
+    async def start(self):
+        async with self._start_lock:
+            if self._task is not None:
+                return
+            if self.model is None:
+                loop = asyncio.get_running_loop()
+                self.model = await loop.run_in_executor(self._executor, self.model_loader)
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def warm_up(self, sizes: list[tuple[int, int]]):
+        """Load the model, trace both inference graphs on the bucket of each (width, height) size and load the curve code"""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for height, width in self.warmup_buckets(sizes):
+            image = np.full((height, width, 3), 0.25, dtype=np.float32)
+            await loop.run_in_executor(self._executor, self._infer, (height, width, False), [image])
+            curves = (await loop.run_in_executor(self._executor, self._infer, (height, width, True), [image]))[0]
+        await loop.run_in_executor(None, self.apply_curves, image, curves)
+        self.warmed_up = True
+
+    def warmup_buckets(self, sizes: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """The padded (height, width) buckets that images of these (width, height) sizes run on"""
+        buckets = []
+        for width, height in sizes:
+            scale = self.lowres_factor(height, width)
+            if scale > 1:
+                # the size curves.downscale gives
+                height, width = max(1, round(height / scale)), max(1, round(width / scale))
+            bucket = self.bucket_shape(height, width)
+            if bucket not in buckets:
+                buckets.append(bucket)
+        return buckets
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in self._running:
+            task.cancel()
+        for bucket in self._buckets.values():
+            for request in bucket:
+                request.future.cancel()
+        self._buckets.clear()
+        # model-server channels and their shared memory
+        close = getattr(self.model, "close", None)
+        if close is not None:
+            close()
+
+    @property
+    def queue_depth(self) -> int:
+        waiting = self._queue.qsize() if self._queue is not None else 0
+        return waiting + sum(len(bucket) for bucket in self._buckets.values())
+
+    def lowres_factor(self, height: int, width: int) -> int:
+        """Downscale factor for curve estimation; 1 means full-resolution inference"""
+        pixels = height * width
+        if self.lowres_scale <= 1 or pixels <= self.lowres_min_pixels:
+            return 1
+        if self.lowres_max_estimate_pixels:
+            return max(self.lowres_scale, math.ceil(math.sqrt(pixels / self.lowres_max_estimate_pixels)))
+        return self.lowres_scale
+
+    async def enhance(self, image: np.ndarray, scale: int | None = None) -> np.ndarray:
+        """Enhance one HxWx3 float32 RGB image in [0, 1]; `scale=None` picks the mode by size"""
+        if self._task is None:
+            await self.start()
+        if scale is None:
+            scale = self.lowres_factor(*image.shape[:2])
+        if scale <= 1:
+            return await self._submit(image, curves_only=False)
+
+        curves = await self.estimate_curves(image, scale)
+        self.lowres_images_run += 1
+        return await asyncio.get_running_loop().run_in_executor(None, self.apply_curves, image, curves)
+
+    async def estimate_curves(self, image: np.ndarray, scale: int | None = None) -> np.ndarray:
+        """Curve maps only (h x w x 3 * iterations), at 1/scale of the image size"""
+        if self._task is None:
+            await self.start()
+        if scale is None:
+            scale = self.lowres_factor(*image.shape[:2])
+        if scale > 1:
+            from app.model.curves import downscale
+            image = await asyncio.get_running_loop().run_in_executor(None, downscale, image, scale)
+        return await self._submit(image, curves_only=True)
+
+    def apply_curves(self, image: np.ndarray, curves: np.ndarray) -> np.ndarray:
+        """Upsample `curves` from estimate_curves to the image and apply them (blocking)"""
+        from app.model.curves import apply_lowres_curves
+        return apply_lowres_curves(image, curves, self.model.iterations)
+
+    async def _submit(self, image: np.ndarray, curves_only: bool) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Request(image, future, curves_only))
+        INFERENCE_QUEUE_DEPTH.labels(self.backend).set(self.queue_depth)
+        return await future
+
+    def bucket_shape(self, height: int, width: int) -> tuple[int, int]:
+        m = self.bucket_multiple
+        return math.ceil(height / m) * m, math.ceil(width / m) * m
+
+    def _batch_limit(self, key: tuple[int, int, bool]) -> int:
+        return max(1, min(self.max_batch_size, self.max_batch_pixels // (key[0] * key[1])))
+
+    def _add(self, request: _Request):
+        key = (*self.bucket_shape(*request.image.shape[:2]), request.curves_only)
+        self._buckets.setdefault(key, deque()).append(request)
+
+    def _ready_bucket(self, now: float) -> tuple[int, int, bool] | None:
+        """A full bucket, else the bucket whose oldest request has waited long enough"""
+        oldest_key, oldest_at = None, math.inf
+        for key, bucket in self._buckets.items():
+            if len(bucket) >= self._batch_limit(key):
+                return key
+            if bucket[0].enqueued_at < oldest_at:
+                oldest_key, oldest_at = key, bucket[0].enqueued_at
+        if oldest_key is not None and now - oldest_at >= self.max_wait:
+            return oldest_key
+        return None
+
+    def _next_deadline(self) -> float:
+        return min(bucket[0].enqueued_at for bucket in self._buckets.values()) + self.max_wait
+
+    async def _next_ready(self) -> tuple[int, int, bool]:
+        while True:
+            if not self._buckets:
+                self._add(await self._queue.get())
+            while not self._queue.empty():
+                self._add(self._queue.get_nowait())
+
+            key = self._ready_bucket(time.monotonic())
+            if key is not None:
+                return key
+            try:
+                timeout = max(0.0, self._next_deadline() - time.monotonic())
+                self._add(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        while True:
+            # wait for a free slot first: requests keep piling into buckets meanwhile
+            await self._slots.acquire()
+            key = await self._next_ready()
+            bucket = self._buckets[key]
+            batch = [bucket.popleft() for _ in range(min(len(bucket), self._batch_limit(key)))]
+            if not bucket:
+                del self._buckets[key]
+            INFERENCE_QUEUE_DEPTH.labels(self.backend).set(self.queue_depth)
+            task = asyncio.create_task(self._dispatch(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._dispatch_done)
+
+    def _dispatch_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, key: tuple[int, int, bool], batch: list[_Request]):
+        batch = [request for request in batch if not request.future.cancelled()]
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        mode = "curves" if key[2] else "enhance"
+        started = time.perf_counter()
+        try:
+            outputs = await loop.run_in_executor(
+                self._executor, self._infer, key, [request.image for request in batch]
+            )
+        except Exception as exc:
+            logger.exception("ZR-DCE batch of %d failed", len(batch))
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+            return
+
+        self.batches_run += 1
+        self.images_run += len(batch)
+        INFERENCE_BATCH_SECONDS.labels(self.backend, mode).observe(time.perf_counter() - started)
+        INFERENCE_BATCH_SIZE.labels(self.backend, mode).observe(len(batch))
+        for request, output in zip(batch, outputs):
+            if not request.future.done():
+                request.future.set_result(output)
+
+    def _infer(self, key: tuple[int, int, bool], images: list[np.ndarray]) -> list[np.ndarray]:
+        """Pad every image to the bucket shape, run one model call, crop the results back"""
+        height, width, curves_only = key
+        shape = (len(images), height, width, 3)
+        # a RemoteModel hands out its shared-memory input, so padding is the only copy
+        input_buffer = getattr(self.model, "input_buffer", None)
+        batch = input_buffer(shape) if input_buffer is not None else np.empty(shape, dtype=np.float32)
+        for i, image in enumerate(images):
+            h, w = image.shape[:2]
+            batch[i] = np.pad(image, ((0, height - h), (0, width - w), (0, 0)), mode="edge")
+
+        if curves_only:
+            curves = np.asarray(self.model.serve_curves(batch))
+            return [curves[i, :image.shape[0], :image.shape[1]] for i, image in enumerate(images)]
+
+        enhanced = np.asarray(self.model.serve(batch))
+        return [
+            np.clip(enhanced[i, :image.shape[0], :image.shape[1]], 0.0, 1.0)
+            for i, image in enumerate(images)
+        ]
+
+def warmup_sizes() -> list[tuple[int, int]]:
+    """MODEL_WARMUP_SIZES as (width, height) pairs"""
+    sizes = []
+    for part in filter(None, (part.strip().lower() for part in settings.MODEL_WARMUP_SIZES.split(","))):
+        width, height = part.split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+def _load_zr_dce():
+    from app.model.zr_dce import load_model
+    return load_model()
+
+def _tflite_loader(quantization: str) -> Callable:
+    def load():
+        from app.model.tflite import AccuracyGateError, load_tflite_model
+        try:
+            return load_tflite_model(quantization)
+        except AccuracyGateError:
+            logger.exception("TFLite %s failed the accuracy gate; serving float32 instead", quantization)
+            return _load_zr_dce()
+    return load
+
+INFERENCE_BACKENDS = {
+    "tf": _load_zr_dce,
+    "tflite-fp16": _tflite_loader("fp16"),
+    "tflite-int8": _tflite_loader("int8"),
+}
+
+def _remote_loader(backend: str) -> Callable:
+    def load():
+        from app.model.server import RemoteModel
+        return RemoteModel(backend, settings.MODEL_SERVER_PROCESSES)
+    return load
+
+def _make_engine(backend: str) -> InferenceEngine:
+    remote = settings.MODEL_SERVER_PROCESSES > 0
+    return InferenceEngine(
+        model_loader=_remote_loader(backend) if remote else INFERENCE_BACKENDS[backend],
+        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+        max_batch_pixels=settings.INFERENCE_MAX_BATCH_PIXELS,
+        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+        bucket_multiple=settings.INFERENCE_BUCKET_MULTIPLE,
+        lowres_scale=settings.INFERENCE_LOWRES_SCALE,
+        lowres_min_pixels=settings.INFERENCE_LOWRES_MIN_PIXELS,
+        lowres_max_estimate_pixels=settings.INFERENCE_LOWRES_MAX_ESTIMATE_PIXELS,
+        max_concurrent_batches=settings.MODEL_SERVER_PROCESSES if remote else 1,
+        backend=backend,
+    )
+
+# One engine (model, batching queue, executor thread) per backend; a model only loads
+# when its engine is first used or warmed up. With MODEL_SERVER_PROCESSES, engines
+# batch here and run the batches in the model servers (app.model.server)
+inference_engines = {backend: _make_engine(backend) for backend in INFERENCE_BACKENDS}
+inference_engine = inference_engines["tf"]
+
+def engine_for(tier: SubscriptionTier) -> InferenceEngine:
+    """The engine of a tier's inference backend (plans.py)"""
+    return inference_engines[TIERS[tier].inference_backend]
+
+def engines_in_use() -> list[InferenceEngine]:
+    """Engines some tier is served by: the ones to warm up and stop"""
+    return [inference_engines[backend] for backend in dict.fromkeys(plan.inference_backend for plan in TIERS.values())]
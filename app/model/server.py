@@ -0,0 +1,343 @@
+"""
+Model-server processes: TensorFlow runs here instead of in API workers.
+
+ModelServerPool spawns MODEL_SERVER_PROCESSES processes, either from the API
+lifespan or on their own with `python -m app.model.server` (then set
+MODEL_SERVER_SPAWN=false, so several API workers share one pool). Server i
+listens on MODEL_SERVER_SOCKET_DIR/<pool>/model-<i>.sock, loads a backend's
+model the first time a client asks for it, and runs one batch at a time with
+MODEL_SERVER_INTRA_OP_THREADS / MODEL_SERVER_INTER_OP_THREADS TensorFlow
+threads, optionally pinned to its own share of the CPUs.
+
+The standalone pool is "shared". A spawned pool is named after the process
+that spawned it: every uvicorn worker spawns its own, and that worker and the
+job workers it starts (which inherit MODEL_SERVER_POOL) only talk to it.
+Standalone job workers (`python -m app.jobs.worker`) use the shared pool.
+
+In the API, each InferenceEngine's model is a RemoteModel. Every engine
+thread has a channel to one server: a connection for small control messages
+and a shared-memory segment the thread owns. The engine pads its batch
+straight into the segment, the server writes its output after the input, and
+only (name, shape) tuples cross the socket, so pixels are never pickled.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_ALIGNMENT = 1 << 20
+# set by ModelServerPool.start, inherited by the servers and job workers spawned after it
+POOL_ENV = "MODEL_SERVER_POOL"
+SHARED_POOL = "shared"
+
+def _pool_dir(pool: str | None = None) -> str:
+    return os.path.join(settings.MODEL_SERVER_SOCKET_DIR, pool or os.environ.get(POOL_ENV, SHARED_POOL))
+
+def socket_path(index: int) -> str:
+    return os.path.join(_pool_dir(), f"model-{index}.sock")
+
+def _authkey() -> bytes:
+    return settings.SECRET_KEY.encode()
+
+def _attach(name: str) -> SharedMemory:
+    """
+    Map a segment the client owns. The client unlinks it, so it must not be
+    registered with this process's resource tracker (which would unlink it on
+    exit); Python 3.11 has no SharedMemory(track=False)
+    """
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+class ModelServer:
+    """One process: the models it has loaded and the connections it serves"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.models = {}
+        self._load_lock = threading.Lock()
+        # one batch at a time, so TensorFlow's thread pools are never oversubscribed
+        self._run_lock = threading.Lock()
+
+    def model(self, backend: str):
+        with self._load_lock:
+            if backend not in self.models:
+                from app.model.engine import INFERENCE_BACKENDS, inference_engines, warmup_sizes
+                model = INFERENCE_BACKENDS[backend]()
+                # every server traces the warm-up buckets, whichever one the engine's warm-up reaches
+                for height, width in inference_engines[backend].warmup_buckets(warmup_sizes()):
+                    sample = np.full((1, height, width, 3), 0.25, dtype=np.float32)
+                    np.asarray(model.serve(sample))
+                    np.asarray(model.serve_curves(sample))
+                self.models[backend] = model
+                logger.info("Model server %d loaded %s", self.index, backend)
+            return self.models[backend]
+
+    def _infer(self, backend: str, curves_only: bool, segment: SharedMemory, shape: tuple) -> tuple:
+        model = self.model(backend)
+        batch = np.ndarray(shape, dtype=np.float32, buffer=segment.buf)
+        with self._run_lock:
+            output = np.asarray(model.serve_curves(batch) if curves_only else model.serve(batch))
+        view = np.ndarray(output.shape, dtype=np.float32, buffer=segment.buf, offset=batch.nbytes)
+        view[...] = output
+        return output.shape
+
+    def handle(self, connection: Connection):
+        segment = None
+        try:
+            while True:
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    return
+                try:
+                    if message[0] == "load":
+                        connection.send(("ok", self.model(message[1]).iterations))
+                        continue
+                    _, backend, curves_only, name, shape = message
+                    if segment is None or segment.name != name:
+                        if segment is not None:
+                            segment.close()
+                        segment = _attach(name)
+                    connection.send(("ok", self._infer(backend, curves_only, segment, shape)))
+                except Exception as exc:
+                    logger.exception("Model server %d request failed", self.index)
+                    connection.send(("error", f"{type(exc).__name__}: {exc}"))
+        finally:
+            if segment is not None:
+                segment.close()
+            connection.close()
+
+    def serve_forever(self):
+        path = socket_path(self.index)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)
+        with Listener(path, family="AF_UNIX", authkey=_authkey()) as listener:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError):
+                    logger.warning("Model server %d rejected a connection", self.index)
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+def _configure(index: int, processes: int):
+    """TensorFlow thread pools and CPU affinity; must run before TensorFlow starts"""
+    if settings.MODEL_SERVER_PIN_CPUS and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        share = cpus[index * len(cpus) // processes:(index + 1) * len(cpus) // processes] or [cpus[index % len(cpus)]]
+        os.sched_setaffinity(0, share)
+    if settings.MODEL_SERVER_INTRA_OP_THREADS or settings.MODEL_SERVER_INTER_OP_THREADS:
+        import tensorflow as tf
+        if settings.MODEL_SERVER_INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(settings.MODEL_SERVER_INTRA_OP_THREADS)
+        if settings.MODEL_SERVER_INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(settings.MODEL_SERVER_INTER_OP_THREADS)
+
+def _process_main(index: int, processes: int):
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, lambda *args: os._exit(0))
+    _configure(index, processes)
+    ModelServer(index).serve_forever()
+
+class ModelServerPool:
+    """`name`: the socket directory of the pool, by default named after the process starting it"""
+
+    def __init__(self, processes: int, name: str | None = None):
+        self.processes = processes
+        self.name = name
+        self._servers: list[multiprocessing.Process] = []
+
+    def start(self):
+        if not self.processes:
+            return
+        os.environ[POOL_ENV] = self.name or f"pid-{os.getpid()}"
+        # spawn: never fork a process that already runs an event loop and DB pools
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.processes):
+            process = context.Process(
+                target=_process_main,
+                args=(index, self.processes),
+                name=f"model-server-{index}",
+                daemon=True
+            )
+            process.start()
+            self._servers.append(process)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the servers; in-flight batches fail (blocking)"""
+        for process in self._servers:
+            process.terminate()
+        for process in self._servers:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if self._servers:
+            # the servers exit without unlinking their sockets
+            shutil.rmtree(_pool_dir(), ignore_errors=True)
+        self._servers.clear()
+
+    def join(self):
+        for process in self._servers:
+            process.join()
+
+class ModelServerError(RuntimeError):
+    """A model server failed a request, or could not be reached"""
+
+class _Channel:
+    """One engine thread's connection to a server and the shared-memory segment it owns"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.connection = self._connect(index)
+        self.segment: SharedMemory | None = None
+
+    @staticmethod
+    def _connect(index: int) -> Connection:
+        deadline = time.monotonic() + settings.MODEL_SERVER_CONNECT_TIMEOUT_SECONDS
+        while True:
+            try:
+                return Client(socket_path(index), family="AF_UNIX", authkey=_authkey())
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise ModelServerError(f"Model server {index} is not listening on {socket_path(index)}")
+                time.sleep(0.1)
+
+    def call(self, *message):
+        self.connection.send(message)
+        state, value = self.connection.recv()
+        if state != "ok":
+            raise ModelServerError(f"Model server {self.index}: {value}")
+        return value
+
+    def input(self, shape: tuple, output_channels: int) -> np.ndarray:
+        """View of the segment's input region, grown to fit the batch and its output"""
+        count = int(np.prod(shape))
+        needed = 4 * (count + count // shape[-1] * output_channels)
+        if self.segment is None or self.segment.size < needed:
+            self.close_segment()
+            size = -(-needed // SEGMENT_ALIGNMENT) * SEGMENT_ALIGNMENT
+            self.segment = SharedMemory(create=True, size=size)
+        return np.ndarray(shape, dtype=np.float32, buffer=self.segment.buf)
+
+    def output(self, input_shape: tuple, shape: tuple) -> np.ndarray:
+        offset = 4 * int(np.prod(input_shape))
+        return np.ndarray(shape, dtype=np.float32, buffer=self.segment.buf, offset=offset)
+
+    def close_segment(self):
+        if self.segment is not None:
+            try:
+                self.segment.close()
+            except BufferError:
+                logger.warning("Shared-memory segment %s still in use; left mapped", self.segment.name)
+            self.segment.unlink()
+            self.segment = None
+
+    def close(self):
+        self.connection.close()
+        self.close_segment()
+
+class RemoteModel:
+    """
+    A backend's model served by the model-server pool, with the serve /
+    serve_curves / iterations interface of ZeroDCE. Each calling thread gets its
+    own channel, to server (n mod MODEL_SERVER_PROCESSES) for the n-th thread
+    """
+
+    def __init__(self, backend: str, processes: int):
+        self.backend = backend
+        self.processes = processes
+        self._channels: dict[int, _Channel] = {}
+        self._lock = threading.Lock()
+        self._opened = 0
+        # load on every server now, so the first batches do not pay for it
+        channels = [_Channel(index) for index in range(processes)]
+        try:
+            for channel in channels:
+                channel.connection.send(("load", backend))
+            self.iterations = [self._receive(channel) for channel in channels][0]
+        finally:
+            for channel in channels:
+                channel.close()
+
+    @staticmethod
+    def _receive(channel: _Channel):
+        state, value = channel.connection.recv()
+        if state != "ok":
+            raise ModelServerError(f"Model server {channel.index}: {value}")
+        return value
+
+    def _channel(self) -> _Channel:
+        thread = threading.get_ident()
+        with self._lock:
+            channel = self._channels.get(thread)
+            if channel is None:
+                channel = self._channels[thread] = _Channel(self._opened % self.processes)
+                self._opened += 1
+            return channel
+
+    def input_buffer(self, shape: tuple) -> np.ndarray:
+        """Batch array in this thread's segment: filling it costs the only copy of the pixels"""
+        return self._channel().input(shape, 3 * self.iterations)
+
+    def _run(self, batch: np.ndarray, curves_only: bool) -> np.ndarray:
+        channel = self._channel()
+        try:
+            view = channel.input(batch.shape, 3 * self.iterations)
+            if not np.may_share_memory(view, batch):
+                view[...] = batch
+            shape = channel.call("infer", self.backend, curves_only, channel.segment.name, batch.shape)
+            # the segment is reused by this thread's next batch
+            return channel.output(batch.shape, shape).copy()
+        except (OSError, EOFError) as exc:
+            self._drop(channel)
+            raise ModelServerError(f"Model server {channel.index} connection lost") from exc
+
+    def _drop(self, channel: _Channel):
+        with self._lock:
+            for thread, candidate in list(self._channels.items()):
+                if candidate is channel:
+                    del self._channels[thread]
+        channel.close()
+
+    def serve(self, batch: np.ndarray) -> np.ndarray:
+        return self._run(batch, curves_only=False)
+
+    def serve_curves(self, batch: np.ndarray) -> np.ndarray:
+        return self._run(batch, curves_only=True)
+
+    def close(self):
+        with self._lock:
+            channels, self._channels = list(self._channels.values()), {}
+        for channel in channels:
+            channel.close()
+
+model_servers = ModelServerPool(settings.MODEL_SERVER_PROCESSES if settings.MODEL_SERVER_SPAWN else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ZR-DCE model servers")
+    parser.add_argument("--processes", type=int, default=max(1, settings.MODEL_SERVER_PROCESSES))
+    args = parser.parse_args()
+
+    pool = ModelServerPool(args.processes, SHARED_POOL)
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
@@ -0,0 +1,308 @@
+"""
+Reduced-precision ZR-DCE on the TFLite interpreter (CPU inference backends).
+
+The graph-compiled ZeroDCE functions are frozen and converted with float16
+weights ("fp16") or dynamic-range int8 quantization ("int8": int8 weights,
+activations quantized on the fly). TFLiteZeroDCE runs the two converted
+functions with the same interface the InferenceEngine uses for the float32
+model, so a backend is just another model behind its own engine.
+
+Every conversion has to pass an accuracy gate before it serves traffic:
+PSNR and SSIM against the float32 model on a fixed low-light test set
+(app/model/gate/low_light.png at three exposures and two sizes, with seeded
+noise). Both converted functions are gated: `serve` on its enhanced images,
+and `serve_curves` on the images its curves produce when estimated at
+1/INFERENCE_LOWRES_SCALE size and applied at full size, as the low-res and
+temporal paths use them.
+
+Converting and gating take far longer than loading, so a passing conversion
+is written to TFLITE_CACHE_DIR with its gate report, keyed by the weights and
+the TensorFlow version. Run the command below when building the image and
+startup only loads the flatbuffers; otherwise the first start converts and
+fills the cache for the next ones.
+
+    python -m app.model.tflite --quantization fp16 int8
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("fp16", "int8")
+FUNCTIONS = ("serve", "serve_curves")
+GATE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gate", "low_light.png")
+GATE_SIZES = ((256, 384), (360, 640))
+GATE_EXPOSURES = (0.08, 0.15, 0.3)
+# part of the cache key: bump when the gate changes, so cached conversions are gated again
+GATE_VERSION = 2
+
+class AccuracyGateError(RuntimeError):
+    """A converted model strays too far from the float32 one"""
+
+def convert(function, quantization: str) -> bytes:
+    """Freeze a shape-generic ZeroDCE concrete function (ZeroDCE.generic_function) and convert it to a TFLite flatbuffer"""
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {', '.join(QUANTIZATIONS)}")
+    frozen = convert_variables_to_constants_v2(function)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([frozen])
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+class _Runner:
+    """
+    Interpreters for one converted function, one per input shape (LRU, at most
+    TFLITE_INTERPRETERS_PER_MODEL). XNNPACK re-plans on every resize, which costs
+    about one invoke, and crashes when an interpreter grows its batch dimension,
+    so batches run image by image on batch-1 interpreters
+    """
+
+    def __init__(self, model_content: bytes, num_threads: int):
+        self.model_content = model_content
+        self.num_threads = num_threads
+        self._interpreters: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _interpreter(self, height: int, width: int) -> tuple:
+        import tensorflow as tf
+        key = (height, width)
+        if key in self._interpreters:
+            self._interpreters.move_to_end(key)
+            return self._interpreters[key]
+        interpreter = tf.lite.Interpreter(model_content=self.model_content, num_threads=self.num_threads)
+        input_index = interpreter.get_input_details()[0]["index"]
+        interpreter.resize_tensor_input(input_index, (1, height, width, 3))
+        interpreter.allocate_tensors()
+        self._interpreters[key] = interpreter, input_index, interpreter.get_output_details()[0]["index"]
+        while len(self._interpreters) > settings.TFLITE_INTERPRETERS_PER_MODEL:
+            self._interpreters.popitem(last=False)
+        return self._interpreters[key]
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            interpreter, input_index, output_index = self._interpreter(*batch.shape[1:3])
+            outputs = []
+            for image in batch:
+                interpreter.set_tensor(input_index, image[None])
+                interpreter.invoke()
+                outputs.append(interpreter.get_tensor(output_index)[0])
+        return np.stack(outputs)
+
+class TFLiteZeroDCE:
+    """Converted ZR-DCE with the serve / serve_curves / iterations interface of ZeroDCE"""
+
+    def __init__(self, flatbuffers: dict[str, bytes], quantization: str, iterations: int, num_threads: int):
+        self.flatbuffers = flatbuffers
+        self.quantization = quantization
+        self.iterations = iterations
+        self.model_bytes = sum(len(content) for content in flatbuffers.values())
+        self._serve = _Runner(flatbuffers["serve"], num_threads)
+        self._serve_curves = _Runner(flatbuffers["serve_curves"], num_threads)
+
+    @classmethod
+    def converted(cls, model, quantization: str, num_threads: int) -> "TFLiteZeroDCE":
+        """Convert both functions of a float32 ZeroDCE"""
+        flatbuffers = {name: convert(model.generic_function(name), quantization) for name in FUNCTIONS}
+        return cls(flatbuffers, quantization, model.iterations, num_threads)
+
+    def serve(self, batch: np.ndarray) -> np.ndarray:
+        return self._serve(batch)
+
+    def serve_curves(self, batch: np.ndarray) -> np.ndarray:
+        return self._serve_curves(batch)
+
+def gate_images() -> list[np.ndarray]:
+    """The fixed low-light test set: float32 RGB in [0, 1]"""
+    import cv2
+
+    path = settings.MODEL_GATE_IMAGE or GATE_IMAGE
+    bgr = cv2.imread(path)
+    if bgr is None:
+        raise FileNotFoundError(f"Accuracy gate image {path!r} not found")
+    linear = np.power(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0, 2.2)
+    rng = np.random.default_rng(0)
+    images = []
+    for height, width in GATE_SIZES:
+        resized = cv2.resize(linear, (width, height), interpolation=cv2.INTER_AREA)
+        for exposure in GATE_EXPOSURES:
+            dark = np.power(resized * exposure, 1 / 2.2) + rng.normal(0, 0.01, resized.shape)
+            images.append(np.clip(dark, 0.0, 1.0).astype(np.float32))
+    return images
+
+def psnr(reference: np.ndarray, image: np.ndarray) -> float:
+    mse = float(np.mean((reference.astype(np.float64) - image) ** 2))
+    return float("inf") if mse == 0 else float(10 * np.log10(1.0 / mse))
+
+def ssim(reference: np.ndarray, image: np.ndarray) -> float:
+    """Mean SSIM over channels (Gaussian window, sigma 1.5, as in Wang et al. 2004)"""
+    import cv2
+
+    c1, c2 = 0.01 ** 2, 0.03 ** 2
+    x, y = reference.astype(np.float64), image.astype(np.float64)
+    blur = lambda a: cv2.GaussianBlur(a, (11, 11), 1.5)
+    mu_x, mu_y = blur(x), blur(y)
+    sigma_x = blur(x * x) - mu_x ** 2
+    sigma_y = blur(y * y) - mu_y ** 2
+    sigma_xy = blur(x * y) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_x + sigma_y + c2))
+    return float(ssim_map.mean())
+
+def _enhanced(model, image: np.ndarray) -> np.ndarray:
+    return np.clip(np.asarray(model.serve(image[None]))[0], 0.0, 1.0)
+
+def _curves_applied(model, image: np.ndarray) -> np.ndarray:
+    from app.model.curves import apply_lowres_curves, downscale
+
+    curves = np.asarray(model.serve_curves(downscale(image, settings.INFERENCE_LOWRES_SCALE)[None]))[0]
+    return apply_lowres_curves(image, curves, model.iterations)
+
+def _compare(reference_model, candidate, images: list[np.ndarray], run) -> tuple[list[float], list[float]]:
+    psnrs, ssims = [], []
+    for image in images:
+        expected, actual = run(reference_model, image), run(candidate, image)
+        psnrs.append(psnr(expected, actual))
+        ssims.append(ssim(expected, actual))
+    return psnrs, ssims
+
+def accuracy_report(reference_model, candidate, images: list[np.ndarray] | None = None) -> dict:
+    """
+    Worst-case PSNR (dB) and SSIM of `candidate` against the float32 model over
+    the gate set, for enhanced images and for images enhanced with its curves
+    """
+    images = gate_images() if images is None else images
+    report = {"images": len(images)}
+    for prefix, run in (("", _enhanced), ("curves_", _curves_applied)):
+        psnrs, ssims = _compare(reference_model, candidate, images, run)
+        report.update({
+            f"min_{prefix}psnr_db": round(min(psnrs), 2),
+            f"mean_{prefix}psnr_db": round(float(np.mean(psnrs)), 2),
+            f"min_{prefix}ssim": round(min(ssims), 5),
+            f"mean_{prefix}ssim": round(float(np.mean(ssims)), 5),
+        })
+    return report
+
+def check_accuracy(report: dict):
+    """
+    Raise AccuracyGateError unless the worst image of both functions clears
+    MODEL_GATE_MIN_PSNR_DB and MODEL_GATE_MIN_SSIM
+    """
+    for prefix, function in (("", "serve"), ("curves_", "serve_curves")):
+        min_psnr, min_ssim = report[f"min_{prefix}psnr_db"], report[f"min_{prefix}ssim"]
+        if min_psnr < settings.MODEL_GATE_MIN_PSNR_DB or min_ssim < settings.MODEL_GATE_MIN_SSIM:
+            raise AccuracyGateError(
+                f"{function}: PSNR {min_psnr} dB / SSIM {min_ssim} is below the gate "
+                f"({settings.MODEL_GATE_MIN_PSNR_DB} dB / {settings.MODEL_GATE_MIN_SSIM})"
+            )
+
+def _num_threads() -> int:
+    return settings.TFLITE_NUM_THREADS or os.cpu_count() or 1
+
+def _cache_key(quantization: str) -> str | None:
+    """Weights, TensorFlow version, quantization and gate; None for random weights (nothing to cache)"""
+    import tensorflow as tf
+
+    if not settings.MODEL_WEIGHTS_PATH:
+        return None
+    digest = hashlib.sha256()
+    with open(settings.MODEL_WEIGHTS_PATH, "rb") as weights:
+        for chunk in iter(lambda: weights.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(f"{tf.__version__}/{quantization}/gate-{GATE_VERSION}".encode())
+    return f"{settings.MODEL_VERSION}-{quantization}-{digest.hexdigest()[:16]}"
+
+def _write_atomic(path: str, content: bytes):
+    # several workers may fill the cache at once; readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+def save_converted(model: TFLiteZeroDCE, report: dict):
+    """Cache a conversion that passed the gate, with its report (written last: it marks the entry complete)"""
+    key = _cache_key(model.quantization)
+    if key is None:
+        return
+    directory = os.path.join(settings.TFLITE_CACHE_DIR, key)
+    os.makedirs(directory, exist_ok=True)
+    for name, content in model.flatbuffers.items():
+        _write_atomic(os.path.join(directory, f"{name}.tflite"), content)
+    manifest = {"quantization": model.quantization, "iterations": model.iterations, "gate": report}
+    _write_atomic(os.path.join(directory, "manifest.json"), json.dumps(manifest).encode())
+
+def load_converted(quantization: str, num_threads: int) -> TFLiteZeroDCE | None:
+    """
+    The cached conversion, or None. Its stored gate report is checked against the
+    current MODEL_GATE_* bounds (raises AccuracyGateError) instead of re-running the gate
+    """
+    key = _cache_key(quantization)
+    if key is None:
+        return None
+    directory = os.path.join(settings.TFLITE_CACHE_DIR, key)
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        flatbuffers = {}
+        for name in FUNCTIONS:
+            with open(os.path.join(directory, f"{name}.tflite"), "rb") as f:
+                flatbuffers[name] = f.read()
+    except FileNotFoundError:
+        return None
+    check_accuracy(manifest["gate"])
+    logger.info("TFLite %s loaded from %s (gate: %s)", quantization, directory, manifest["gate"])
+    return TFLiteZeroDCE(flatbuffers, quantization, manifest["iterations"], num_threads)
+
+def load_tflite_model(quantization: str, num_threads: int | None = None) -> TFLiteZeroDCE:
+    """
+    The cached conversion, else convert the float32 model, gate the result and
+    cache it (blocking); raises AccuracyGateError
+    """
+    from app.model.zr_dce import load_model
+
+    num_threads = num_threads or _num_threads()
+    model = load_converted(quantization, num_threads)
+    if model is not None:
+        return model
+    reference = load_model()
+    model = TFLiteZeroDCE.converted(reference, quantization, num_threads)
+    report = accuracy_report(reference, model)
+    check_accuracy(report)
+    logger.info("TFLite %s passed the accuracy gate: %s", quantization, report)
+    save_converted(model, report)
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert ZR-DCE to TFLite, run the accuracy gate and cache the conversions that pass"
+    )
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    args = parser.parse_args()
+
+    from app.model.zr_dce import load_model
+    reference = load_model()
+    images = gate_images()
+    failed = False
+    for quantization in args.quantization:
+        model = TFLiteZeroDCE.converted(reference, quantization, _num_threads())
+        report = accuracy_report(reference, model, images)
+        try:
+            check_accuracy(report)
+            save_converted(model, report)
+            report["passed"] = True
+        except AccuracyGateError:
+            report["passed"] = False
+            failed = True
+        print(json.dumps({"quantization": quantization, **report}))
+    raise SystemExit(1 if failed else 0)
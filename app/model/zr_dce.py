@@ -0,0 +1,100 @@
+"""ZR-DCE (Zero-Reference Deep Curve Estimation) network, built with the subclassing API"""
+import threading
+import keras
+import tensorflow as tf
+from keras import layers
+from app.config import settings
+
+CURVE_ITERATIONS = 8
+
+# Height and width left open: the shape-generic graphs that TFLite conversion freezes
+IMAGE_BATCH_SPEC = tf.TensorSpec(shape=(None, None, None, 3), dtype=tf.float32)
+
+def bucket_spec(height: int, width: int) -> tf.TensorSpec:
+    """Input signature of one padded shape bucket; the batch dimension stays open"""
+    return tf.TensorSpec(shape=(None, height, width, 3), dtype=tf.float32)
+
+class ZeroDCE(keras.Model):
+    """
+    DCE-Net: seven 3x3 convolutions with additive skip connections that predict
+    CURVE_ITERATIONS per-pixel RGB curve maps, applied iteratively to the input.
+    Inputs and outputs are float RGB in [0, 1].
+
+    Inference runs on concrete graphs traced once per padded (height, width)
+    bucket with static spatial shapes, so batch sizes within a bucket reuse
+    the same graph and new buckets trace once (see InferenceEngine.warm_up).
+    """
+    
+    def __init__(self, filters: int = 32, iterations: int = CURVE_ITERATIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.iterations = iterations
+        self.conv1 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv2 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv3 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv4 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv5 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv6 = layers.Conv2D(filters, 3, padding="same", activation="relu")
+        self.conv7 = layers.Conv2D(3 * iterations, 3, padding="same", activation="tanh")
+        self._bucket_graphs = {}
+        self._trace_lock = threading.Lock()
+    
+    def estimate_curves(self, x):
+        """Per-pixel curve parameters, shape (N, H, W, 3 * iterations)"""
+        c1 = self.conv1(x)
+        c2 = self.conv2(c1)
+        c3 = self.conv3(c2)
+        c4 = self.conv4(c3)
+        c5 = self.conv5(c4 + c3)
+        c6 = self.conv6(c5 + c2)
+        return self.conv7(c6 + c1)
+    
+    def call(self, x):
+        return apply_curves(x, self.estimate_curves(x), self.iterations)
+    
+    @tf.function
+    def _serve_graph(self, x):
+        return self.call(x)
+
+    @tf.function
+    def _curves_graph(self, x):
+        return self.estimate_curves(x)
+
+    def bucket_graphs(self, height: int, width: int) -> tuple:
+        """Concrete (serve, serve_curves) graphs of one padded bucket, traced on first use"""
+        with self._trace_lock:
+            if (height, width) not in self._bucket_graphs:
+                spec = bucket_spec(height, width)
+                self._bucket_graphs[(height, width)] = (
+                    self._serve_graph.get_concrete_function(spec),
+                    self._curves_graph.get_concrete_function(spec),
+                )
+            return self._bucket_graphs[(height, width)]
+
+    def generic_function(self, name: str):
+        """`serve` or `serve_curves` traced with open height and width, for TFLite conversion"""
+        graph = self._serve_graph if name == "serve" else self._curves_graph
+        return graph.get_concrete_function(IMAGE_BATCH_SPEC)
+
+    def serve(self, x):
+        """Graph-compiled forward pass used for inference"""
+        return self.bucket_graphs(*x.shape[1:3])[0](tf.convert_to_tensor(x, tf.float32))
+
+    def serve_curves(self, x):
+        """Graph-compiled estimate_curves used for inference"""
+        return self.bucket_graphs(*x.shape[1:3])[1](tf.convert_to_tensor(x, tf.float32))
+
+def apply_curves(image, curves, iterations: int = CURVE_ITERATIONS):
+    """LE(x) = x + r * x * (1 - x), once per curve map"""
+    for i in range(iterations):
+        r = curves[..., 3 * i:3 * i + 3]
+        image = image + r * (image - tf.square(image))
+    return image
+
+def load_model(weights_path: str | None = None) -> ZeroDCE:
+    """Build the network and load trained weights (random init when weights_path is empty)"""
+    model = ZeroDCE()
+    model(tf.zeros((1, 32, 32, 3)))
+    path = settings.MODEL_WEIGHTS_PATH if weights_path is None else weights_path
+    if path:
+        model.load_weights(path)
+    return model
@@ -0,0 +1,104 @@
+"""
+Opt-in sampling profiler for slow requests (PROFILE_SLOW_REQUEST_MS > 0).
+
+A daemon thread records the stack of every thread each PROFILE_SAMPLE_INTERVAL_MS
+and keeps the last PROFILE_HISTORY_SECONDS of samples. When a request takes
+longer than the threshold, MetricsMiddleware hands it here: the samples taken
+while it ran are written to PROFILE_DIR as collapsed stacks (one
+"thread;outer;...;inner count" line per distinct stack, the input of
+flamegraph.pl and speedscope). They cover everything the process did in that
+window, so a request slowed by another one blocking the event loop shows it.
+Off, nothing runs.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SlowRequestProfiler:
+
+    def __init__(self, threshold_ms: int, interval_ms: int, history_seconds: int, directory: str):
+        self.enabled = threshold_ms > 0
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.samples: deque[tuple[float, list[tuple[str, tuple]]]] = deque(
+            maxlen=max(1, int(history_seconds / self.interval))
+        )
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_forever, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+
+    def _sample_forever(self):
+        me = threading.get_ident()
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                stacks.append((names.get(ident, str(ident)), tuple(reversed(stack))))
+            self.samples.append((time.perf_counter(), stacks))
+            time.sleep(self.interval)
+
+    def start(self):
+        """Begin sampling (from the lifespan, so the history covers the first requests)"""
+        if self.enabled:
+            self._ensure_started()
+
+    def collapse(self, started: float, finished: float) -> Counter:
+        """Samples taken between two perf_counter() times, as collapsed stack -> count"""
+        folded = Counter()
+        for taken, stacks in list(self.samples):
+            if started <= taken <= finished:
+                for thread, stack in stacks:
+                    frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+                    folded[f"{thread};{frames}"] += 1
+        return folded
+
+    def _write(self, method: str, route: str, started: float, elapsed: float) -> str | None:
+        folded = self.collapse(started, started + elapsed)
+        if not folded:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{method}-{slug}-{elapsed * 1000:.0f}ms.folded"
+        )
+        with open(path, "w") as f:
+            for stack, count in folded.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    async def report(self, method: str, route: str, started: float, elapsed: float):
+        """Write the samples of a slow request (after its response went out) and log where they are"""
+        self._ensure_started()
+        try:
+            path = await asyncio.to_thread(self._write, method, route, started, elapsed)
+        except OSError:
+            logger.exception("Writing the profile of %s %s failed", method, route)
+            return
+        if path is not None:
+            logger.warning("Slow request %s %s took %.0f ms; stack samples in %s", method, route, elapsed * 1000, path)
+
+profiler = SlowRequestProfiler(
+    threshold_ms=settings.PROFILE_SLOW_REQUEST_MS,
+    interval_ms=settings.PROFILE_SAMPLE_INTERVAL_MS,
+    history_seconds=settings.PROFILE_HISTORY_SECONDS,
+    directory=settings.PROFILE_DIR,
+)
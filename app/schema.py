@@ -0,0 +1,44 @@
+"""
+Database schema step, kept out of the import path.
+
+`python -m app.schema` creates missing tables (run it once per deploy). At
+startup the API either does the same (DB_CREATE_SCHEMA_ON_STARTUP, the
+default, convenient in development) or only checks that every table exists
+and refuses to start otherwise. Creation holds a Postgres advisory lock, so
+workers starting together do not race on CREATE TABLE / CREATE TYPE.
+"""
+import logging
+from sqlalchemy import inspect, text
+from app.database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_LOCK_KEY = 0x5348414457  # arbitrary, shared by every process creating the schema
+
+def _register_models():
+    import app.admission.models  # noqa: F401
+    import app.auth.models  # noqa: F401
+    import app.billing.models  # noqa: F401
+    import app.jobs.models  # noqa: F401
+    import app.media.models  # noqa: F401
+
+def create_schema():
+    """Create missing tables and indexes (idempotent, blocking)"""
+    _register_models()
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        Base.metadata.create_all(bind=connection)
+
+def check_schema():
+    """Raise RuntimeError naming the missing tables, if any (blocking)"""
+    _register_models()
+    existing = set(inspect(engine).get_table_names())
+    missing = sorted(set(Base.metadata.tables) - existing)
+    if missing:
+        raise RuntimeError(f"Missing tables {', '.join(missing)}; run `python -m app.schema` first")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_schema()
+    logger.info("Schema is up to date (%d tables)", len(Base.metadata.tables))
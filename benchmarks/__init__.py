@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Before any app import (settings are read once): what benchmarks store goes to a temporary
+# directory, never the repo's ./uploads, unless UPLOAD_DIR is set. Servers they start inherit it
+os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "shadowshift-bench-uploads"))
@@ -0,0 +1,134 @@
+"""
+PRO latency under a FREE flood, with and without admission control.
+
+Drives POST /media/enhance in-process against the users seeded by
+benchmarks.seed (randomly initialized model, result cache off). Three runs of
+`--pro-requests` PRO enhancements at `--pro-concurrency`:
+  - pro_only: nothing else running, the reference p99
+  - flood_unshed: FREE users keep `--free-concurrency` enhancements in flight
+    the whole time, admission control off
+  - flood_admitted: the same flood, admission control on
+Per run: PRO latency percentiles and FREE responses by status code (503 shed,
+429 rate limited). With admission on, PRO p99 should stay near pro_only while
+most FREE requests are turned away; the monthly counters are reset before each
+run so quota never gets in the way.
+
+    python -m benchmarks.seed --users 10000 --media 0
+    python -m benchmarks.bench_admission --pro-requests 300 --pro-concurrency 4 --free-concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks._common import summarize
+
+
+async def pro_traffic(client, headers: list[dict], image: bytes, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.post(
+                "/media/enhance", headers=headers[remaining % len(headers)], files={"file": ("pro.jpg", image, "image/jpeg")}
+            )
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def free_flood(client, headers: list[dict], image: bytes, concurrency: int, stop: asyncio.Event) -> dict:
+    statuses = Counter()
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while not stop.is_set():
+            sent += 1
+            response = await client.post(
+                "/media/enhance", headers=headers[sent % len(headers)], files={"file": ("free.jpg", image, "image/jpeg")}
+            )
+            # no Retry-After backoff: a flood retries at once
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"requests": sent, "statuses": {str(code): count for code, count in sorted(statuses.items())}}
+
+
+async def run(client, args, pro_headers, free_headers, image, flood: bool) -> dict:
+    from benchmarks.suite import reset_usage
+
+    reset_usage()
+    stop = asyncio.Event()
+    flooding = asyncio.create_task(free_flood(client, free_headers, image, args.free_concurrency, stop)) if flood else None
+    if flood:
+        # let the flood build up before PRO traffic starts
+        await asyncio.sleep(args.ramp_seconds)
+    pro = await pro_traffic(client, pro_headers, image, args.pro_requests, args.pro_concurrency)
+    stop.set()
+    result = {"pro": pro}
+    if flooding is not None:
+        result["free"] = await flooding
+    return result
+
+
+async def main(args):
+    import httpx
+    from app.admission.control import admission
+    from app.auth.service import AuthService
+    from app.database import SessionLocal
+    from app.main import app
+    from app.model.engine import engines_in_use
+    from benchmarks.bench_batch_api import make_images
+    from benchmarks.seed import suite_users
+
+    with SessionLocal() as db:
+        users = suite_users(db)
+    if not users["pro"] or not users["free"]:
+        raise SystemExit("No seeded users: run `python -m benchmarks.seed` first")
+    pro_headers = [{"Authorization": f"Bearer {AuthService.create_access_token(user_id)}"} for user_id in users["pro"]]
+    free_headers = [{"Authorization": f"Bearer {AuthService.create_access_token(user_id)}"} for user_id in users["free"]]
+    width, height = map(int, args.size.split("x"))
+    image = make_images(1, width, height)[0]
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        while not all(engine.warmed_up for engine in engines_in_use()):
+            await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, flood, enabled in (("pro_only", False, True), ("flood_unshed", True, False), ("flood_admitted", True, True)):
+                admission.enabled = enabled
+                results[name] = await run(client, args, pro_headers, free_headers, image, flood)
+                print(json.dumps({name: results[name]}), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pro-requests", type=int, default=300)
+    parser.add_argument("--pro-concurrency", type=int, default=4)
+    parser.add_argument("--free-concurrency", type=int, default=64)
+    parser.add_argument("--ramp-seconds", type=float, default=2.0)
+    parser.add_argument("--size", default="1280x720")
+    args = parser.parse_args()
+    # before the app is imported: settings are read once
+    os.environ.update({
+        "MODEL_WEIGHTS_PATH": "",
+        "RESULT_CACHE_ENABLED": "false",
+        "JOB_WORKER_PROCESSES": "0",
+        "UPLOAD_DIR": os.path.join(tempfile.gettempdir(), "shadowshift-bench-admission"),
+    })
+    asyncio.run(main(args))
@@ -0,0 +1,113 @@
+"""
+Sync vs async database path for /auth/me and /billing/my-subscription.
+
+The baseline app below reproduces the old handlers (sync `def` + a sync
+session dependency), so both sides run against the same local Postgres from
+DATABASE_URL. The baseline gets one pooled connection per client so that only
+the threadpool limits it (with the shared pool it deadlocks once concurrency
+exceeds pool size + overflow).
+
+    python -m benchmarks.bench_async_db --requests 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from fastapi import Depends, FastAPI
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.auth.dependencies import oauth2_scheme
+from app.auth.models import User
+from app.auth.schemas import UserResponse
+from app.auth.service import AuthService
+from app.billing.models import Subscription
+from app.billing.plans import SubscriptionTier
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.main import app as async_app
+from benchmarks._common import asgi_client, drive
+
+BENCH_EMAIL = "bench-async-db@example.com"
+
+
+def build_sync_app(concurrency: int) -> FastAPI:
+    """The pre-asyncpg handlers: every request holds a threadpool slot"""
+    baseline = FastAPI()
+    sync_sessions = sessionmaker(
+        autoflush=False,
+        bind=create_engine(settings.DATABASE_URL, pool_size=concurrency, max_overflow=0),
+    )
+
+    def get_db():
+        db = sync_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return db.query(User).filter(User.id == int(payload["sub"])).first()
+
+    @baseline.get("/auth/me", response_model=UserResponse)
+    def me(user: User = Depends(current_user)):
+        return user
+
+    @baseline.get("/billing/my-subscription")
+    def my_subscription(user: User = Depends(current_user), db: Session = Depends(get_db)):
+        sub = db.query(Subscription).filter(Subscription.user_id == user.id).first()
+        return {
+            "tier": sub.tier,
+            "images_used": sub.images_used_this_month,
+            "videos_used": sub.videos_used_this_month,
+        }
+
+    return baseline
+
+
+def seed_user() -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, hashed_password="x", name="bench", full_name="Bench User")
+            db.add(user)
+            db.flush()
+            now = datetime.utcnow()
+            db.add(Subscription(
+                user_id=user.id,
+                tier=SubscriptionTier.FREE,
+                images_used_this_month=0,
+                videos_used_this_month=0,
+                current_period_start=now,
+                current_period_end=now + timedelta(days=30),
+            ))
+            db.commit()
+        return user.id
+
+
+async def main(total: int, concurrency: int):
+    token = AuthService.create_access_token(seed_user())
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+
+    for label, app in (("sync", build_sync_app(concurrency)), ("async", async_app)):
+        async with asgi_client(app) as client:
+            for path in ("/auth/me", "/billing/my-subscription"):
+                await drive(client, "GET", path, total=min(total, 200), concurrency=concurrency, headers=headers)
+                results[f"{label} {path}"] = await drive(
+                    client, "GET", path, total=total, concurrency=concurrency, headers=headers
+                )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,129 @@
+"""
+Per-image overhead: one /media/batch request vs N single /media/enhance requests.
+
+Runs the app in-process (httpx ASGI transport) for one PRO user with N
+distinct small JPEGs and the result cache off. Modes:
+  - engine only: inference_engine.enhance on pre-decoded images (the floor)
+  - single, sequential: N POST /media/enhance, one after another
+  - single, concurrent: N POST /media/enhance, `--concurrency` at a time
+  - batch: one POST /media/batch with N files, zip read to the end
+Reported per mode: seconds, ms per image, overhead per image over the engine
+floor, and SQL statements per image. The user's counter is set so that N
+images fit whatever the plan's monthly count is.
+
+    python -m benchmarks.bench_batch_api --images 500 --size 160x120
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+import zipfile
+
+import cv2
+import httpx
+import numpy as np
+from sqlalchemy import event, update
+
+from app.main import app
+from app.auth.cache import user_cache
+from app.auth.service import AuthService
+from app.billing.models import Subscription
+from app.billing.plans import SubscriptionTier, TIERS
+from app.config import settings
+from app.database import AsyncSessionLocal, async_engine
+from app.media.ingest import decode, plan_decode
+from app.model.engine import inference_engine
+from benchmarks.bench_lowres_curves import SAMPLE_IMAGE
+from benchmarks.bench_quota import StatementCounter, reset_user
+
+
+def make_images(count: int, width: int, height: int) -> list[bytes]:
+    base = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        dark = base * rng.uniform(0.15, 0.5) + rng.normal(0, 2.0, base.shape)
+        images.append(cv2.imencode(".jpg", np.clip(dark, 0, 255).astype(np.uint8))[1].tobytes())
+    return images
+
+
+async def make_room(user_id: int, count: int):
+    limit = TIERS[SubscriptionTier.PRO].image.count_per_month
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Subscription).where(Subscription.user_id == user_id).values(images_used_this_month=limit - count))
+        await db.commit()
+
+
+async def engine_only(images: list[bytes]) -> None:
+    decoded = [decode(data, plan_decode(data, None)) for data in images]
+    await asyncio.gather(*(inference_engine.enhance(image) for image in decoded))
+
+
+async def single(client: httpx.AsyncClient, headers: dict, images: list[bytes], concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, data: bytes):
+        async with semaphore:
+            response = await client.post("/media/enhance", headers=headers, files={"file": (f"{index}.jpg", data, "image/jpeg")})
+            response.raise_for_status()
+
+    await asyncio.gather(*(one(index, data) for index, data in enumerate(images)))
+
+
+async def batch(client: httpx.AsyncClient, headers: dict, images: list[bytes]) -> None:
+    files = [("files", (f"{index}.jpg", data, "image/jpeg")) for index, data in enumerate(images)]
+    async with client.stream("POST", "/media/batch", headers=headers, files=files) as response:
+        response.raise_for_status()
+        body = b"".join([chunk async for chunk in response.aiter_bytes()])
+    manifest = json.loads(zipfile.ZipFile(io.BytesIO(body)).read("manifest.json"))
+    assert manifest["succeeded"] == len(images), manifest["failed"]
+
+
+async def main(args):
+    settings.RESULT_CACHE_ENABLED = False
+    width, height = map(int, args.size.split("x"))
+    images = make_images(args.images, width, height)
+    user = reset_user(SubscriptionTier.PRO)
+    await user_cache.invalidate(user.id)
+    headers = {"Authorization": f"Bearer {AuthService.create_access_token(user.id)}"}
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    await inference_engine.start()
+    await engine_only(images[:args.concurrency])  # warm-up
+    modes = [
+        ("engine only", lambda client: engine_only(images)),
+        ("single, sequential", lambda client: single(client, headers, images, 1)),
+        (f"single, {args.concurrency} concurrent", lambda client: single(client, headers, images, args.concurrency)),
+        ("batch", lambda client: batch(client, headers, images)),
+    ]
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        for name, run in modes:
+            await make_room(user.id, len(images))
+            counter.count = 0
+            started = time.perf_counter()
+            await run(client)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "mode": name,
+                "seconds": round(elapsed, 2),
+                "ms_per_image": round(elapsed / len(images) * 1000, 2),
+                "statements": counter.count,
+                "statements_per_image": round(counter.count / len(images), 3),
+            })
+    await inference_engine.stop()
+
+    floor = results[0]["ms_per_image"]
+    for result in results[1:]:
+        result["overhead_ms_per_image"] = round(result["ms_per_image"] - floor, 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--size", default="160x120")
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
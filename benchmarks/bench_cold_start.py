@@ -0,0 +1,123 @@
+"""
+Worker cold start: import cost, time to first request, first-inference latency.
+
+  - import: `import app.main` in a fresh interpreter (median of `--imports`),
+    and whether TensorFlow / OpenCV were loaded by it
+  - serve: uvicorn in a subprocess, with the lifespan warm-up on and off.
+    From process start: first answer on /health (time to first request) and
+    first 200 on /health (ready); then POST /media/enhance twice with a
+    `--size` image, first and second latency
+  - retracing: the graph-compiled model on `--shapes` distinct bucket shapes,
+    first-call latency per shape next to eager calls, and the trace count
+
+    python -m benchmarks.bench_cold_start --imports 5 --size 640x480
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+IMPORT_PROBE = (
+    "import sys, time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started, *(m in sys.modules for m in ('tensorflow', 'cv2')))"
+)
+
+
+def measure_import(repeats: int) -> dict:
+    samples, loaded = [], None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True)
+        seconds, tensorflow, cv2 = output.stdout.split()[-3:]
+        samples.append(float(seconds))
+        loaded = {"tensorflow": tensorflow == "True", "cv2": cv2 == "True"}
+    return {"import_app_main_s": round(statistics.median(samples), 3), "imported_at_startup": loaded}
+
+
+def test_image(size: str) -> bytes:
+    import cv2
+    from benchmarks.bench_lowres_curves import SAMPLE_IMAGE
+
+    width, height = map(int, size.split("x"))
+    image = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".jpg", (image * 0.3).astype("uint8"))[1].tobytes()
+
+
+def measure_serve(warm_up: bool, image: bytes, port: int) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={
+            **os.environ,
+            "MODEL_WARMUP_ON_STARTUP": str(warm_up).lower(),
+            "JOB_WORKER_PROCESSES": "0",
+            "RESULT_CACHE_ENABLED": "false",
+        },
+    )
+    result = {"warm_up": warm_up}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            while "first_request_s" not in result or "ready_s" not in result:
+                try:
+                    response = client.get("/health")
+                except httpx.TransportError:
+                    time.sleep(0.02)
+                    continue
+                result.setdefault("first_request_s", round(time.perf_counter() - started, 2))
+                if response.status_code == 200:
+                    result["ready_s"] = round(time.perf_counter() - started, 2)
+                else:
+                    time.sleep(0.02)
+
+            email = f"cold-{uuid.uuid4().hex[:8]}@example.com"
+            client.post("/auth/register", json={"email": email, "password": "password123", "name": "bench", "full_name": "Bench"})
+            token = client.post("/auth/login", json={"email": email, "password": "password123"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for label in ("first_inference_ms", "second_inference_ms"):
+                request_started = time.perf_counter()
+                response = client.post("/media/enhance", headers=headers, files={"file": ("cold.jpg", image, "image/jpeg")})
+                response.raise_for_status()
+                result[label] = round((time.perf_counter() - request_started) * 1000, 1)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def measure_retracing(shapes: int) -> dict:
+    import numpy as np
+    from app.model.zr_dce import load_model
+
+    model = load_model()
+    rows = []
+    for i in range(shapes):
+        batch = np.random.rand(1 + i % 3, 64 * (2 + i), 64 * (3 + i), 3).astype(np.float32)
+        row = {"shape": "x".join(map(str, batch.shape))}
+        for label, call in (("eager_first_ms", lambda x: model(x, training=False)), ("graph_first_ms", model.serve)):
+            call_started = time.perf_counter()
+            call(batch).numpy()
+            row[label] = round((time.perf_counter() - call_started) * 1000, 1)
+        rows.append(row)
+    return {"shapes": rows, "graph_traces": model.serve.experimental_get_tracing_count()}
+
+
+def main(args):
+    image = test_image(args.size)
+    report = {"import": measure_import(args.imports)}
+    report["serve"] = [measure_serve(warm_up, image, args.port) for warm_up in (False, True)]
+    report["retracing"] = measure_retracing(args.shapes)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=5)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--shapes", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8767)
+    main(parser.parse_args())
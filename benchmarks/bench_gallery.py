@@ -0,0 +1,142 @@
+"""
+Gallery listing latency: keyset pages vs OFFSET pages vs loading every row.
+
+Gives one user `--items` media rows (plus `--other-items` rows of another
+user, so the index has to discriminate), VACUUM ANALYZEs the table and times
+the median of `--repeats` calls for page 1 and page `--page`:
+  - keyset: MediaService.list_gallery with the cursor of the previous page
+  - offset: the same columns with ORDER BY ... OFFSET (page - 1) * limit
+  - all rows: every full MediaFile row of the user, which is what loading
+    User.media_files did
+The plan of the deep keyset page is printed too (expect an Index Only Scan on
+ix_media_files_gallery with few heap fetches).
+
+    python -m benchmarks.bench_gallery --items 50000 --page 500 --limit 100
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, text
+
+import app.main  # noqa: F401  (registers every mapped model)
+from app.auth.cache import CachedUser
+from app.auth.models import User
+from app.billing.plans import MediaType, SubscriptionTier
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.media.models import MediaFile
+from app.media.service import MediaService, _encode_cursor
+
+EMAILS = ("bench-gallery@example.com", "bench-gallery-other@example.com")
+
+
+def bench_user(db, email: str) -> int:
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        user = User(email=email, hashed_password="x", name="bench", full_name="Bench User")
+        db.add(user)
+        db.flush()
+    db.execute(delete(MediaFile).where(MediaFile.user_id == user.id))
+    return user.id
+
+
+def seed(items: int, other_items: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with SessionLocal() as db:
+        user_id, other_id = (bench_user(db, email) for email in EMAILS)
+        for owner, count in ((user_id, items), (other_id, other_items)):
+            for offset in range(0, count, 10000):
+                db.execute(insert(MediaFile), [
+                    {
+                        "user_id": owner,
+                        "media_type": MediaType.IMAGE if i % 5 else MediaType.VIDEO,
+                        "original_filename": f"img_{i}.jpg",
+                        "original_path": f"/uploads/{owner}/{i}_original.jpg",
+                        "processed_path": f"/uploads/{owner}/{i}_enhanced.jpg",
+                        "thumbnail_path": f"/uploads/{owner}/{i}_thumb.webp",
+                        "content_type": "image/jpeg",
+                        "file_size_mb": 2.5,
+                        "width": 4032,
+                        "height": 3024,
+                        "created_at": start + timedelta(seconds=i * 37),
+                    }
+                    for i in range(offset, min(count, offset + 10000))
+                ])
+        db.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE media_files"))
+    return user_id
+
+
+async def timed(repeats: int, call) -> float:
+    samples = []
+    for _ in range(repeats):
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await call(db)
+            samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def offset_query(user_id: int, offset: int, limit: int):
+    return (
+        select(MediaFile.id, MediaFile.created_at, MediaFile.media_type, MediaFile.thumbnail_path)
+        .where(MediaFile.user_id == user_id)
+        .order_by(MediaFile.created_at.desc(), MediaFile.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+async def main(args):
+    user_id = seed(args.items, args.other_items)
+    user = CachedUser(id=user_id, is_active=True, is_admin=False, tier=SubscriptionTier.PRO)
+    offset = (args.page - 1) * args.limit
+
+    async with AsyncSessionLocal() as db:
+        last = (await db.execute(offset_query(user_id, offset - 1, 1))).one()
+        cursor = _encode_cursor(last.created_at, last.id)
+        page = await MediaService.list_gallery(db, user, cursor, args.limit)
+        expected = [row.id for row in (await db.execute(offset_query(user_id, offset, args.limit))).all()]
+        assert [item["id"] for item in page["items"]] == expected, "keyset and offset pages differ"
+
+    results = {
+        "items": args.items,
+        "limit": args.limit,
+        "keyset_page_1_ms": await timed(args.repeats, lambda db: MediaService.list_gallery(db, user, None, args.limit)),
+        f"keyset_page_{args.page}_ms": await timed(args.repeats, lambda db: MediaService.list_gallery(db, user, cursor, args.limit)),
+        "offset_page_1_ms": await timed(args.repeats, lambda db: db.execute(offset_query(user_id, 0, args.limit))),
+        f"offset_page_{args.page}_ms": await timed(args.repeats, lambda db: db.execute(offset_query(user_id, offset, args.limit))),
+        "all_rows_ms": await timed(max(1, args.repeats // 5), lambda db: db.scalars(select(MediaFile).where(MediaFile.user_id == user_id))),
+    }
+
+    created_at, media_id = last.created_at, last.id
+    with engine.connect() as connection:
+        plan = connection.execute(text(
+            "EXPLAIN (ANALYZE, BUFFERS) SELECT id, created_at, media_type, thumbnail_path FROM media_files "
+            "WHERE user_id = :user_id AND (created_at, id) < (:created_at, :media_id) "
+            "ORDER BY created_at DESC, id DESC LIMIT :limit"
+        ), {"user_id": user_id, "created_at": created_at, "media_id": media_id, "limit": args.limit + 1}).scalars().all()
+    results["keyset_deep_page_plan"] = [line.strip() for line in plan if "Scan" in line or "Heap Fetches" in line or "Buffers" in line][:4]
+
+    if not args.keep:
+        with SessionLocal() as db:
+            for email in EMAILS:
+                bench_user(db, email)
+            db.commit()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--other-items", type=int, default=100000)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded rows in place")
+    asyncio.run(main(parser.parse_args()))
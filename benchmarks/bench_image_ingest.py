@@ -0,0 +1,117 @@
+"""
+Image decode for the model: full decode vs header-planned decode.
+
+For each `--sizes` JPEG (made from the README sample, with grain) and each
+tier cap (FREE 1920x1080, PRO 7680x4320), in a fresh interpreter per case:
+  - full: the previous path, a full-size decode to float32 RGB, then an area
+    resize to the cap
+  - planned: plan_decode (header only) + decode, which uses libjpeg's
+    1/2, 1/4, 1/8 scaled decode when the cap allows and resizes in uint8
+Median decode time over `--repeats` and peak RSS above the process's
+baseline (memory of the encoded file and imports excluded).
+
+    python -m benchmarks.bench_image_ingest --sizes 6000x4000,7680x4320 --repeats 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import peak_rss_mb, reset_peak_rss, rss_mb
+
+TIERS = ("free", "pro")
+
+
+def make_jpeg(size: str, path: str):
+    import cv2
+    import numpy as np
+    from benchmarks.bench_lowres_curves import SAMPLE_IMAGE
+
+    width, height = map(int, size.split("x"))
+    image = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width, height), interpolation=cv2.INTER_CUBIC)
+    grain = np.random.default_rng(0).normal(0, 6, image.shape)
+    image = np.clip(image * 0.35 + grain, 0, 255).astype(np.uint8)
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+
+def full_decode(data: bytes, cap):
+    import cv2
+    import numpy as np
+    from app.media.ingest import fit_within
+
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    image = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+    size = fit_within(image.shape[1], image.shape[0], cap)
+    if size != (image.shape[1], image.shape[0]):
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def planned_decode(data: bytes, cap):
+    from app.media.ingest import decode, plan_decode
+    return decode(data, plan_decode(data, cap))
+
+
+def run_case(path: str, tier: str, method: str, repeats: int) -> dict:
+    from app.billing.plans import SubscriptionTier, TIERS as PLANS
+    from app.media.ingest import plan_decode
+
+    with open(path, "rb") as f:
+        data = f.read()
+    cap = PLANS[SubscriptionTier(tier)].image.max_resolution
+    decoder = full_decode if method == "full" else planned_decode
+    # one untimed decode: the imports it pulls in (cv2) stay out of the baseline
+    decoder(data, cap)
+    baseline = rss_mb()
+    reset_peak_rss()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        image = decoder(data, cap)
+        samples.append(time.perf_counter() - started)
+        del image
+    plan = plan_decode(data, cap)
+    return {
+        "source": f"{plan.width}x{plan.height}",
+        "tier": tier,
+        "method": method,
+        "output": "x".join(map(str, plan.output_size)),
+        "jpeg_reduction": plan.reduction if method == "planned" else 1,
+        "decode_ms": round(statistics.median(samples) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main(args):
+    if args.child:
+        path, tier, method = args.child
+        print(json.dumps(run_case(path, tier, method, args.repeats)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = os.path.join(directory, f"{size}.jpg")
+            make_jpeg(size, path)
+            for tier in TIERS:
+                for method in ("full", "planned"):
+                    output = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.bench_image_ingest", "--repeats", str(args.repeats),
+                         "--child", path, tier, method],
+                        capture_output=True, text=True, check=True,
+                    )
+                    results.append(json.loads(output.stdout.splitlines()[-1]))
+                    print(json.dumps(results[-1]), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda v: v.split(","), default=["6000x4000", "7680x4320"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+"""
+ZR-DCE inference backends on CPU: float32 TensorFlow vs TFLite fp16 / int8.
+
+Each backend runs in its own interpreter so memory numbers do not mix:
+  - load: seconds to build the model (TFLite: convert + accuracy gate), the
+    converted flatbuffer size, and RSS once loaded
+  - latency: one `--size` image per call straight into the model, median and p95
+  - throughput: `--requests` images through an InferenceEngine with
+    `--concurrency` callers in flight (micro-batches of up to 8)
+  - peak RSS of the whole run
+Then the accuracy gate report (PSNR / SSIM against float32) per TFLite backend.
+
+    python -m benchmarks.bench_inference_backends --size 512x512 --requests 64 --threads 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks._common import percentile, summarize
+
+BACKENDS = ["tf", "tflite-fp16", "tflite-int8"]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+
+
+async def throughput(model, images: list[np.ndarray], concurrency: int) -> dict:
+    from app.model.engine import InferenceEngine
+
+    engine = InferenceEngine(
+        model_loader=lambda: model,
+        max_batch_size=8,
+        max_batch_pixels=8 * 512 * 512,
+        max_wait_ms=5,
+        bucket_multiple=64,
+    )
+    await engine.start()
+    await engine.enhance(images[0])
+    latencies = []
+    pending = iter(images)
+
+    async def caller():
+        for image in pending:
+            started = time.perf_counter()
+            await engine.enhance(image, scale=1)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await engine.stop()
+    result = summarize(latencies, elapsed)
+    return {"images_per_second": result["rps"], "engine_p50_ms": result["p50_ms"], "engine_p95_ms": result["p95_ms"]}
+
+
+def run_backend(args) -> dict:
+    from app.model.engine import INFERENCE_BACKENDS
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    model = INFERENCE_BACKENDS[args.child]()
+    result = {
+        "backend": args.child,
+        "load_s": round(time.perf_counter() - started, 2),
+        "model_kb": round(getattr(model, "model_bytes", 0) / 1024) or None,
+        "rss_loaded_mb": rss_mb(),
+        "rss_model_mb": round(rss_mb() - rss_before, 1),
+    }
+
+    width, height = map(int, args.size.split("x"))
+    rng = np.random.default_rng(0)
+    batch = (rng.random((1, height, width, 3), dtype=np.float32) * 0.3)
+    np.asarray(model.serve(batch))
+    samples = []
+    for _ in range(args.repeats):
+        call_started = time.perf_counter()
+        np.asarray(model.serve(batch))
+        samples.append(time.perf_counter() - call_started)
+    result.update(
+        latency_p50_ms=round(percentile(samples, 50) * 1000, 1),
+        latency_p95_ms=round(percentile(samples, 95) * 1000, 1),
+    )
+
+    images = [rng.random((height, width, 3), dtype=np.float32) * 0.3 for _ in range(args.requests)]
+    result.update(asyncio.run(throughput(model, images, args.concurrency)))
+    result["rss_peak_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def gate_reports() -> list[dict]:
+    from app.model.tflite import QUANTIZATIONS, TFLiteZeroDCE, accuracy_report, gate_images
+    from app.model.zr_dce import load_model
+
+    reference = load_model()
+    images = gate_images()
+    return [
+        {"quantization": quantization, **accuracy_report(reference, TFLiteZeroDCE.converted(reference, quantization, 1), images)}
+        for quantization in QUANTIZATIONS
+    ]
+
+
+def main(args):
+    if args.child:
+        print(json.dumps(run_backend(args)))
+        return
+
+    env = {**os.environ, **({"TFLITE_NUM_THREADS": str(args.threads)} if args.threads is not None else {})}
+    results = []
+    for backend in args.backends:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_inference_backends", "--child", backend, *sys.argv[1:]],
+            capture_output=True, text=True, check=True, env=env,
+        )
+        results.append(json.loads(output.stdout.splitlines()[-1]))
+        print(json.dumps(results[-1]), file=sys.stderr)
+    print(json.dumps({"backends": results, "accuracy_gate": gate_reports()}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--size", default="512x512")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=None, help="TFLITE_NUM_THREADS (0: all CPUs)")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+"""
+Throughput and latency of the ZR-DCE micro-batching engine on CPU.
+
+Sends `--requests` images (mixed sizes) with `--concurrency` callers in flight
+through InferenceEngine for every (max batch size, max wait) combination.
+Batch size 1 / wait 0 is the one-image-per-request baseline.
+
+    python -m benchmarks.bench_inference_engine --batch-sizes 1,4,8 --waits-ms 0,5,20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from app.model.engine import InferenceEngine
+from app.model.zr_dce import load_model
+from benchmarks._common import summarize
+
+SHAPES = [(240, 320), (256, 256), (384, 512), (360, 480)]
+
+
+async def run(model, images, batch_size: int, wait_ms: float, concurrency: int, bucket_multiple: int) -> dict:
+    engine = InferenceEngine(
+        model_loader=lambda: model,
+        max_batch_size=batch_size,
+        max_batch_pixels=batch_size * 512 * 512,
+        max_wait_ms=wait_ms,
+        bucket_multiple=bucket_multiple,
+    )
+    await engine.start()
+    await engine.enhance(images[0])
+
+    latencies = []
+    pending = iter(images)
+
+    async def caller():
+        for image in pending:
+            started = time.perf_counter()
+            await engine.enhance(image)
+            latencies.append(time.perf_counter() - started)
+
+    batches_before, started = engine.batches_run, time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    batches = engine.batches_run - batches_before
+    await engine.stop()
+
+    result = summarize(latencies, elapsed)
+    result.update(
+        max_batch_size=batch_size,
+        max_wait_ms=wait_ms,
+        images_per_second=result.pop("rps"),
+        mean_batch=round(len(images) / batches, 2),
+    )
+    return result
+
+
+async def main(args):
+    rng = np.random.default_rng(0)
+    model = load_model(None if args.weights else "")
+    images = [
+        rng.random((*SHAPES[i % len(SHAPES)], 3), dtype=np.float32) * 0.3
+        for i in range(args.requests)
+    ]
+    results = []
+    for batch_size in args.batch_sizes:
+        for wait_ms in args.waits_ms:
+            results.append(await run(model, images, batch_size, wait_ms, args.concurrency, args.bucket_multiple))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=lambda v: [int(x) for x in v.split(",")], default=[1, 4, 8])
+    parser.add_argument("--waits-ms", type=lambda v: [float(x) for x in v.split(",")], default=[0, 5, 20])
+    parser.add_argument("--bucket-multiple", type=int, default=64)
+    parser.add_argument("--weights", action="store_true", help="load trained weights instead of random init")
+    asyncio.run(main(parser.parse_args()))
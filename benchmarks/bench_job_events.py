@@ -0,0 +1,240 @@
+"""
+Server cost of clients watching jobs: server-sent events vs polling.
+
+Inserts `--jobs` running jobs for the users seeded by benchmarks.seed and
+starts a local uvicorn (no job workers, no model warm-up). This process plays
+the workers: it publishes a progress event for every job each
+`--progress-interval` seconds through the Postgres broker. `--clients` clients
+each watch one job, owned by the user they authenticate as, in one of two modes:
+  - poll: GET /jobs/{id} every `--poll-seconds` (get_current_user plus a
+    jobs query per poll)
+  - sse: one GET /jobs/{id}/events stream, authenticated once at connect
+Once every client is connected and `--settle` seconds have passed, the server's
+CPU time, the SQL statements it ran (its /metrics) and the updates clients
+received are measured over `--seconds`. The jobs are deleted afterwards.
+
+    python -m benchmarks.seed --users 10000 --media 0
+    python -m benchmarks.bench_job_events --clients 5000 --jobs 500 --seconds 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import cpu_seconds, rss_mb
+
+MARKER = "bench-job-events"
+SQL_COUNT = re.compile(r"^sql_statement_duration_seconds_count(?:\{[^}]*\})? ([0-9.e+]+)$", re.MULTILINE)
+
+
+def create_jobs(count: int) -> list[tuple[int, int]]:
+    """(job id, owner) of `count` running jobs spread over the seeded users"""
+    from sqlalchemy import insert
+    from app.billing.plans import MediaType, SubscriptionTier
+    from app.database import SessionLocal
+    from app.jobs.models import Job, JobState
+    from benchmarks.seed import suite_users
+
+    with SessionLocal() as db:
+        users = [(user_id, SubscriptionTier(tier)) for tier, ids in suite_users(db).items() for user_id in ids]
+        if not users:
+            raise SystemExit("No seeded users: run `python -m benchmarks.seed` first")
+        owners = [users[i % len(users)] for i in range(count)]
+        ids = db.scalars(insert(Job).returning(Job.id), [
+            {
+                "user_id": user_id,
+                "tier": tier,
+                "media_type": MediaType.VIDEO,
+                "state": JobState.RUNNING,
+                "original_filename": "bench.mp4",
+                "original_path": "/nonexistent/bench.mp4",
+                "content_type": "video/mp4",
+                "extension": ".mp4",
+                "content_sha256": "0" * 64,
+                "size_bytes": 0,
+                "worker": MARKER,
+            }
+            for user_id, tier in owners
+        ]).all()
+        db.commit()
+    return [(job_id, user_id) for job_id, (user_id, _) in zip(ids, owners)]
+
+
+def delete_jobs():
+    from sqlalchemy import delete
+    from app.database import SessionLocal
+    from app.jobs.models import Job
+
+    with SessionLocal() as db:
+        db.execute(delete(Job).where(Job.worker == MARKER))
+        db.commit()
+
+
+async def publish_progress(jobs: list[tuple[int, int]], interval: float, stop: asyncio.Event):
+    """What job workers would send: every job advances one step per interval"""
+    from app.jobs.events import JobEvent, job_events
+    from app.jobs.models import JobState
+
+    frames_total = 9000
+    step = 0
+    while not stop.is_set():
+        step += 1
+        started = time.perf_counter()
+        done = min(frames_total, step * 15)
+        await asyncio.gather(*(
+            job_events.publish(JobEvent(
+                job_id, user_id, JobState.RUNNING, done / frames_total,
+                frames_done=done, frames_total=frames_total, eta_seconds=float(frames_total - done) / 30
+            ))
+            for job_id, user_id in jobs
+        ))
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def poll_client(client, job_id: int, headers: dict, period: float, received: list[int], stop: asyncio.Event):
+    await asyncio.sleep(random.uniform(0, period))
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(f"/jobs/{job_id}", headers=headers)
+        if response.status_code == 200:
+            received[0] += 1
+        await asyncio.sleep(max(0.0, period - (time.perf_counter() - started)))
+
+
+async def sse_client(client, job_id: int, headers: dict, received: list[int], connected: list[int], stop: asyncio.Event):
+    async with client.stream("GET", f"/jobs/{job_id}/events", headers=headers) as response:
+        connected[0] += 1
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                received[0] += 1
+            if stop.is_set():
+                return
+
+
+def sql_statements(metrics: str) -> float:
+    return sum(float(value) for value in SQL_COUNT.findall(metrics))
+
+
+async def measure(args, mode: str, jobs: list[tuple[int, int]], metrics_dir: str) -> dict:
+    import httpx
+    from app.auth.service import AuthService
+
+    env = {
+        **os.environ,
+        "JOB_WORKER_PROCESSES": "0",
+        "MODEL_WARMUP_ON_STARTUP": "false",
+        "JOB_EVENTS_BROKER": "postgres",
+        "METRICS_ENABLED": "true",
+        "METRICS_MULTIPROC_DIR": os.path.join(metrics_dir, mode),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+         "--log-level", "warning", "--backlog", str(args.clients * 2)],
+        env=env,
+    )
+    stop = asyncio.Event()
+    received, connected = [0], [0]
+    try:
+        limits = httpx.Limits(max_connections=args.clients + 10, max_keepalive_connections=args.clients + 10)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited during startup")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+
+            tokens = {user_id: AuthService.create_access_token(user_id) for _, user_id in jobs}
+            watched = [jobs[i % len(jobs)] for i in range(args.clients)]
+            publisher = asyncio.create_task(publish_progress(jobs, args.progress_interval, stop))
+            if mode == "poll":
+                clients = [
+                    asyncio.create_task(poll_client(
+                        client, job_id, {"Authorization": f"Bearer {tokens[user_id]}"}, args.poll_seconds, received, stop
+                    ))
+                    for job_id, user_id in watched
+                ]
+                connected[0] = args.clients
+            else:
+                clients = []
+                for job_id, user_id in watched:
+                    clients.append(asyncio.create_task(sse_client(
+                        client, job_id, {"Authorization": f"Bearer {tokens[user_id]}"}, received, connected, stop
+                    )))
+                    await asyncio.sleep(0)
+            while connected[0] < args.clients:
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(args.settle)
+
+            cpu_before = cpu_seconds(server.pid)
+            sql_before = sql_statements((await client.get("/metrics")).text)
+            received_before = received[0]
+            await asyncio.sleep(args.seconds)
+            cpu = cpu_seconds(server.pid) - cpu_before
+            sql = sql_statements((await client.get("/metrics")).text) - sql_before
+            updates = received[0] - received_before
+            rss = rss_mb(server.pid)
+
+            stop.set()
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(publisher, *clients, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "clients": args.clients,
+        "server_cpu_seconds": round(cpu, 2),
+        "server_cpu_percent": round(100 * cpu / args.seconds, 1),
+        "sql_statements": int(sql),
+        "sql_per_second": round(sql / args.seconds, 1),
+        "updates_received": updates,
+        "updates_per_second": round(updates / args.seconds, 1),
+        "server_rss_mb": round(rss, 1),
+    }
+
+
+async def main(args):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # the server inherits it: one socket per client on both sides
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, args.clients * 2 + 1024)), hard))
+
+    delete_jobs()
+    jobs = create_jobs(args.jobs)
+    metrics_dir = tempfile.mkdtemp(prefix="shadowshift-bench-events-")
+    results = {}
+    try:
+        for mode in args.modes:
+            results[mode] = await measure(args, mode, jobs, metrics_dir)
+            print(json.dumps({mode: results[mode]}), file=sys.stderr)
+    finally:
+        delete_jobs()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--modes", type=lambda v: v.split(","), default=["poll", "sse"])
+    parser.add_argument("--poll-seconds", type=float, default=2.0)
+    parser.add_argument("--progress-interval", type=float, default=1.0)
+    parser.add_argument("--settle", type=float, default=5.0)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8771)
+    args = parser.parse_args()
+    # this process publishes through its own pool and keeps its metrics in memory
+    os.environ["JOB_EVENTS_BROKER"] = "postgres"
+    os.environ["METRICS_MULTIPROC_DIR"] = ""
+    asyncio.run(main(args))
@@ -0,0 +1,213 @@
+"""
+Queue wait per tier under mixed load: FIFO vs strict priority vs weighted-fair.
+
+Discrete-event simulation of `--workers` job workers. Arrivals are Poisson per
+tier; 80% of jobs are images (exponential service, mean `--image-seconds`)
+and 20% videos (1-120 s clips at `--video-speed` seconds of work per second of
+footage). Each scenario sets the offered load per tier as a fraction of total
+worker capacity:
+  - steady:    free 0.3, basic 0.3, pro 0.2 (under capacity)
+  - pro-flood: free 0.3, basic 0.3, pro 1.0 (PRO alone can saturate the workers)
+The weighted-fair policy runs app.jobs.scheduler.WeightedFairScheduler, one
+per worker, with the plans' queue weights. Reported: jobs finished and wait
+p50/p95/max (seconds) per tier, plus each tier's share of worker time.
+
+With `--db-claims N`, N jobs are also inserted into the local database and
+claimed by `--workers` concurrent JobService.claim loops, to check that SKIP
+LOCKED hands out every job exactly once and to measure claims per second.
+
+    python -m benchmarks.bench_job_queue --workers 4 --minutes 60 --db-claims 2000
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import time
+from collections import deque
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from app.billing.plans import MediaType, SubscriptionTier, TIERS
+from app.jobs.scheduler import WeightedFairScheduler
+
+SCENARIOS = {
+    "steady": {SubscriptionTier.FREE: 0.3, SubscriptionTier.BASIC: 0.3, SubscriptionTier.PRO: 0.2},
+    "pro-flood": {SubscriptionTier.FREE: 0.3, SubscriptionTier.BASIC: 0.3, SubscriptionTier.PRO: 1.0},
+}
+PRIORITY = [SubscriptionTier.PRO, SubscriptionTier.BASIC, SubscriptionTier.FREE]
+VIDEO_FRACTION = 0.2
+VIDEO_SECONDS = (1, 120)
+BENCH_EMAIL = "bench-jobs@example.com"
+
+
+def service_time(rng: random.Random, args) -> tuple[float, float]:
+    """(work seconds, scheduling cost in image-equivalents as JobService charges it)"""
+    if rng.random() < VIDEO_FRACTION:
+        duration = rng.uniform(*VIDEO_SECONDS)
+        return duration * args.video_speed, 1.0 + duration / 10
+    return rng.expovariate(1.0 / args.image_seconds), 1.0
+
+
+def mean_service(args) -> float:
+    video = sum(VIDEO_SECONDS) / 2 * args.video_speed
+    return VIDEO_FRACTION * video + (1 - VIDEO_FRACTION) * args.image_seconds
+
+
+def simulate(policy: str, loads: dict, args) -> dict:
+    rng = random.Random(args.seed)
+    horizon = args.minutes * 60
+    capacity = args.workers / mean_service(args)
+    events = []  # (time, seq, kind, payload)
+    seq = 0
+    for tier, load in loads.items():
+        t = 0.0
+        while True:
+            t += rng.expovariate(load * capacity)
+            if t > horizon:
+                break
+            work, cost = service_time(rng, args)
+            heapq.heappush(events, (t, seq, "arrive", (tier, work, cost)))
+            seq += 1
+
+    queues = {tier: deque() for tier in loads}
+    fifo = deque()
+    weights = {tier: plan.queue_weight for tier, plan in TIERS.items()}
+    schedulers = [WeightedFairScheduler(weights) for _ in range(args.workers)]
+    idle = list(range(args.workers))
+    waits = {tier: [] for tier in loads}
+    busy = {tier: 0.0 for tier in loads}
+
+    def pick(worker: int):
+        if policy == "fifo":
+            return fifo.popleft() if fifo else None
+        if policy == "priority":
+            for tier in PRIORITY:
+                if queues[tier]:
+                    return queues[tier].popleft()
+            return None
+        scheduler = schedulers[worker]
+        skipped = []
+        for tier in scheduler.order():
+            if queues[tier]:
+                job = queues[tier].popleft()
+                scheduler.charge(tier, job[3], skipped)
+                return job
+            skipped.append(tier)
+        scheduler.idle()
+        return None
+
+    def dispatch(now: float):
+        nonlocal seq
+        while idle:
+            job = pick(idle[-1])
+            if job is None:
+                return
+            worker = idle.pop()
+            arrived, tier, work, _ = job
+            waits[tier].append(now - arrived)
+            busy[tier] += work
+            heapq.heappush(events, (now + work, seq, "done", worker))
+            seq += 1
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if now > horizon:
+            break
+        if kind == "arrive":
+            tier, work, cost = payload
+            job = (now, tier, work, cost)
+            (fifo if policy == "fifo" else queues[tier]).append(job)
+        else:
+            idle.append(payload)
+        dispatch(now)
+
+    total_busy = sum(busy.values()) or 1.0
+    result = {}
+    for tier in loads:
+        values = np.array(waits[tier]) if waits[tier] else np.zeros(1)
+        result[tier.value] = {
+            "jobs": len(waits[tier]),
+            "wait_p50_s": round(float(np.percentile(values, 50)), 1),
+            "wait_p95_s": round(float(np.percentile(values, 95)), 1),
+            "wait_max_s": round(float(values.max()), 1),
+            "worker_share": round(busy[tier] / total_busy, 3),
+        }
+    return result
+
+
+async def db_claims(count: int, workers: int) -> dict:
+    import app.main  # noqa: F401  (registers every mapped model)
+    from app.auth.models import User
+    from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+    from app.jobs.models import Job, JobState
+    from app.jobs.service import JobService
+
+    Base.metadata.create_all(bind=engine)
+    tiers = list(SubscriptionTier)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, hashed_password="x", name="bench", full_name="Bench User")
+            db.add(user)
+            db.flush()
+        db.execute(delete(Job).where(Job.user_id == user.id))
+        db.add_all(
+            Job(
+                user_id=user.id, tier=tiers[i % len(tiers)], media_type=MediaType.IMAGE, state=JobState.QUEUED,
+                original_filename="bench.png", original_path="/nonexistent", content_type="image/png",
+                extension=".png", content_sha256="0" * 64, size_bytes=1,
+            )
+            for i in range(count)
+        )
+        db.commit()
+        user_id = user.id
+
+    claimed = []
+
+    async def loop(name: str):
+        scheduler = WeightedFairScheduler({tier: plan.queue_weight for tier, plan in TIERS.items()})
+        async with AsyncSessionLocal() as db:
+            while (job := await JobService.claim(db, name, scheduler)) is not None:
+                claimed.append((job.id, job.tier))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(f"bench/{i}") for i in range(workers)))
+    elapsed = time.perf_counter() - started
+
+    first_tiers = [tier.value for _, tier in claimed[:20]]
+    async with AsyncSessionLocal() as db:
+        left = len((await db.scalars(select(Job.id).where(Job.user_id == user_id, Job.state == JobState.QUEUED))).all())
+        await db.execute(delete(Job).where(Job.user_id == user_id))
+        await db.commit()
+    return {
+        "jobs": count,
+        "claimers": workers,
+        "claimed": len(claimed),
+        "duplicates": len(claimed) - len({job_id for job_id, _ in claimed}),
+        "left_queued": left,
+        "claims_per_second": round(len(claimed) / elapsed),
+        "first_20_tiers": first_tiers,
+    }
+
+
+def main(args):
+    report = {}
+    for name in args.scenarios:
+        report[name] = {policy: simulate(policy, SCENARIOS[name], args) for policy in ("fifo", "priority", "weighted-fair")}
+    if args.db_claims:
+        report["db_claims"] = asyncio.run(db_claims(args.db_claims, args.workers))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--image-seconds", type=float, default=1.0)
+    parser.add_argument("--video-speed", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-claims", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+"""
+Latency of unrelated endpoints while logins are saturated.
+
+Runs a sustained storm of /auth/login requests and, at the same time, probes
+/health and /billing/plans. The baseline app verifies passwords inline in a
+sync handler (the pre-pool behaviour); the real app sends argon2 to the
+process pool and sheds excess logins with 503.
+
+    python -m benchmarks.bench_login_storm --logins 400 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, HTTPException
+
+from app.auth.hashing import password_hasher, pwd_context
+from app.auth.models import User
+from app.auth.schemas import UserLogin
+from app.database import Base, SessionLocal, engine
+from app.main import app as pooled_app
+from benchmarks._common import asgi_client, drive, summarize
+
+BENCH_EMAIL = "bench-login-storm@example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+def build_inline_app() -> FastAPI:
+    """Login verifying argon2 inside a threadpool slot, like the original handler"""
+    baseline = FastAPI()
+
+    @baseline.post("/auth/login")
+    def login(login_data: UserLogin):
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.email == login_data.email).first()
+            if not user or not pwd_context.verify(login_data.password, user.hashed_password):
+                raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @baseline.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @baseline.get("/billing/plans")
+    def plans():
+        return []
+
+    return baseline
+
+
+def seed_user():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(User).filter(User.email == BENCH_EMAIL).first() is None:
+            db.add(User(
+                email=BENCH_EMAIL,
+                hashed_password=pwd_context.hash(BENCH_PASSWORD),
+                name="bench",
+                full_name="Bench User",
+            ))
+            db.commit()
+
+
+async def probe(client, path: str, stop: asyncio.Event) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.01)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run(app, logins: int, concurrency: int) -> dict:
+    body = {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}
+    async with asgi_client(app) as client:
+        stop = asyncio.Event()
+        probes = [asyncio.create_task(probe(client, path, stop)) for path in ("/health", "/billing/plans")]
+        storm = await drive(client, "POST", "/auth/login", total=logins, concurrency=concurrency, json=body)
+        stop.set()
+        health, plans = await asyncio.gather(*probes)
+    return {"logins": storm, "/health": health, "/billing/plans": plans}
+
+
+async def main(logins: int, concurrency: int):
+    seed_user()
+    results = {
+        "inline": await run(build_inline_app(), logins, concurrency),
+        "process_pool": await run(pooled_app, logins, concurrency),
+    }
+    password_hasher.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
@@ -0,0 +1,152 @@
+"""
+Full-resolution vs low-resolution curve estimation for large images.
+
+Every (resolution, mode) case runs in its own subprocess so peak RSS is
+measured in isolation; a case that dies (e.g. OOM-killed full-resolution 8K)
+is reported with its exit code instead of numbers. Quality is PSNR and SSIM
+(luma) of the low-res output against full-resolution inference.
+
+`auto` uses the INFERENCE_LOWRES_* settings, i.e. what /media/enhance does.
+
+    python -m benchmarks.bench_lowres_curves --resolutions 1080p,4k,8k --scales auto,4,8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {"1080p": (1080, 1920), "4k": (2160, 3840), "8k": (4320, 7680)}
+SAMPLE_IMAGE = "Lit your Media(2).png"
+
+
+def test_image(height: int, width: int) -> np.ndarray:
+    """The README sample scaled up and darkened (gamma 2.2), float32 RGB"""
+    bgr = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width, height), interpolation=cv2.INTER_CUBIC)
+    image = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+    return np.power(image, 2.2, out=image)
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = float(np.mean((a - b) ** 2, dtype=np.float64))
+    return float("inf") if mse == 0 else 10 * np.log10(1.0 / mse)
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Gaussian-window SSIM (Wang et al. 2004) on luma"""
+    a = cv2.cvtColor(a, cv2.COLOR_RGB2GRAY)
+    b = cv2.cvtColor(b, cv2.COLOR_RGB2GRAY)
+    c1, c2 = 0.01 ** 2, 0.03 ** 2
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def child(args):
+    """Runs one case; prints a JSON result line and saves the output image"""
+    import asyncio
+    from app.config import settings
+    from app.model.engine import InferenceEngine
+    from app.model.zr_dce import load_model
+
+    model = load_model()
+    image = test_image(*RESOLUTIONS[args.resolution])
+    engine = InferenceEngine(
+        model_loader=lambda: model,
+        max_batch_size=1,
+        max_batch_pixels=1,
+        max_wait_ms=0,
+        bucket_multiple=64,
+        lowres_scale=settings.INFERENCE_LOWRES_SCALE,
+        lowres_min_pixels=settings.INFERENCE_LOWRES_MIN_PIXELS,
+        lowres_max_estimate_pixels=settings.INFERENCE_LOWRES_MAX_ESTIMATE_PIXELS,
+    )
+    scale = args.scale or engine.lowres_factor(*image.shape[:2])
+
+    async def run():
+        timings = []
+        output = None
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            output = await engine.enhance(image, scale=scale)
+            timings.append(time.perf_counter() - started)
+        await engine.stop()
+        return output, timings
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    output, timings = asyncio.run(run())
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    np.save(args.output, output)
+    print(json.dumps({
+        "factor": scale,
+        "first_s": round(timings[0], 3),
+        "best_s": round(min(timings), 3),
+        "peak_rss_mb": round(peak_kb / 1024),
+        "inference_rss_mb": round((peak_kb - baseline_kb) / 1024),
+    }))
+
+
+def run_case(resolution: str, scale: int, repeats: int, output: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_lowres_curves", "--child",
+         "--resolution", resolution, "--scale", str(scale),
+         "--repeats", str(repeats), "--output", output],
+        capture_output=True, text=True,
+        env={**os.environ, "TF_CPP_MIN_LOG_LEVEL": "3"},
+    )
+    case = {"resolution": resolution, "mode": {0: "auto", 1: "full"}.get(scale, f"lowres/{scale}")}
+    if proc.returncode != 0:
+        case["error"] = f"exit {proc.returncode}"
+        return case
+    case.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return case
+
+
+def main(args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for resolution in args.resolutions:
+            reference_path = os.path.join(tmp, "full.npy")
+            results.append(run_case(resolution, 1, args.repeats, reference_path))
+            reference = np.load(reference_path) if "error" not in results[-1] else None
+
+            for scale in args.scales:
+                output_path = os.path.join(tmp, f"lowres{scale}.npy")
+                case = run_case(resolution, scale, args.repeats, output_path)
+                if "error" not in case and reference is not None:
+                    output = np.load(output_path)
+                    case["psnr_db"] = round(psnr(reference, output), 2)
+                    case["ssim"] = round(ssim(reference, output), 4)
+                    del output
+                results.append(case)
+                print(json.dumps(case), file=sys.stderr)
+
+            if os.path.exists(reference_path):
+                os.remove(reference_path)
+            del reference
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", type=lambda v: v.split(","), default=list(RESOLUTIONS))
+    parser.add_argument(
+        "--scales", type=lambda v: [0 if x == "auto" else int(x) for x in v.split(",")], default=[0, 4, 8]
+    )
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--resolution", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    child(args) if args.child else main(args)
@@ -0,0 +1,174 @@
+"""
+Serving a large enhanced video from GET /media/{id}/download.
+
+Writes a `--size-mb` file into a temporary UPLOAD_DIR, registers it as one
+user's enhanced video and starts the app under uvicorn once per case:
+  - 64 KB chunks: Starlette's FileResponse default read size
+  - 1 MB chunks: MEDIA_DOWNLOAD_CHUNK_KB's default
+  - X-Accel-Redirect: MEDIA_ACCEL_REDIRECT_PREFIX set, so the app answers with
+    headers only and nginx would send the body (timed without nginx)
+Per case, from a raw-socket client: full-download throughput and the server's
+CPU seconds per GB served (utime + stime from /proc/<pid>/stat), then the
+median time to first byte and to last byte of `--range-kb` read from the
+middle of the file (a seek), and of a 304 revalidation. Client and server
+share the machine's CPUs.
+
+    python -m benchmarks.bench_media_delivery --size-mb 2048 --repeats 20
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+CHUNK = 1024 * 1024
+CASES = [
+    ("64 KB chunks", {"MEDIA_DOWNLOAD_CHUNK_KB": "64"}),
+    ("1 MB chunks", {"MEDIA_DOWNLOAD_CHUNK_KB": "1024"}),
+    ("X-Accel-Redirect", {"MEDIA_ACCEL_REDIRECT_PREFIX": "/_media/"}),
+]
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def write_file(path: str, size_mb: int):
+    block = os.urandom(CHUNK)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def register_media(client: httpx.Client, path: str, size_mb: int) -> tuple[str, int]:
+    """Token of a new user and the id of a MediaFile row for `path` owned by them"""
+    from app.auth.models import User
+    from app.billing.plans import MediaType
+    from app.database import SessionLocal
+    from app.media.models import MediaFile
+
+    email = f"delivery-{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/auth/register", json={"email": email, "password": "password123", "name": "bench", "full_name": "Bench"})
+    token = client.post("/auth/login", json={"email": email, "password": "password123"}).json()["access_token"]
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == email).one()
+        media = MediaFile(
+            user_id=user.id, media_type=MediaType.VIDEO, original_filename="big.mp4", original_path=path,
+            processed_path=path, content_type="video/mp4", file_size_mb=size_mb,
+        )
+        db.add(media)
+        db.commit()
+        return token, media.id
+
+
+def get(port: int, path: str, headers: dict) -> tuple[int, dict, int, float, float]:
+    """(status, headers, body bytes, seconds to first byte, seconds to last byte)"""
+    started = time.perf_counter()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        lines = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n{lines}\r\n".encode())
+        buffer = bytearray(CHUNK)
+        view = memoryview(buffer)
+        head = b""
+        while b"\r\n\r\n" not in head:
+            received = sock.recv_into(view)
+            if not received:
+                break
+            head += bytes(view[:received])
+        first_byte = time.perf_counter() - started
+        head, _, body = head.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        response_headers = {line.split(":", 1)[0].lower(): line.split(":", 1)[1].strip() for line in header_lines}
+        remaining = int(response_headers.get("content-length", 0)) - len(body)
+        while remaining > 0:
+            received = sock.recv_into(view)
+            if not received:
+                break
+            remaining -= received
+    length = int(response_headers.get("content-length", 0)) - max(remaining, 0)
+    return int(status_line.split()[1]), response_headers, length, first_byte, time.perf_counter() - started
+
+
+def median_ms(samples: list[float]) -> float:
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def run_case(name: str, env: dict, args, uploads: str, path: str) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env={**os.environ, "UPLOAD_DIR": uploads, "JOB_WORKER_PROCESSES": "0", **env},
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as client:
+            for _ in range(240):
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.5)
+            token, media_id = register_media(client, path, args.size_mb)
+        url = f"/media/{media_id}/download"
+        auth = {"Authorization": f"Bearer {token}"}
+
+        cpu_before = cpu_seconds(server.pid)
+        status, headers, length, _, elapsed = get(args.port, url, auth)
+        cpu = cpu_seconds(server.pid) - cpu_before
+        gigabytes = length / 1024 ** 3
+        result = {"case": name, "status": status, "bytes": length}
+        if gigabytes:
+            result.update(
+                throughput_mb_s=round(length / CHUNK / elapsed),
+                server_cpu_s_per_gb=round(cpu / gigabytes, 3),
+            )
+        else:
+            result.update(headers_only_ms=round(elapsed * 1000, 2), x_accel_redirect=headers.get("x-accel-redirect"))
+
+        middle = args.size_mb * CHUNK // 2
+        seek = {**auth, "Range": f"bytes={middle}-{middle + args.range_kb * 1024 - 1}"}
+        samples = [get(args.port, url, seek) for _ in range(args.repeats)]
+        result.update(
+            seek_status=samples[0][0],
+            seek_first_byte_ms=median_ms([sample[3] for sample in samples]),
+            seek_last_byte_ms=median_ms([sample[4] for sample in samples]),
+        )
+        revalidate = {**auth, "If-None-Match": headers["etag"]} if "etag" in headers else auth
+        samples = [get(args.port, url, revalidate) for _ in range(args.repeats)]
+        result.update(revalidate_status=samples[0][0], revalidate_ms=median_ms([sample[4] for sample in samples]))
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args):
+    import app.main  # noqa: F401  (registers every mapped model)
+    from app.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    results = []
+    with tempfile.TemporaryDirectory() as uploads:
+        path = os.path.join(uploads, "big_enhanced.mp4")
+        write_file(path, args.size_mb)
+        for name, env in CASES:
+            result = run_case(name, env, args, uploads, path)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--range-kb", type=int, default=1024)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8766)
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+"""
+Cost of the hot-path instrumentation (app/metrics.py) per request.
+
+Runs the app in-process (httpx ASGI transport), in a fresh interpreter per mode:
+  - off: METRICS_ENABLED=false, metrics in process memory (no middleware; the
+    JWT, SQL and cache call sites still record)
+  - memory: middleware on, metrics kept in process memory
+  - multiprocess: middleware on, metrics in mmapped files (the default)
+  - profiler: multiprocess plus the slow-request sampler running
+For each mode, `--requests` sequential GET / (middleware only) and GET
+/billing/my-subscription (JWT decode, user cache, SQL), median and p99 in
+microseconds. Then the time of one /metrics render with every process's files.
+
+    python -m benchmarks.bench_metrics --requests 3000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import percentile
+
+MODES = {
+    "off": {"METRICS_ENABLED": "false", "METRICS_MULTIPROC_DIR": ""},
+    "memory": {"METRICS_ENABLED": "true", "METRICS_MULTIPROC_DIR": ""},
+    "multiprocess": {"METRICS_ENABLED": "true"},
+    "profiler": {"METRICS_ENABLED": "true", "PROFILE_SLOW_REQUEST_MS": "10000"},
+}
+
+
+async def measure(requests: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.auth.service import AuthService
+    from app.billing.plans import SubscriptionTier
+    from app.metrics import render
+    from app.profiler import profiler
+    from benchmarks.bench_quota import reset_user
+
+    profiler.start()
+    user = reset_user(SubscriptionTier.PRO)
+    headers = {"Authorization": f"Bearer {AuthService.create_access_token(user.id)}"}
+    result = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, path, kwargs in (("root", "/", {}), ("subscription", "/billing/my-subscription", {"headers": headers})):
+            for _ in range(200):  # warm-up: pools, caches, label children
+                await client.get(path, **kwargs)
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await client.get(path, **kwargs)
+                samples.append(time.perf_counter() - started)
+                response.raise_for_status()
+            result[f"{name}_p50_us"] = round(statistics.median(samples) * 1e6, 1)
+            result[f"{name}_p99_us"] = round(percentile(samples, 99) * 1e6, 1)
+    started = time.perf_counter()
+    body = render()
+    result["render_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    result["render_kb"] = round(len(body) / 1024, 1)
+    return result
+
+
+def main(args):
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.requests))))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, env in MODES.items():
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_metrics", "--requests", str(args.requests), "--child"],
+                env={
+                    **os.environ,
+                    "METRICS_MULTIPROC_DIR": directory,
+                    "JOB_WORKER_PROCESSES": "0",
+                    "MODEL_WARMUP_ON_STARTUP": "false",
+                    **env,
+                },
+                capture_output=True, text=True, check=True,
+            )
+            results.append({"mode": mode, **json.loads(output.stdout.splitlines()[-1])})
+            print(json.dumps(results[-1]), file=sys.stderr)
+    for result in results[1:]:
+        result["root_overhead_us"] = round(result["root_p50_us"] - results[0]["root_p50_us"], 1)
+        result["subscription_overhead_us"] = round(result["subscription_p50_us"] - results[0]["subscription_p50_us"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    main(parser.parse_args())
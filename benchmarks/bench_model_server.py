@@ -0,0 +1,155 @@
+"""
+API responsiveness and throughput with in-process inference vs model servers.
+
+Starts the app under uvicorn once with inference in the API process and once
+with `--servers` model-server processes (MODEL_SERVER_PROCESSES). Per run, one
+PRO user keeps `--concurrency` POST /media/enhance requests of a `--size`
+image in flight for `--seconds`, while a probe calls GET / every 50 ms.
+Reports enhanced images per second, enhance latency, and probe latency idle
+and under that load (the event loop's share of the CPU). Result caching is
+off so every upload runs the model.
+
+    python -m benchmarks.bench_model_server --servers 2 --concurrency 8 --seconds 30 --size 640x480
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+
+from benchmarks._common import summarize
+from benchmarks.bench_cold_start import test_image
+
+
+def register_pro_user(client: httpx.Client) -> tuple[str, int]:
+    from app.auth.models import User
+    from app.billing.models import Subscription
+    from app.billing.plans import SubscriptionTier
+    from app.database import SessionLocal
+
+    email = f"model-server-{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/auth/register", json={"email": email, "password": "password123", "name": "bench", "full_name": "Bench"})
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == email).one()
+        db.query(Subscription).filter(Subscription.user_id == user.id).delete()
+        db.add(Subscription(user_id=user.id, tier=SubscriptionTier.PRO, images_used_this_month=0, videos_used_this_month=0))
+        db.commit()
+        user_id = user.id
+    token = client.post("/auth/login", json={"email": email, "password": "password123"}).json()["access_token"]
+    return token, user_id
+
+
+def keep_quota_free(user_id: int, stop: threading.Event):
+    from app.billing.models import Subscription
+    from app.database import SessionLocal
+
+    while not stop.wait(1.0):
+        with SessionLocal() as db:
+            db.query(Subscription).filter(Subscription.user_id == user_id).update({"images_used_this_month": 0})
+            db.commit()
+
+
+async def probe(client: httpx.AsyncClient, until: float) -> list[float]:
+    latencies = []
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        await client.get("/")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+    return latencies
+
+
+async def load(client: httpx.AsyncClient, token: str, image: bytes, concurrency: int, seconds: float) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, errors = [], 0
+    until = time.perf_counter() + seconds
+
+    async def caller():
+        nonlocal errors
+        while time.perf_counter() < until:
+            started = time.perf_counter()
+            response = await client.post("/media/enhance", headers=headers, files={"file": ("bench.jpg", image, "image/jpeg")})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    probes, *_ = await asyncio.gather(probe(client, until), *(caller() for _ in range(concurrency)))
+    enhance = summarize(latencies, time.perf_counter() - started, errors)
+    loaded = summarize(probes, seconds)
+    return {
+        "images_per_second": enhance["rps"],
+        "enhance_errors": errors,
+        "enhance_p50_ms": enhance["p50_ms"],
+        "enhance_p95_ms": enhance["p95_ms"],
+        "probe_loaded_p50_ms": loaded["p50_ms"],
+        "probe_loaded_p95_ms": loaded["p95_ms"],
+        "probe_loaded_p99_ms": loaded["p99_ms"],
+    }
+
+
+def run(servers: int, args, image: bytes) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env={
+            **os.environ,
+            "MODEL_SERVER_PROCESSES": str(servers),
+            "JOB_WORKER_PROCESSES": "0",
+            "RESULT_CACHE_ENABLED": "false",
+        },
+    )
+    stop = threading.Event()
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        with httpx.Client(base_url=base_url, timeout=300) as client:
+            while True:
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.2)
+            token, user_id = register_pro_user(client)
+        threading.Thread(target=keep_quota_free, args=(user_id, stop), daemon=True).start()
+
+        async def measure() -> dict:
+            limits = httpx.Limits(max_connections=args.concurrency + 1)
+            async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+                idle = summarize(await probe(client, time.perf_counter() + 3), 3)
+                result = {"model_servers": servers, "probe_idle_p50_ms": idle["p50_ms"], "probe_idle_p99_ms": idle["p99_ms"]}
+                result.update(await load(client, token, image, args.concurrency, args.seconds))
+                return result
+
+        return asyncio.run(measure())
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait()
+
+
+def main(args):
+    import app.main  # noqa: F401  (registers every mapped model)
+
+    image = test_image(args.size)
+    results = []
+    for servers in (0, args.servers):
+        results.append(run(servers, args, image))
+        print(json.dumps(results[-1]), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--port", type=int, default=8768)
+    main(parser.parse_args())
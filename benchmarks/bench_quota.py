@@ -0,0 +1,112 @@
+"""
+Quota metering under concurrency: statements per upload and overshoot.
+
+Fires N parallel uploads for one PRO user (each on its own session) through
+  - legacy: get_or_create_subscription + reset_usage_if_needed + limit check
+    + increment in Python, the flow before reserve_quota existed
+  - reserve: BillingService.reserve_quota, one conditional upsert
+and reports statements per upload, granted uploads and the final counter.
+The reserve run exits non-zero if it ever grants more than count_per_month.
+
+    python -m benchmarks.bench_quota --parallel 500
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, select
+
+import app.main  # noqa: F401  (registers every mapped model)
+from app.auth.cache import CachedUser
+from app.auth.models import User
+from app.billing.models import Subscription
+from app.billing.plans import MediaType, SubscriptionTier, TIER_LIMITS
+from app.billing.service import BillingService
+from app.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+
+BENCH_EMAIL = "bench-quota@example.com"
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def reset_user(tier: SubscriptionTier) -> CachedUser:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, hashed_password="x", name="bench", full_name="Bench User")
+            db.add(user)
+            db.flush()
+        db.execute(delete(Subscription).where(Subscription.user_id == user.id))
+        db.add(Subscription(user_id=user.id, tier=tier, images_used_this_month=0, videos_used_this_month=0))
+        db.commit()
+        return CachedUser(id=user.id, is_active=True, is_admin=False, tier=tier)
+
+
+async def legacy_upload(user: CachedUser) -> bool:
+    async with AsyncSessionLocal() as db:
+        subscription = await BillingService.get_or_create_subscription(db, user)
+        await BillingService.reset_usage_if_needed(db, subscription)
+        limit = TIER_LIMITS[subscription.tier]["limits"][MediaType.IMAGE]["count_per_month"]
+        if subscription.images_used_this_month >= limit:
+            return False
+        subscription = await BillingService.get_or_create_subscription(db, user)
+        subscription.images_used_this_month += 1
+        await db.commit()
+        return True
+
+
+async def reserve_upload(user: CachedUser) -> bool:
+    async with AsyncSessionLocal() as db:
+        try:
+            reservation = await BillingService.reserve_quota(db, user, MediaType.IMAGE, file_size_mb=1.0)
+        except HTTPException:
+            return False
+        await BillingService.commit_quota(db, reservation)
+        return True
+
+
+async def run(label: str, upload, parallel: int) -> dict:
+    user = reset_user(SubscriptionTier.PRO)
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    started = time.perf_counter()
+    granted = sum(await asyncio.gather(*(upload(user) for _ in range(parallel))))
+    elapsed = time.perf_counter() - started
+    event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    with SessionLocal() as db:
+        used = db.scalar(select(Subscription.images_used_this_month).where(Subscription.user_id == user.id))
+    return {
+        "label": label,
+        "uploads": parallel,
+        "granted": granted,
+        "counter": used,
+        "limit": TIER_LIMITS[SubscriptionTier.PRO]["limits"][MediaType.IMAGE]["count_per_month"],
+        "statements_per_upload": round(counter.count / parallel, 2),
+        "uploads_per_second": round(parallel / elapsed, 1),
+    }
+
+
+async def main(parallel: int):
+    results = [await run("legacy", legacy_upload, parallel), await run("reserve", reserve_upload, parallel)]
+    print(json.dumps(results, indent=2))
+    reserve = results[1]
+    if reserve["granted"] > reserve["limit"] or reserve["counter"] != reserve["granted"]:
+        sys.exit("reserve_quota overshot the monthly limit")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parallel", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.parallel))
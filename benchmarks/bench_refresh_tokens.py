@@ -0,0 +1,87 @@
+"""
+Refresh-token lookup cost as the user base grows.
+
+Seeds one session per synthetic user (bulk INSERT ... SELECT generate_series,
+Postgres only), prints the EXPLAIN plan of the token lookup and times
+AuthService.refresh_access_token at each size. With the unique index on
+refresh_tokens.token_hash the latency should stay flat (O(log n)).
+
+    python -m benchmarks.bench_refresh_tokens --sizes 10000,100000,1000000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import text
+
+import app.main  # noqa: F401  (registers every mapped model)
+from app.auth.service import AuthService
+from app.database import AsyncSessionLocal, Base, engine
+from benchmarks._common import summarize
+
+SEED_USERS = text("""
+    INSERT INTO users (email, hashed_password, name, full_name, is_active, is_admin, credits_remaining)
+    SELECT 'bench-rt-' || g || '@example.com', 'x', 'bench', 'Bench User', true, false, 0
+    FROM generate_series(:start, :stop) AS g
+    ON CONFLICT (email) DO NOTHING
+""")
+
+SEED_TOKENS = text("""
+    INSERT INTO refresh_tokens (user_id, token_hash, device_label, created_at, expires_at)
+    SELECT u.id, encode(sha256(convert_to('bench-rt-token-' || u.id, 'UTF8')), 'hex'),
+           'bench', now(), now() + interval '7 days'
+    FROM users u
+    WHERE u.email LIKE 'bench-rt-%'
+      AND NOT EXISTS (SELECT 1 FROM refresh_tokens t WHERE t.user_id = u.id)
+""")
+
+BENCH_USER_IDS = text("SELECT id FROM users WHERE email LIKE 'bench-rt-%'")
+
+
+def seed(size: int) -> list[int]:
+    with engine.begin() as conn:
+        conn.execute(SEED_USERS, {"start": 1, "stop": size})
+        conn.execute(SEED_TOKENS)
+        conn.execute(text("ANALYZE users"))
+        conn.execute(text("ANALYZE refresh_tokens"))
+        return list(conn.execute(BENCH_USER_IDS).scalars())
+
+
+def explain(token_hash: str) -> str:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("EXPLAIN ANALYZE SELECT user_id, expires_at FROM refresh_tokens WHERE token_hash = :h"),
+            {"h": token_hash},
+        )
+        return "\n".join(row[0] for row in rows)
+
+
+async def time_refreshes(user_ids: list[int], samples: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for user_id in random.sample(user_ids, min(samples, len(user_ids))):
+        t0 = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await AuthService.refresh_access_token(db, f"bench-rt-token-{user_id}")
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def main(sizes: list[int], samples: int):
+    Base.metadata.create_all(bind=engine)
+    results = {}
+    for size in sizes:
+        user_ids = seed(size)
+        print(f"--- {len(user_ids)} users\n{explain(AuthService.hash_refresh_token(f'bench-rt-token-{user_ids[0]}'))}")
+        results[len(user_ids)] = await time_refreshes(user_ids, samples)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main([int(size) for size in args.sizes.split(",")], args.samples))
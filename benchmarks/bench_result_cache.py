@@ -0,0 +1,104 @@
+"""
+Repeated uploads with and without the enhanced-output cache.
+
+Sends `--requests` image uploads for one PRO user through
+MediaService.enhance_image, drawn from `--distinct` variants of the README
+sample with Zipf popularity (a few popular images, a long tail), once with
+RESULT_CACHE_ENABLED off and once on. Reports total time, hit ratio, p50/p95
+latency of hits and misses, and the bytes of enhanced output served from the
+cache instead of recomputed. Runs against a temporary UPLOAD_DIR.
+
+    python -m benchmarks.bench_result_cache --requests 100 --distinct 20
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="bench-result-cache-")
+
+import cv2
+import numpy as np
+from fastapi import UploadFile
+from sqlalchemy import update
+
+from app.billing.models import Subscription
+from app.billing.plans import SubscriptionTier
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.media.result_cache import result_cache
+from app.media.service import MediaService
+from app.model.engine import inference_engine
+from benchmarks.bench_lowres_curves import SAMPLE_IMAGE
+from benchmarks.bench_quota import reset_user
+
+
+def make_images(distinct: int, width: int, height: int) -> list[bytes]:
+    base = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+    images = []
+    for i in range(distinct):
+        dark = np.power(base / 255.0, 1.8 + 0.05 * i) * 255.0
+        images.append(cv2.imencode(".png", dark.astype(np.uint8))[1].tobytes())
+    return images
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+async def run(label: str, enabled: bool, images: list[bytes], order: list[int]) -> dict:
+    settings.RESULT_CACHE_ENABLED = enabled
+    user = reset_user(SubscriptionTier.PRO)
+    hits_before, saved_before = result_cache.hits, result_cache.bytes_saved
+    hit_times, miss_times = [], []
+    started = time.perf_counter()
+    for index in order:
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Subscription).where(Subscription.user_id == user.id).values(images_used_this_month=0))
+            await db.commit()
+            hits = result_cache.hits
+            began = time.perf_counter()
+            await MediaService.enhance_image(db, user, UploadFile(io.BytesIO(images[index]), filename=f"{index}.png"))
+            (hit_times if result_cache.hits > hits else miss_times).append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": label,
+        "requests": len(order),
+        "elapsed_seconds": round(elapsed, 2),
+        "hit_ratio": round((result_cache.hits - hits_before) / len(order), 3),
+        "hit_p50_ms": percentile(hit_times, 50),
+        "hit_p95_ms": percentile(hit_times, 95),
+        "miss_p50_ms": percentile(miss_times, 50),
+        "miss_p95_ms": percentile(miss_times, 95),
+        "mb_served_from_cache": round((result_cache.bytes_saved - saved_before) / (1024 * 1024), 1),
+    }
+
+
+async def main(args):
+    width, height = map(int, args.size.split("x"))
+    images = make_images(args.distinct, width, height)
+    rng = np.random.default_rng(0)
+    weights = 1.0 / np.arange(1, args.distinct + 1) ** args.zipf
+    order = rng.choice(args.distinct, size=args.requests, p=weights / weights.sum()).tolist()
+
+    await inference_engine.start()
+    results = [await run("cache off", False, images, order)]
+    results.append(await run("cache on", True, images, order))
+    await inference_engine.stop()
+    results[1]["speedup"] = round(results[0]["elapsed_seconds"] / results[1]["elapsed_seconds"], 2)
+    results.append({"mode": "cache state", **result_cache.stats()})
+    shutil.rmtree(settings.UPLOAD_DIR, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--size", default="1280x720")
+    asyncio.run(main(parser.parse_args()))
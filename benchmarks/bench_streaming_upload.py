@@ -0,0 +1,136 @@
+"""
+Oversized upload: multipart /media/enhance vs raw streaming /media/enhance/stream.
+
+Starts the app under uvicorn in a subprocess and sends a `--size-mb` PNG-
+looking body as a FREE user (5 MB image limit) from a raw socket client, so
+the time the 413 arrives and the bytes sent by then are exact. Server peak
+RSS comes from /proc/<pid>/status (VmHWM, reset per case via clear_refs).
+
+    python -m benchmarks.bench_streaming_upload --size-mb 2048
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+CHUNK = 1024 * 1024
+
+
+def vm_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak(pid: int):
+    with open(f"/proc/{pid}/clear_refs", "w") as f:
+        f.write("5")
+
+
+async def send(port: int, path: str, token: str, size: int, *, multipart: bool, chunked: bool) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    boundary = uuid.uuid4().hex
+    head, tail = b"", b""
+    if multipart:
+        head = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+    content_type = f"multipart/form-data; boundary={boundary}" if multipart else "application/octet-stream"
+    length_header = "Transfer-Encoding: chunked" if chunked else f"Content-Length: {len(head) + size + len(tail)}"
+    writer.write((
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n"
+        f"Content-Type: {content_type}\r\n{length_header}\r\n\r\n"
+    ).encode())
+
+    started = time.perf_counter()
+    status_line = asyncio.ensure_future(reader.readline())
+    sent = 0
+    payload = bytes(CHUNK)
+    try:
+        pieces = [head + PNG_MAGIC + payload[len(PNG_MAGIC):]]
+        sent_body = CHUNK
+        while not status_line.done():
+            for piece in pieces:
+                writer.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n" if chunked else piece)
+                sent += len(piece)
+            await writer.drain()
+            if sent_body >= size:
+                final = tail if not chunked else (f"{len(tail):x}\r\n".encode() + tail + b"\r\n0\r\n\r\n" if tail else b"0\r\n\r\n")
+                writer.write(final)
+                await writer.drain()
+                break
+            pieces = [payload[:min(CHUNK, size - sent_body)]]
+            sent_body += len(pieces[0])
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    line = await status_line
+    elapsed = time.perf_counter() - started
+    writer.close()
+    return {
+        "status": int(line.split()[1]) if line else None,
+        "time_to_reject_s": round(elapsed, 3),
+        "mb_sent_before_reject": round(sent / CHUNK, 1),
+    }
+
+
+async def main(args):
+    port = args.port
+    with tempfile.TemporaryDirectory() as uploads:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env={**os.environ, "UPLOAD_DIR": uploads},
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+                for _ in range(120):
+                    try:
+                        await client.get("/health")
+                        break
+                    except httpx.TransportError:
+                        await asyncio.sleep(0.5)
+                email = f"upload-{uuid.uuid4().hex[:8]}@example.com"
+                await client.post("/auth/register", json={"email": email, "password": "password123", "name": "bench", "full_name": "Bench"})
+                token = (await client.post("/auth/login", json={"email": email, "password": "password123"})).json()["access_token"]
+
+            cases = [
+                ("multipart /media/enhance", "/media/enhance", True, False),
+                ("stream, Content-Length", "/media/enhance/stream", False, False),
+                ("stream, chunked", "/media/enhance/stream", False, True),
+            ]
+            results = []
+            size = args.size_mb * CHUNK
+            for name, path, multipart, chunked in cases:
+                reset_peak(server.pid)
+                before_kb = vm_kb(server.pid, "VmRSS")
+                result = await send(port, path, token, size, multipart=multipart, chunked=chunked)
+                await asyncio.sleep(0.5)
+                result.update(
+                    case=name,
+                    server_peak_rss_mb=round(vm_kb(server.pid, "VmHWM") / 1024),
+                    server_rss_growth_mb=round((vm_kb(server.pid, "VmHWM") - before_kb) / 1024),
+                )
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
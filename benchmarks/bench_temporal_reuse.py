@@ -0,0 +1,123 @@
+"""
+Per-frame inference vs temporal curve reuse (each tier's enhancement profile).
+
+Two synthetic clips are built from the README sample image: a static camera
+with sensor noise, and a pan across a 2x upscaled copy. For every mode it
+reports fps, speedup over per-frame inference, the fraction of frames that
+skipped the network, mean PSNR against the per-frame output and flicker
+(mean absolute frame-to-frame change of mean luma, x1000).
+
+    python -m benchmarks.bench_temporal_reuse --seconds 8 --size 640x360
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from app.billing.plans import TIERS
+from app.config import settings
+from app.media.service import engine_batch_enhancer
+from app.media.temporal import TemporalCurveReuse
+from app.media.video import VideoPipeline
+from app.model.engine import inference_engine
+from benchmarks.bench_lowres_curves import SAMPLE_IMAGE, psnr
+
+
+def make_clip(path: str, kind: str, seconds: int, width: int, height: int, fps: int):
+    rng = np.random.default_rng(0)
+    scale = 1 if kind == "static" else 2
+    base = cv2.resize(cv2.imread(SAMPLE_IMAGE), (width * scale, height * scale), interpolation=cv2.INTER_CUBIC)
+    base = (np.power(base / 255.0, 2.2) * 255.0).astype(np.float32)
+    frames = seconds * fps
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        if kind == "static":
+            frame = base
+        else:
+            x = round((base.shape[1] - width) * i / max(1, frames - 1))
+            frame = base[height // 2:height // 2 + height, x:x + width]
+        noisy = frame + rng.normal(0, 2.0, frame.shape).astype(np.float32)
+        writer.write(np.clip(noisy, 0, 255).astype(np.uint8))
+    writer.release()
+
+
+def read_frames(path: str):
+    capture = cv2.VideoCapture(path)
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        yield frame.astype(np.float32) / 255.0
+    capture.release()
+
+
+def compare(output: str, reference: str) -> tuple[float, float]:
+    """Mean PSNR against the reference output, and flicker of `output`"""
+    scores, luma = [], []
+    for frame, ref in zip(read_frames(output), read_frames(reference)):
+        scores.append(psnr(ref, frame))
+        luma.append(float(frame.mean()))
+    return float(np.mean(scores)), float(np.mean(np.abs(np.diff(luma)))) * 1000
+
+
+async def run_mode(source: str, output: str, profile) -> dict:
+    loop = asyncio.get_running_loop()
+    temporal = None
+    if profile is not None:
+        def estimate(frame):
+            return asyncio.run_coroutine_threadsafe(inference_engine.estimate_curves(frame), loop).result()
+        temporal = TemporalCurveReuse(profile, estimate, inference_engine.apply_curves)
+    pipeline = VideoPipeline(
+        engine_batch_enhancer(loop),
+        batch_size=settings.VIDEO_BATCH_SIZE,
+        queue_frames=settings.VIDEO_QUEUE_FRAMES,
+        ffmpeg_binary=settings.FFMPEG_BINARY,
+        temporal=temporal,
+    )
+    stats = await loop.run_in_executor(None, pipeline.run, source, output)
+    return stats.as_dict()
+
+
+async def main(args):
+    width, height = map(int, args.size.split("x"))
+    await inference_engine.start()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.clips:
+            source = os.path.join(tmp, f"{kind}.mp4")
+            make_clip(source, kind, args.seconds, width, height, args.fps)
+
+            reference = os.path.join(tmp, f"{kind}_per_frame.mp4")
+            baseline = await run_mode(source, reference, None)
+            _, flicker = compare(reference, reference)
+            results.append({
+                "clip": kind, "mode": "per-frame", "fps": baseline["fps"],
+                "speedup": 1.0, "skipped_fraction": 0.0, "flicker": round(flicker, 3),
+            })
+            for tier in args.tiers:
+                output = os.path.join(tmp, f"{kind}_{tier}.mp4")
+                stats = await run_mode(source, output, TIERS[tier].enhancement)
+                score, flicker = compare(output, reference)
+                results.append({
+                    "clip": kind, "mode": f"temporal/{tier}", "fps": stats["fps"],
+                    "speedup": round(baseline["elapsed_seconds"] / stats["elapsed_seconds"], 2),
+                    "skipped_fraction": stats["temporal"]["skipped_fraction"],
+                    "psnr_vs_per_frame_db": round(score, 2),
+                    "flicker": round(flicker, 3),
+                })
+    await inference_engine.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=lambda v: v.split(","), default=["static", "panning"])
+    parser.add_argument("--tiers", type=lambda v: v.split(","), default=[tier.value for tier in TIERS])
+    parser.add_argument("--seconds", type=int, default=8)
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument("--fps", type=int, default=24)
+    asyncio.run(main(parser.parse_args()))
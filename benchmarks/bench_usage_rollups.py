@@ -0,0 +1,234 @@
+"""
+Billing analytics on a large user base: rollup reports and bulk subscription changes.
+
+Uses the users seeded by benchmarks.seed (1M for the numbers in the request).
+Generates `--events` usage events over `--days` days for them, dated in the
+year 2000 so they never mix with real usage, with a long tail (a few users
+meter most items), via INSERT ... SELECT generate_series (Postgres only). Then:
+  - roll_up: UsageService.roll_up over the pending events, events per second
+  - reports: each admin report `--repeats` times from the rollups, against the
+    same question answered from the raw usage_events and from subscriptions
+  - details_loop: get_subscription_details per user (the only report path
+    before), timed on `--sample` users and extrapolated to all of them
+  - bulk: BillingService.bulk_update_subscriptions moving `--bulk-users` BASIC
+    users to PRO and back by id, and a period reset of every BASIC user by
+    tier, against the admin_upgrade_user flow on `--sample` users
+The events and rollups dated 2000 are deleted afterwards. The bulk runs
+leave the tiers as seeded, but BASIC users' counters are reset and their
+billing periods restarted.
+
+    python -m benchmarks.seed --users 1000000 --media 0
+    python -m benchmarks.bench_usage_rollups --events 5000000 --repeats 20 --bulk-users 10000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+import app.main  # noqa: F401  (registers every mapped model)
+from app.database import AsyncSessionLocal, engine
+from benchmarks._common import summarize
+
+EPOCH = date(2000, 1, 1)
+
+BENCH_USERS = text("""
+    CREATE TEMP TABLE bench_usage_users AS
+    SELECT row_number() OVER (ORDER BY u.id) AS n, u.id, s.tier
+    FROM users u JOIN subscriptions s ON s.user_id = u.id
+    WHERE u.email LIKE '%@suite.bench'
+""")
+
+# power(random(), 3) puts most events on the first few users: a long tail
+SEED_EVENTS = text("""
+    INSERT INTO usage_events (user_id, tier, media_type, items, occurred_at, rolled_up)
+    SELECT b.id, b.tier,
+           CASE WHEN g.kind < 0.85 THEN 'IMAGE'::mediatype ELSE 'VIDEO'::mediatype END,
+           1, :epoch + g.at * :days * interval '1 day', false
+    FROM (
+        SELECT 1 + floor(:users * power(random(), 3))::int AS n, random() AS kind, random() AS at
+        FROM generate_series(1, :events)
+    ) g
+    JOIN bench_usage_users b USING (n)
+""")
+
+RAW_QUERIES = {
+    "usage_day": text("""
+        SELECT occurred_at::date, tier, media_type, sum(items) FROM usage_events
+        WHERE occurred_at >= :start AND occurred_at < :end GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+    """),
+    "top_consumers": text("""
+        SELECT user_id, max(tier), sum(items) AS items FROM usage_events
+        WHERE occurred_at >= :start AND occurred_at < :month_end AND media_type = 'IMAGE'
+        GROUP BY user_id ORDER BY items DESC LIMIT 20
+    """),
+    "tier_distribution": text("""
+        SELECT tier, count(DISTINCT user_id), sum(items) FROM usage_events
+        WHERE occurred_at >= :start AND occurred_at < :month_end GROUP BY tier
+    """),
+    "subscriptions_scan": text("""
+        SELECT tier, count(*), sum(images_used_this_month), sum(videos_used_this_month)
+        FROM subscriptions GROUP BY tier
+    """),
+}
+
+
+def delete_bench_usage():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM usage_events WHERE occurred_at < :end"), {"end": date(2001, 1, 1)})
+        conn.execute(text("DELETE FROM usage_rollups_tier WHERE period_start < :end"), {"end": date(2001, 1, 1)})
+        conn.execute(text("DELETE FROM usage_rollups_user WHERE period_start < :end"), {"end": date(2001, 1, 1)})
+
+
+def seed_events(events: int, days: int) -> int:
+    with engine.begin() as conn:
+        conn.execute(BENCH_USERS)
+        users = conn.scalar(text("SELECT count(*) FROM bench_usage_users"))
+        if not users:
+            raise SystemExit("No seeded users: run `python -m benchmarks.seed` first")
+        conn.execute(SEED_EVENTS, {"epoch": EPOCH, "days": days, "users": users, "events": events})
+        conn.execute(text("ANALYZE usage_events"))
+    return users
+
+
+async def timed(call, repeats: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        begun = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - begun)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def reports(args) -> dict:
+    from app.billing.models import RollupPeriod
+    from app.billing.plans import MediaType
+    from app.billing.usage import UsageService
+
+    end = EPOCH + timedelta(days=args.days - 1)
+    start = datetime(EPOCH.year, EPOCH.month, EPOCH.day)
+    params = {"start": start, "end": start + timedelta(days=args.days), "month_end": datetime(2000, 2, 1)}
+    results = {}
+    async with AsyncSessionLocal() as db:
+        rollup_reports = {
+            "usage_day": lambda: UsageService.usage_totals(db, RollupPeriod.DAY, EPOCH, end),
+            "usage_month": lambda: UsageService.usage_totals(db, RollupPeriod.MONTH, EPOCH, end),
+            "top_consumers": lambda: UsageService.top_consumers(db, RollupPeriod.MONTH, EPOCH, MediaType.IMAGE, 20),
+            "tier_distribution": lambda: UsageService.tier_distribution(db, RollupPeriod.MONTH, EPOCH),
+        }
+        for name, report in rollup_reports.items():
+            results[f"rollup_{name}"] = await timed(report, args.repeats)
+        for name, query in RAW_QUERIES.items():
+            # full scans: a few runs are enough
+            results[f"raw_{name}"] = await timed(lambda: db.execute(query, params), max(1, args.repeats // 5))
+    return results
+
+
+async def details_loop(args, user_ids: list[int]) -> dict:
+    from app.auth.models import User
+    from app.billing.service import BillingService
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        for user_id in user_ids[:args.sample]:
+            await BillingService.get_subscription_details(db, await db.get(User, user_id))
+        elapsed = time.perf_counter() - started
+    per_user = elapsed / min(args.sample, len(user_ids))
+    return {"users": min(args.sample, len(user_ids)), "seconds": round(elapsed, 2),
+            "extrapolated_all_users_seconds": round(per_user * len(user_ids), 1)}
+
+
+async def bulk(args, by_tier: dict[str, list[int]]) -> dict:
+    from app.auth.models import User
+    from app.billing.plans import SubscriptionTier
+    from app.billing.service import BillingService
+    from app.config import settings
+
+    basic = by_tier["basic"][:args.bulk_users]
+    results = {}
+    async with AsyncSessionLocal() as db:
+        for name, tier, current in (("by_ids_to_pro", SubscriptionTier.PRO, SubscriptionTier.BASIC),
+                                    ("by_ids_back_to_basic", SubscriptionTier.BASIC, SubscriptionTier.PRO)):
+            started = time.perf_counter()
+            changed = await BillingService.bulk_update_subscriptions(
+                db, basic, current, tier, False, settings.BILLING_BULK_BATCH_SIZE
+            )
+            elapsed = time.perf_counter() - started
+            results[name] = {"users": len(changed), "seconds": round(elapsed, 2),
+                             "users_per_second": round(len(changed) / elapsed, 1)}
+
+        started = time.perf_counter()
+        changed = await BillingService.bulk_update_subscriptions(
+            db, None, SubscriptionTier.BASIC, None, True, settings.BILLING_BULK_BATCH_SIZE
+        )
+        elapsed = time.perf_counter() - started
+        results["reset_all_basic_by_tier"] = {"users": len(changed), "seconds": round(elapsed, 2),
+                                              "users_per_second": round(len(changed) / elapsed, 1)}
+
+        # admin_upgrade_user, one user per call; every sampled user is BASIC again afterwards
+        sample = basic[:args.sample]
+        started = time.perf_counter()
+        for tier in (SubscriptionTier.PRO, SubscriptionTier.BASIC):
+            for user_id in sample:
+                user = await db.get(User, user_id)
+                subscription = await BillingService.get_or_create_subscription(db, user)
+                subscription.tier = tier
+                await db.commit()
+        elapsed = time.perf_counter() - started
+        per_user = elapsed / (2 * len(sample)) if sample else 0.0
+        results["per_user_upgrade"] = {"users": 2 * len(sample), "seconds": round(elapsed, 2),
+                                       "users_per_second": round(1 / per_user, 1) if per_user else 0.0,
+                                       "extrapolated_bulk_users_seconds": round(per_user * len(basic), 1)}
+    return results
+
+
+async def main(args):
+    from app.billing.usage import UsageService
+    from app.config import settings
+    from app.database import SessionLocal
+    from benchmarks.seed import suite_users
+
+    with SessionLocal() as db:
+        by_tier = suite_users(db)
+    user_ids = [user_id for ids in by_tier.values() for user_id in ids]
+
+    delete_bench_usage()
+    results = {}
+    try:
+        started = time.perf_counter()
+        users = seed_events(args.events, args.days)
+        results["seed"] = {"users": users, "events": args.events, "seconds": round(time.perf_counter() - started, 1)}
+        print(json.dumps({"seed": results["seed"]}), file=sys.stderr)
+
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            rolled = await UsageService.roll_up(db, settings.USAGE_ROLLUP_BATCH_SIZE)
+            elapsed = time.perf_counter() - started
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE usage_rollups_tier"))
+            conn.execute(text("ANALYZE usage_rollups_user"))
+        results["roll_up"] = {"events": rolled, "seconds": round(elapsed, 2), "events_per_second": round(rolled / elapsed, 1)}
+        print(json.dumps({"roll_up": results["roll_up"]}), file=sys.stderr)
+
+        results["reports"] = await reports(args)
+        print(json.dumps({"reports": results["reports"]}), file=sys.stderr)
+        results["details_loop"] = await details_loop(args, user_ids)
+        results["bulk"] = await bulk(args, by_tier)
+    finally:
+        delete_bench_usage()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--bulk-users", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args))
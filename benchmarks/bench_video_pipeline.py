@@ -0,0 +1,106 @@
+"""
+Throughput and memory of the streaming video pipeline.
+
+Generates a synthetic dark clip (ffmpeg testsrc2 + a sine audio track; OpenCV
+without audio when ffmpeg is missing), runs it through VideoPipeline and the
+shared InferenceEngine, and reports overall fps, per-stage fps, the bottleneck
+stage and RSS sampled while running. RSS should stay flat as the clip gets longer.
+
+    python -m benchmarks.bench_video_pipeline --seconds 300 --size 1920x1080 --fps 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.media.service import engine_batch_enhancer
+from app.media.video import VideoPipeline
+from app.model.engine import inference_engine
+
+
+def make_clip(path: str, seconds: int, width: int, height: int, fps: int):
+    ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+    if ffmpeg:
+        subprocess.run([
+            ffmpeg, "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}",
+            "-f", "lavfi", "-i", "sine=frequency=440",
+            "-t", str(seconds), "-vf", "eq=brightness=-0.35",
+            "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path,
+        ], check=True)
+        return
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    gradient = np.linspace(0, 90, width, dtype=np.float32)
+    for i in range(seconds * fps):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[...] = ((gradient + i) % 90)[None, :, None]
+        writer.write(frame)
+    writer.release()
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+async def main(args):
+    width, height = map(int, args.size.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = os.path.join(tmp, "source.mp4"), os.path.join(tmp, "enhanced.mp4")
+        make_clip(source, args.seconds, width, height, args.fps)
+        await inference_engine.start()
+
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.5):
+                samples.append(rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        pipeline = VideoPipeline(
+            engine_batch_enhancer(asyncio.get_running_loop()),
+            batch_size=args.batch_size,
+            queue_frames=args.queue_frames,
+            ffmpeg_binary=settings.FFMPEG_BINARY,
+            crf=settings.VIDEO_CRF,
+            preset=settings.VIDEO_PRESET,
+        )
+        baseline = rss_mb()
+        sampler.start()
+        try:
+            stats = await asyncio.get_running_loop().run_in_executor(None, pipeline.run, source, output)
+        finally:
+            done.set()
+            sampler.join()
+            await inference_engine.stop()
+
+        quarters = [samples[min(len(samples) - 1, len(samples) * q // 4)] for q in range(1, 5)] if samples else []
+        print(json.dumps({
+            "clip": {"seconds": args.seconds, "size": args.size, "fps": args.fps},
+            **stats.as_dict(),
+            "rss_mb": {
+                "before": round(baseline),
+                "by_quarter": [round(value) for value in quarters],
+                "peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+            },
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, default=300)
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=settings.VIDEO_BATCH_SIZE)
+    parser.add_argument("--queue-frames", type=int, default=settings.VIDEO_QUEUE_FRAMES)
+    asyncio.run(main(parser.parse_args()))
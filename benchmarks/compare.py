@@ -0,0 +1,87 @@
+"""
+Diff two benchmark-suite reports (benchmarks.suite --output).
+
+For every scenario in both reports, compares throughput (higher is better),
+p50/p95/p99 latency and peak RSS (lower is better) and flags changes worse
+than `--threshold` percent. Latency changes smaller than `--min-ms` are never
+flagged (sub-millisecond percentiles are mostly noise). Exits 1 when anything
+regressed, so it can gate a change; the report's meta of both runs is printed
+first, since numbers from different machines or settings do not compare.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+# metric -> True when higher is better
+METRICS = {"rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+
+def change(baseline: float, current: float) -> float:
+    if not baseline:
+        return 0.0
+    return (current - baseline) / baseline * 100
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_ms: float) -> tuple[list[dict], list[dict]]:
+    """(rows, regressions): one row per scenario and metric present in both reports"""
+    rows, regressions = [], []
+    for scenario in sorted(baseline["scenarios"].keys() & current["scenarios"].keys()):
+        before, after = baseline["scenarios"][scenario], current["scenarios"][scenario]
+        for metric, higher_is_better in METRICS.items():
+            if metric not in before or metric not in after:
+                continue
+            delta = change(before[metric], after[metric])
+            worse = -delta if higher_is_better else delta
+            regressed = worse > threshold
+            if metric.endswith("_ms") and abs(after[metric] - before[metric]) < min_ms:
+                regressed = False
+            row = {
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": before[metric],
+                "current": after[metric],
+                "change_pct": round(delta, 1),
+                "regressed": regressed,
+            }
+            rows.append(row)
+            if regressed:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline: {json.dumps(baseline.get('meta', {}))}")
+    print(f"current:  {json.dumps(current.get('meta', {}))}")
+    rows, regressions = compare(baseline, current, args.threshold, args.min_ms)
+    if args.json:
+        print(json.dumps({"rows": rows, "regressions": regressions}, indent=2))
+    else:
+        print(f"{'scenario':<22}{'metric':<13}{'baseline':>12}{'current':>12}{'change':>10}")
+        for row in rows:
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(
+                f"{row['scenario']:<22}{row['metric']:<13}{row['baseline']:>12}{row['current']:>12}"
+                f"{row['change_pct']:>+9.1f}%{flag}"
+            )
+    missing = baseline["scenarios"].keys() - current["scenarios"].keys()
+    if missing:
+        print(f"not in current: {', '.join(sorted(missing))}")
+    print(f"{len(regressions)} regression(s) beyond {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    parser.add_argument("--min-ms", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="rows as JSON instead of a table")
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""
+Seeded benchmark data: users, subscriptions and media rows.
+
+Creates `--users` users (user<i>@suite.bench, all with the password PASSWORD;
+one argon2 hash is computed and shared), each with a subscription whose tier
+follows TIER_MIX and whose monthly counters start at zero, and `--media` media
+rows spread over them with a long tail (a few users own most of the gallery,
+like real accounts). The same `--seed` gives the same data. Earlier suite
+data (every @suite.bench user and what they own) is deleted first; the tables
+are VACUUM ANALYZEd at the end so plans match a settled database.
+
+    python -m benchmarks.seed --users 10000 --media 100000 --seed 42
+    python -m benchmarks.seed --users 100000 --media 1000000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+DOMAIN = "suite.bench"
+PASSWORD = "suite-password"
+TIER_MIX = (("free", 0.7), ("basic", 0.2), ("pro", 0.1))
+CHUNK = 10000
+
+
+def email(index: int) -> str:
+    return f"user{index}@{DOMAIN}"
+
+
+def clear(db):
+    """Delete every suite user and the rows that reference them"""
+    from sqlalchemy import delete, select
+    from app.auth.models import User
+    from app.billing.models import Subscription, UsageEvent, UserUsageRollup
+    from app.jobs.models import Job
+    from app.media.models import MediaFile
+
+    users = select(User.id).where(User.email.like(f"%@{DOMAIN}")).scalar_subquery()
+    for model in (Job, MediaFile, Subscription, UsageEvent, UserUsageRollup):
+        db.execute(delete(model).where(model.user_id.in_(users)))
+    db.execute(delete(User).where(User.email.like(f"%@{DOMAIN}")))
+    db.commit()
+
+
+def seed(users: int, media: int, seed_value: int) -> dict:
+    from sqlalchemy import insert, text
+    from app.auth.hashing import pwd_context
+    from app.auth.models import User
+    from app.billing.models import Subscription
+    from app.billing.plans import MediaType, SubscriptionTier
+    from app.database import Base, SessionLocal, engine
+    from app.media.models import MediaFile
+
+    rng = random.Random(seed_value)
+    Base.metadata.create_all(bind=engine)
+    hashed = pwd_context.hash(PASSWORD)
+    tiers, weights = zip(*TIER_MIX)
+    started = time.perf_counter()
+
+    with SessionLocal() as db:
+        clear(db)
+        user_ids = []
+        for offset in range(0, users, CHUNK):
+            user_ids += db.scalars(insert(User).returning(User.id), [
+                {"email": email(i), "hashed_password": hashed, "name": f"user{i}", "full_name": f"Suite User {i}"}
+                for i in range(offset, min(users, offset + CHUNK))
+            ]).all()
+            db.execute(insert(Subscription), [
+                {
+                    "user_id": user_id,
+                    "tier": SubscriptionTier(rng.choices(tiers, weights)[0]),
+                    "images_used_this_month": 0,
+                    "videos_used_this_month": 0,
+                }
+                for user_id in user_ids[offset:]
+            ])
+        db.commit()
+
+        # Pareto weights: a long tail of light users and a few with very large galleries
+        owner_weights = [rng.paretovariate(1.2) for _ in user_ids]
+        start = datetime(2024, 1, 1)
+        for offset in range(0, media, CHUNK):
+            count = min(media, offset + CHUNK) - offset
+            owners = rng.choices(user_ids, owner_weights, k=count)
+            db.execute(insert(MediaFile), [
+                {
+                    "user_id": owner,
+                    "media_type": MediaType.IMAGE if rng.random() < 0.85 else MediaType.VIDEO,
+                    "original_filename": f"img_{i}.jpg",
+                    "original_path": f"/uploads/{owner}/{i}_original.jpg",
+                    "processed_path": f"/uploads/{owner}/{i}_enhanced.jpg",
+                    "thumbnail_path": f"/uploads/{owner}/{i}_thumb.webp",
+                    "content_type": "image/jpeg",
+                    "content_sha256": f"{rng.getrandbits(256):064x}",
+                    "file_size_mb": round(rng.uniform(0.2, 8.0), 2),
+                    "width": 4032,
+                    "height": 3024,
+                    "created_at": start + timedelta(seconds=i * 31 + rng.randrange(30)),
+                }
+                for i, owner in zip(range(offset, offset + count), owners)
+            ])
+        db.commit()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for table in ("users", "subscriptions", "media_files"):
+            connection.execute(text(f"VACUUM ANALYZE {table}"))
+    return {"users": users, "media": media, "seed": seed_value, "seconds": round(time.perf_counter() - started, 1)}
+
+
+def suite_users(db) -> dict[str, list[int]]:
+    """Seeded user ids by tier value, in id order"""
+    from sqlalchemy import select
+    from app.auth.models import User
+    from app.billing.models import Subscription
+
+    by_tier = {tier: [] for tier, _ in TIER_MIX}
+    rows = db.execute(
+        select(User.id, Subscription.tier)
+        .join(Subscription, Subscription.user_id == User.id)
+        .where(User.email.like(f"user%@{DOMAIN}"))
+        .order_by(User.id)
+    )
+    for user_id, tier in rows:
+        by_tier[tier.value].append(user_id)
+    return by_tier
+
+
+def main(args):
+    import app.main  # noqa: F401  (registers every mapped model)
+
+    if args.clear:
+        from app.database import SessionLocal
+        with SessionLocal() as db:
+            clear(db)
+        return
+    print(json.dumps(seed(args.users, args.media, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--media", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clear", action="store_true", help="only delete the suite's data")
+    main(parser.parse_args())
@@ -0,0 +1,314 @@
+"""
+End-to-end benchmark suite for the API and inference paths.
+
+Drives the real app either in-process (`--target asgi`: httpx ASGI transport,
+with the app's lifespan run around it) or over HTTP (`--target uvicorn`: a
+local uvicorn server started for the run), against the users seeded by
+benchmarks.seed. The model is a randomly initialized ZR-DCE (MODEL_WEIGHTS_PATH
+empty, `--weights` to use trained ones); the result cache is off and every
+seeded user's monthly counters are reset first, so each run does the same work.
+
+Scenarios (`--scenarios`, default all), each with `--concurrency` in flight:
+  - register, login, refresh: POST /auth/...; argon2 bound, `--auth-requests` each
+  - me, subscription, plans: GET /auth/me, /billing/my-subscription,
+    /billing/plans; `--requests` each, as seeded users of every tier
+  - enhance: POST /media/enhance of `--size` JPEGs by PRO users, `--images`
+  - batch: POST /media/batch of `--batch-size` images, `--images` in total
+  - mixed: `--requests` operations drawn from MIX, reported overall and per
+    operation (scenario "mixed/<operation>")
+Per scenario: requests, errors, throughput, p50/p95/p99 latency and the peak
+RSS of the process serving it (for asgi, that includes the client). Written as
+JSON to `--output` for benchmarks.compare to diff against a stored baseline.
+
+    python -m benchmarks.seed --users 10000 --media 100000
+    python -m benchmarks.suite --target asgi --output baseline.json
+    python -m benchmarks.suite --target uvicorn --scenarios me,subscription,mixed --output current.json
+    python -m benchmarks.compare baseline.json current.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks._common import peak_rss_mb, reset_peak_rss, summarize
+
+SCENARIOS = ("register", "login", "refresh", "me", "subscription", "plans", "enhance", "batch", "mixed")
+# Operation weights of the mixed workload
+MIX = {"me": 30, "subscription": 25, "plans": 15, "refresh": 10, "login": 5, "enhance": 15}
+
+
+class Suite:
+    """Seeded users, tokens and images shared by the scenarios of one run"""
+
+    def __init__(self, client, args, users: dict[str, list[int]], images: list[bytes]):
+        from app.auth.service import AuthService
+        from benchmarks.seed import PASSWORD
+
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.password = PASSWORD
+        self.users = [user_id for ids in users.values() for user_id in ids]
+        self.pro_users = users["pro"]
+        self.tokens = {user_id: AuthService.create_access_token(user_id) for user_id in self.users}
+        self.refresh_tokens: asyncio.Queue = asyncio.Queue()
+        self.images = images
+        self._next_image = 0
+        self._next_pro = 0
+
+    def headers(self, user_id: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def image(self) -> bytes:
+        self._next_image += 1
+        return self.images[self._next_image % len(self.images)]
+
+    def pro_user(self) -> int:
+        # round robin, so no PRO user runs out of monthly images
+        self._next_pro += 1
+        return self.pro_users[self._next_pro % len(self.pro_users)]
+
+    async def register(self):
+        email = f"register-{uuid.uuid4().hex[:12]}@suite.bench"
+        return await self.client.post(
+            "/auth/register", json={"email": email, "password": self.password, "name": "suite", "full_name": "Suite"}
+        )
+
+    async def login(self):
+        from benchmarks.seed import email
+        index = self.rng.randrange(self.args.users_seeded)
+        return await self.client.post("/auth/login", json={"email": email(index), "password": self.password})
+
+    async def refresh(self):
+        token = await self.refresh_tokens.get()
+        response = await self.client.post("/auth/refresh", json={"refresh_token": token})
+        # rotation: the next call on this session uses the new token
+        self.refresh_tokens.put_nowait(response.json()["refresh_token"] if response.status_code == 200 else token)
+        return response
+
+    async def me(self):
+        return await self.client.get("/auth/me", headers=self.headers(self.rng.choice(self.users)))
+
+    async def subscription(self):
+        return await self.client.get("/billing/my-subscription", headers=self.headers(self.rng.choice(self.users)))
+
+    async def plans(self):
+        return await self.client.get("/billing/plans")
+
+    async def enhance(self):
+        return await self.client.post(
+            "/media/enhance", headers=self.headers(self.pro_user()), files={"file": ("suite.jpg", self.image(), "image/jpeg")}
+        )
+
+    async def batch(self):
+        files = [("files", (f"{i}.jpg", self.image(), "image/jpeg")) for i in range(self.args.batch_size)]
+        async with self.client.stream("POST", "/media/batch", headers=self.headers(self.pro_user()), files=files) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        return response
+
+    async def mixed(self):
+        operation = self.rng.choices(list(MIX), list(MIX.values()))[0]
+        return operation, await getattr(self, operation)()
+
+
+def issue_refresh_tokens(user_ids: list[int]) -> list[str]:
+    """Sessions for the refresh scenario, inserted directly (no argon2)"""
+    from app.auth.service import AuthService
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        tokens = [AuthService.issue_refresh_token(db, user_id, "suite") for user_id in user_ids]
+        db.commit()
+    return tokens
+
+
+def reset_usage():
+    from sqlalchemy import update
+    from app.auth.models import User
+    from app.billing.models import Subscription
+    from app.database import SessionLocal
+    from benchmarks.seed import DOMAIN
+
+    with SessionLocal() as db:
+        users = db.query(User.id).filter(User.email.like(f"%@{DOMAIN}")).scalar_subquery()
+        db.execute(update(Subscription).where(Subscription.user_id.in_(users)).values(
+            images_used_this_month=0, videos_used_this_month=0
+        ))
+        db.commit()
+
+
+async def run_scenario(suite: Suite, name: str, total: int, concurrency: int, rss_pid) -> dict[str, dict]:
+    """`total` calls of one scenario, `concurrency` at a time; results keyed by scenario name"""
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    remaining = total
+    call = getattr(suite, name)
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            result = await call()
+            elapsed = time.perf_counter() - started
+            operation, response = result if name == "mixed" else (name, result)
+            keys = (name, f"{name}/{operation}") if name == "mixed" else (name,)
+            for key in keys:
+                latencies.setdefault(key, []).append(elapsed)
+                errors[key] = errors.get(key, 0) + (response.status_code >= 400)
+
+    reset_peak_rss(rss_pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    peak = round(peak_rss_mb(rss_pid), 1)
+    return {
+        key: {**summarize(samples, elapsed, errors[key]), "peak_rss_mb": peak}
+        for key, samples in sorted(latencies.items())
+    }
+
+
+def scenario_size(name: str, args) -> int:
+    if name in ("register", "login"):
+        return args.auth_requests
+    if name == "enhance":
+        return args.images
+    if name == "batch":
+        return max(1, args.images // args.batch_size)
+    return args.requests
+
+
+async def run_all(client, args, rss_pid) -> dict:
+    from app.database import SessionLocal
+    from benchmarks.bench_batch_api import make_images
+    from benchmarks.seed import suite_users
+
+    with SessionLocal() as db:
+        users = suite_users(db)
+    args.users_seeded = sum(len(ids) for ids in users.values())
+    if not users["pro"]:
+        raise SystemExit("No seeded users: run `python -m benchmarks.seed` first")
+    reset_usage()
+    width, height = map(int, args.size.split("x"))
+    suite = Suite(client, args, users, make_images(args.distinct_images, width, height))
+    for token in issue_refresh_tokens(random.Random(args.seed).sample(suite.users, args.concurrency)):
+        suite.refresh_tokens.put_nowait(token)
+
+    # one untimed call of each, so first-call costs (model trace, pools) stay out of the numbers
+    for name in ("login", "me", "subscription", "plans", "enhance"):
+        await getattr(suite, name)()
+
+    results = {}
+    for name in args.scenarios:
+        results.update(await run_scenario(suite, name, scenario_size(name, args), args.concurrency, rss_pid))
+        print(json.dumps({name: results[name]}), file=sys.stderr)
+    return results
+
+
+async def run_asgi(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.model.engine import engines_in_use
+
+    async with app.router.lifespan_context(app):
+        while not all(engine.warmed_up for engine in engines_in_use()):
+            await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://suite", timeout=None) as client:
+            return await run_all(client, args, "self")
+
+
+async def run_uvicorn(args) -> dict:
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=os.environ,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited during startup")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+            return await run_all(client, args, server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(args):
+    # before the app is imported: settings are read once
+    os.environ.update({
+        "MODEL_WEIGHTS_PATH": args.weights,
+        "RESULT_CACHE_ENABLED": "false",
+        "JOB_WORKER_PROCESSES": "0",
+        "MODEL_SERVER_PROCESSES": "0",
+        "UPLOAD_DIR": args.upload_dir,
+    })
+    started = time.perf_counter()
+    scenarios = asyncio.run(run_asgi(args) if args.target == "asgi" else run_uvicorn(args))
+    report = {
+        "meta": {
+            "target": args.target,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "seeded_users": args.users_seeded,
+            "concurrency": args.concurrency,
+            "size": args.size,
+            "model": args.weights or "random",
+            "seconds": round(time.perf_counter() - started, 1),
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--auth-requests", type=int, default=50)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--distinct-images", type=int, default=32)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--weights", default="", help="MODEL_WEIGHTS_PATH (default: random initialization)")
+    parser.add_argument("--upload-dir", default=os.path.join(tempfile.gettempdir(), "shadowshift-suite-uploads"))
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--output", help="also write the report here")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    main(args)
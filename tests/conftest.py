@@ -0,0 +1,23 @@
+import os
+import pytest
+
+# app.config needs these. Tests never use the DATABASE_URL of .env: the database
+# tests run against TEST_DATABASE_URL (a Postgres they may write to) or are skipped
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", "postgresql+psycopg2://shadowshift@localhost/shadowshift_test"
+)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("MODEL_WARMUP_ON_STARTUP", "false")
+
+@pytest.fixture(scope="session")
+def database():
+    """The test database with the schema created; skips when TEST_DATABASE_URL is unset or unreachable"""
+    from sqlalchemy.exc import OperationalError
+    from app.schema import create_schema
+
+    if "TEST_DATABASE_URL" not in os.environ:
+        pytest.skip("set TEST_DATABASE_URL to a Postgres database to run the database tests")
+    try:
+        create_schema()
+    except OperationalError as exc:
+        pytest.skip(f"test database unavailable: {exc.orig}")
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.admission.buckets import MemoryBucketBackend
+from app.admission.control import AdmissionController
+from app.auth.cache import CachedUser
+from app.billing.plans import TIERS, MediaType, SubscriptionTier
+
+def make_controller(max_ticket_share: float = 0.25) -> AdmissionController:
+    return AdmissionController(
+        MemoryBucketBackend(100),
+        queue_depth=lambda: 0,
+        max_queue_depth=64,
+        max_inflight={MediaType.IMAGE: 64.0, MediaType.VIDEO: 600.0},
+        retry_after_seconds=5,
+        max_ticket_share=max_ticket_share,
+    )
+
+def make_user(tier: SubscriptionTier, user_id: int = 1) -> CachedUser:
+    return CachedUser(id=user_id, is_active=True, is_admin=False, tier=tier)
+
+def admit(controller: AdmissionController, user: CachedUser, media_type: MediaType, work: float):
+    return asyncio.run(controller.admit(user, media_type, work))
+
+def test_max_length_pro_video_does_not_shed_pro():
+    controller = make_controller()
+    pro = make_user(SubscriptionTier.PRO)
+    ticket = admit(controller, pro, MediaType.VIDEO, TIERS[SubscriptionTier.PRO].video.max_duration_seconds)
+
+    assert controller.load() < TIERS[SubscriptionTier.PRO].shed_at_load
+    controller.check_load(pro)
+    controller.check_load(make_user(SubscriptionTier.BASIC, 2))
+
+    controller.release(ticket)
+    assert controller.load() == 0.0
+
+def test_max_length_basic_video_does_not_shed_free():
+    controller = make_controller()
+    admit(controller, make_user(SubscriptionTier.BASIC), MediaType.VIDEO, TIERS[SubscriptionTier.BASIC].video.max_duration_seconds)
+
+    controller.check_load(make_user(SubscriptionTier.FREE, 2))
+
+def test_concurrent_long_videos_still_shed_by_tier():
+    controller = make_controller()
+    for user_id in range(1, 3):
+        admit(controller, make_user(SubscriptionTier.PRO, user_id), MediaType.VIDEO, 1800)
+
+    assert controller.load() == pytest.approx(0.5)
+    with pytest.raises(HTTPException) as rejected:
+        controller.check_load(make_user(SubscriptionTier.FREE, 3))
+    assert rejected.value.status_code == 503
+    controller.check_load(make_user(SubscriptionTier.BASIC, 4))
+
+def test_small_tickets_count_in_full():
+    controller = make_controller()
+    admit(controller, make_user(SubscriptionTier.PRO), MediaType.IMAGE, 8.0)
+
+    assert controller.inflight[MediaType.IMAGE] == pytest.approx(8.0)
+
+def test_partial_release_of_capped_ticket_is_proportional():
+    controller = make_controller()
+    ticket = admit(controller, make_user(SubscriptionTier.PRO), MediaType.IMAGE, 64.0)
+    assert controller.inflight[MediaType.IMAGE] == pytest.approx(16.0)
+
+    controller.release(ticket, 32.0)
+    assert controller.inflight[MediaType.IMAGE] == pytest.approx(8.0)
+    controller.release(ticket)
+    assert ticket.released
+    assert controller.inflight[MediaType.IMAGE] == pytest.approx(0.0)
@@ -0,0 +1,56 @@
+import asyncio
+import numpy as np
+from app.model.engine import InferenceEngine
+
+class RecordingModel:
+    """serve / serve_curves / iterations of ZeroDCE, recording the batch shapes it runs"""
+    iterations = 2
+
+    def __init__(self):
+        self.shapes = []
+
+    def serve(self, batch: np.ndarray) -> np.ndarray:
+        self.shapes.append(("serve", batch.shape))
+        return batch
+
+    def serve_curves(self, batch: np.ndarray) -> np.ndarray:
+        self.shapes.append(("serve_curves", batch.shape))
+        return np.zeros(batch.shape[:3] + (3 * self.iterations,), dtype=np.float32)
+
+def make_engine(model: RecordingModel) -> InferenceEngine:
+    return InferenceEngine(
+        model_loader=lambda: model,
+        max_batch_size=8,
+        max_batch_pixels=8 * 1920 * 1080,
+        max_wait_ms=10,
+        bucket_multiple=64,
+        lowres_scale=4,
+        lowres_min_pixels=1280 * 720,
+        lowres_max_estimate_pixels=960 * 540,
+    )
+
+def test_warmup_buckets_follow_padding_and_lowres_downscaling():
+    engine = make_engine(RecordingModel())
+
+    buckets = engine.warmup_buckets([(512, 512), (1280, 720), (720, 1280), (1920, 1080), (3840, 2160), (500, 500)])
+
+    # 1280x720 runs at full size; 1920x1080 and 3840x2160 estimate curves at 1/4 size
+    assert buckets == [(512, 512), (768, 1280), (1280, 768), (320, 512), (576, 960)]
+
+def test_warm_up_runs_both_graphs_on_every_bucket():
+    model = RecordingModel()
+    engine = make_engine(model)
+
+    async def warm_up():
+        await engine.warm_up([(640, 480), (1920, 1080)])
+        await engine.stop()
+
+    asyncio.run(warm_up())
+
+    assert engine.warmed_up
+    assert model.shapes == [
+        ("serve", (1, 512, 640, 3)),
+        ("serve_curves", (1, 512, 640, 3)),
+        ("serve", (1, 320, 512, 3)),
+        ("serve_curves", (1, 320, 512, 3)),
+    ]
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+import pytest
+from app.billing.plans import MediaType, SubscriptionTier
+from app.jobs import service as job_service
+from app.jobs.models import Job, JobState
+from app.jobs.service import JobService
+from app.jobs.worker import _drain
+
+def test_drain_lets_quick_jobs_finish_and_cancels_the_rest():
+    finished, requeued = [], []
+
+    async def quick_job(stop: asyncio.Event):
+        await stop.wait()
+        await asyncio.sleep(0.01)
+        finished.append("quick")
+
+    async def long_job():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.sleep(0.01))
+            requeued.append("long")
+            raise
+
+    async def scenario():
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(quick_job(stop)), asyncio.create_task(long_job())]
+        asyncio.get_running_loop().call_later(0.01, stop.set)
+        await asyncio.wait_for(_drain(stop, tasks, grace_seconds=0.2), timeout=5)
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert finished == ["quick"]
+    assert requeued == ["long"]
+    assert tasks[1].cancelled()
+
+def test_cancelled_job_is_handed_to_stopped(monkeypatch):
+    stopped = []
+
+    async def process_upload(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    async def publish(event):
+        pass
+
+    async def keep_alive(job_id, progress):
+        await asyncio.sleep(3600)
+
+    async def record_stopped(job, reservation):
+        stopped.append((job.id, reservation.released))
+
+    monkeypatch.setattr(job_service.MediaService, "process_upload", staticmethod(process_upload))
+    monkeypatch.setattr(job_service.job_events, "publish", publish)
+    monkeypatch.setattr(job_service, "_keep_alive", keep_alive)
+    monkeypatch.setattr(JobService, "_stopped", staticmethod(record_stopped))
+
+    job = Job(
+        id=7,
+        user_id=1,
+        tier=SubscriptionTier.PRO,
+        media_type=MediaType.VIDEO,
+        state=JobState.RUNNING,
+        original_filename="clip.mp4",
+        original_path="/nonexistent/clip_original.mp4",
+        content_type="video/mp4",
+        extension=".mp4",
+        content_sha256="0" * 64,
+        size_bytes=1024,
+        quota_period_start=datetime.utcnow()
+    )
+
+    async def scenario():
+        task = asyncio.create_task(JobService.run(job))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert stopped == [(7, False)]
@@ -0,0 +1,43 @@
+import os
+import pytest
+from app.config import settings
+from app.model import server
+from app.model.server import POOL_ENV, SHARED_POOL, ModelServerPool, socket_path
+
+class FakeProcess:
+    started = []
+
+    def __init__(self, target, args, name, daemon):
+        self.args = args
+
+    def start(self):
+        FakeProcess.started.append(socket_path(self.args[0]))
+
+class FakeContext:
+    Process = FakeProcess
+
+@pytest.fixture(autouse=True)
+def outside_any_pool(monkeypatch):
+    """No pool at the start of a test, and none left by it (setenv records the variable for undo)"""
+    monkeypatch.setenv(POOL_ENV, "")
+    monkeypatch.delenv(POOL_ENV)
+
+def test_without_a_spawned_pool_clients_use_the_shared_one(monkeypatch):
+    assert socket_path(1) == os.path.join(settings.MODEL_SERVER_SOCKET_DIR, SHARED_POOL, "model-1.sock")
+
+def test_each_spawning_process_gets_its_own_sockets(monkeypatch):
+    monkeypatch.setattr(server.multiprocessing, "get_context", lambda method: FakeContext)
+    FakeProcess.started = []
+
+    ModelServerPool(2).start()
+
+    pool_dir = os.path.join(settings.MODEL_SERVER_SOCKET_DIR, f"pid-{os.getpid()}")
+    assert FakeProcess.started == [os.path.join(pool_dir, "model-0.sock"), os.path.join(pool_dir, "model-1.sock")]
+    # job workers spawned afterwards inherit the pool
+    assert os.environ[POOL_ENV] == f"pid-{os.getpid()}"
+
+def test_an_empty_pool_leaves_clients_on_the_shared_one(monkeypatch):
+
+    ModelServerPool(0).start()
+
+    assert POOL_ENV not in os.environ
@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from app.auth.cache import CachedUser
+from app.auth.models import User
+from app.billing.models import Subscription
+from app.billing.plans import TIERS, MediaType, SubscriptionTier
+from app.billing.service import BillingService
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+
+PARALLEL = 300
+FREE_IMAGES = TIERS[SubscriptionTier.FREE].image.count_per_month
+
+@pytest.fixture
+def user(database):
+    """A FREE user without a subscription row (the first reservation upserts it)"""
+    with SessionLocal() as db:
+        row = User(email=f"quota-{uuid.uuid4().hex}@test.invalid", hashed_password="x", name="quota", full_name="Quota Test")
+        db.add(row)
+        db.commit()
+        user_id = row.id
+    yield CachedUser(id=user_id, is_active=True, is_admin=False, tier=SubscriptionTier.FREE)
+    with SessionLocal() as db:
+        db.execute(delete(Subscription).where(Subscription.user_id == user_id))
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+
+def run(scenario):
+    """One event loop per test; asyncpg connections cannot outlive it"""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+async def reserve(user: CachedUser):
+    async with AsyncSessionLocal() as db:
+        try:
+            return await BillingService.reserve_quota(db, user, MediaType.IMAGE, file_size_mb=1.0)
+        except HTTPException as exc:
+            assert exc.status_code == 403
+            return None
+
+async def images_used(user: CachedUser) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Subscription.images_used_this_month).where(Subscription.user_id == user.id))
+
+def test_parallel_reservations_never_exceed_the_limit(user):
+    async def scenario():
+        reservations = await asyncio.gather(*(reserve(user) for _ in range(PARALLEL)))
+        return [r for r in reservations if r is not None], await images_used(user)
+
+    granted, used = run(scenario)
+    assert len(granted) == FREE_IMAGES
+    assert used == FREE_IMAGES
+
+def test_release_refunds_and_frees_the_slot(user):
+    async def scenario():
+        reservations = [await reserve(user) for _ in range(FREE_IMAGES)]
+        assert await reserve(user) is None
+
+        async with AsyncSessionLocal() as db:
+            await BillingService.release_quota(db, reservations[0])
+            # idempotent: a second release refunds nothing more
+            await BillingService.release_quota(db, reservations[0])
+        after_release = await images_used(user)
+
+        # a committed reservation is never refunded
+        async with AsyncSessionLocal() as db:
+            await BillingService.commit_quota(db, reservations[1])
+            await BillingService.release_quota(db, reservations[1])
+        after_committed_release = await images_used(user)
+
+        granted = await asyncio.gather(*(reserve(user) for _ in range(PARALLEL)))
+        return after_release, after_committed_release, [r for r in granted if r is not None], await images_used(user)
+
+    after_release, after_committed_release, granted, used = run(scenario)
+    assert after_release == FREE_IMAGES - 1
+    assert after_committed_release == FREE_IMAGES - 1
+    assert len(granted) == 1
+    assert used == FREE_IMAGES
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from app.model.tflite import AccuracyGateError, accuracy_report, check_accuracy, gate_images
+
+class FakeZeroDCE:
+    """serve / serve_curves / iterations of ZeroDCE in numpy: constant curve maps"""
+    iterations = 2
+
+    def __init__(self, curve: float = 0.5, serve_curve: float | None = None):
+        self.curve = curve
+        self.serve_curve = curve if serve_curve is None else serve_curve
+
+    def serve_curves(self, batch: np.ndarray) -> np.ndarray:
+        return np.full(batch.shape[:3] + (3 * self.iterations,), self.curve, dtype=np.float32)
+
+    def serve(self, batch: np.ndarray) -> np.ndarray:
+        x = batch
+        for _ in range(self.iterations):
+            x = x + self.serve_curve * x * (1 - x)
+        return x
+
+@pytest.fixture(scope="module")
+def images():
+    return gate_images()[:2]
+
+def test_gate_image_ships_with_the_package(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    images = gate_images()
+
+    assert len(images) == 6
+    assert all(image.dtype == np.float32 and image.max() <= 1.0 for image in images)
+
+def test_identical_conversion_passes(images):
+    report = accuracy_report(FakeZeroDCE(), FakeZeroDCE(), images)
+
+    check_accuracy(report)
+    assert report["min_curves_ssim"] == pytest.approx(1.0)
+
+def test_broken_curves_conversion_fails_even_when_serve_matches(images):
+    candidate = FakeZeroDCE(curve=-0.5, serve_curve=0.5)
+    report = accuracy_report(FakeZeroDCE(), candidate, images)
+
+    assert report["min_ssim"] == pytest.approx(1.0)
+    with pytest.raises(AccuracyGateError, match="serve_curves"):
+        check_accuracy(report)
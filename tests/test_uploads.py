@@ -0,0 +1,46 @@
+import asyncio
+import hashlib
+import io
+import os
+import pytest
+from fastapi import HTTPException, UploadFile
+from app.billing.plans import MediaType
+from app.media.uploads import store_multipart
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4096
+
+def upload(data: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data) if size is None else size, filename="photo.png")
+
+def store(data: bytes, directory: str, max_bytes: int, size: int | None = None):
+    return asyncio.run(store_multipart(upload(data, size), directory, MediaType.IMAGE, max_bytes))
+
+def test_multipart_is_stored_and_hashed_in_chunks(tmp_path):
+    stored = store(PNG, str(tmp_path), len(PNG))
+
+    assert stored.size == len(PNG)
+    assert stored.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert (stored.content_type, stored.extension) == ("image/png", ".png")
+    with open(stored.path, "rb") as f:
+        assert f.read() == PNG
+
+def test_oversized_multipart_is_rejected_from_its_size(tmp_path):
+    with pytest.raises(HTTPException) as rejected:
+        store(PNG, str(tmp_path), len(PNG) - 1)
+
+    assert rejected.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+def test_multipart_without_size_is_rejected_past_the_limit(tmp_path):
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(store_multipart(UploadFile(io.BytesIO(PNG)), str(tmp_path), MediaType.IMAGE, len(PNG) // 2))
+
+    assert rejected.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+def test_foreign_content_is_rejected(tmp_path):
+    with pytest.raises(HTTPException) as rejected:
+        store(b"GIF89a" + bytes(1024), str(tmp_path), 1 << 20)
+
+    assert rejected.value.status_code == 415
+    assert os.listdir(tmp_path) == []